@@ -0,0 +1,260 @@
+"""Helpers shared by the AWS variable caching plugins.
+
+Writes to SSM and Secrets Manager are throttled, and each one creates a new version of
+the parameter or secret. When OTF_AWS_CACHE_COMPARE_BEFORE_WRITE is set to 1, writes are
+skipped when they wouldn't change anything:
+
+- Names that haven't been written by this process are read first, and the write is
+  skipped if the value is the same.
+- After that, a hash of the last value written to each name is kept in memory, and a
+  write of the same value is skipped without reading it again. A change made by
+  anything else in the meantime isn't seen, so it isn't overwritten by a write of the
+  value this process last wrote.
+
+Otherwise every write is made.
+
+Setting OTF_AWS_CACHE_WRITE_DELAY to a number of seconds delays each write by that
+long. Any further writes to the same name in that time replace the pending value, so
+only the final value is written. Pending writes are flushed when the process exits, or
+by calling flush_pending_writes. A delayed write happens after the plugin has returned,
+so if it fails, the value stays pending and is retried after another delay, up to
+MAX_DELAYED_WRITE_ATTEMPTS times, unless a newer value replaces it first. After that it
+waits for flush_pending_writes, which tries once more and raises the error if it fails
+again.
+"""
+
+import atexit
+import contextlib
+import hashlib
+import math
+import os
+import threading
+from collections.abc import Callable
+from time import monotonic
+
+import opentaskpy.otflogging
+
+from .lookups import lookup_cache_key
+
+COMPARE_BEFORE_WRITE_ENV = "OTF_AWS_CACHE_COMPARE_BEFORE_WRITE"
+WRITE_DELAY_ENV = "OTF_AWS_CACHE_WRITE_DELAY"
+MAX_DELAYED_WRITE_ATTEMPTS = 3
+
+logger = opentaskpy.otflogging.init_logging(__name__, None, None)
+
+# The hash of the last value written to each name, and the monotonic time it was
+# written
+_last_written: dict[tuple, tuple[str, float]] = {}
+# Writes waiting for the write delay to pass, or to be retried, with the latest value
+# for each name
+_pending_writes: dict[tuple, dict] = {}
+_lock = threading.Lock()
+
+
+def cache_write_key(cache_name: str, name: str, credentials: dict) -> tuple:
+    """Build the key used to track writes to a name.
+
+    Args:
+        cache_name: The name of the caching plugin
+        name: The name of the parameter or secret
+        credentials: The credentials used for the write
+
+    Returns:
+        tuple: The key
+    """
+    return lookup_cache_key(cache_name, name, credentials)
+
+
+def seconds_since_last_write(key: tuple) -> float | None:
+    """Return how long ago this process last wrote to a name.
+
+    Args:
+        key: The key, from cache_write_key
+
+    Returns:
+        float | None: The number of seconds since the last write, or None if this
+            process hasn't written to the name
+    """
+    with _lock:
+        last_written = _last_written.get(key)
+    return monotonic() - last_written[1] if last_written else None
+
+
+def write_variable(
+    key: tuple,
+    value: str,
+    write: Callable[[str], bool],
+    read: Callable[[], str | None],
+) -> None:
+    """Write a value, or delay the write if configured to.
+
+    With OTF_AWS_CACHE_COMPARE_BEFORE_WRITE set to 1, the write is skipped if the value
+    is unchanged. Only the first write to each name reads the current value. After
+    that, it's compared with the last value this process wrote, so changes made
+    elsewhere aren't written back unless the value changes here too.
+
+    Args:
+        key: The key, from cache_write_key
+        value: The value to write
+        write: Writes the value. Returns False if it decided not to write it
+        read: Returns the current value, or None if there isn't one. Only called when
+            OTF_AWS_CACHE_COMPARE_BEFORE_WRITE is set to 1
+    """
+    write_delay = _get_write_delay()
+    if write_delay <= 0:
+        _write_if_changed(key, value, write, read)
+        return
+
+    with _lock:
+        pending_write = _pending_writes.get(key)
+        if pending_write:
+            logger.debug(f"Replacing pending write to {key[1]}")
+            # A new value gets its own retries, if the earlier one had failed
+            pending_write.update(
+                {"value": value, "write": write, "read": read, "attempts": 0}
+            )
+            if pending_write["timer"]:
+                return
+        else:
+            pending_write = {
+                "value": value,
+                "write": write,
+                "read": read,
+                "attempts": 0,
+            }
+            _pending_writes[key] = pending_write
+
+        timer = _start_timer(key, pending_write, write_delay)
+    timer.start()
+
+
+def flush_pending_writes() -> None:
+    """Write every pending value now, rather than waiting for the write delay.
+
+    Every pending value is tried, even if an earlier one fails. Values that fail stay
+    pending, so they can be flushed again.
+
+    Raises:
+        Exception: The error raised by the first write that failed
+    """
+    with _lock:
+        keys = list(_pending_writes)
+
+    errors = []
+    for key in keys:
+        try:
+            _flush_pending_write(key, retry=False)
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+
+def clear_write_history() -> None:
+    """Forget the values written by this process, and any pending writes."""
+    with _lock:
+        for pending_write in _pending_writes.values():
+            if pending_write["timer"]:
+                pending_write["timer"].cancel()
+        _pending_writes.clear()
+        _last_written.clear()
+
+
+def _start_timer(
+    key: tuple, pending_write: dict, write_delay: float
+) -> threading.Timer:
+    # Called with the lock held. The timer is started by the caller once it's released
+    timer = threading.Timer(write_delay, _flush_pending_write, args=[key])
+    timer.daemon = True
+    pending_write.update({"timer": timer, "write_delay": write_delay})
+    return timer
+
+
+def _flush_pending_write(key: tuple, retry: bool = True) -> None:
+    with _lock:
+        pending_write = _pending_writes.pop(key, None)
+    if not pending_write:
+        return
+
+    if pending_write["timer"]:
+        pending_write["timer"].cancel()
+    try:
+        _write_if_changed(
+            key, pending_write["value"], pending_write["write"], pending_write["read"]
+        )
+    except Exception as e:
+        pending_write["attempts"] += 1
+        timer = None
+        with _lock:
+            if key in _pending_writes:
+                # A newer value was written while this one was being written, so the
+                # newer value replaces it
+                logger.error(f"Failed to write pending value to {key[1]}: {e}")
+                if not retry:
+                    raise
+                return
+
+            _pending_writes[key] = pending_write
+            pending_write["timer"] = None
+            if retry and pending_write["attempts"] < MAX_DELAYED_WRITE_ATTEMPTS:
+                timer = _start_timer(key, pending_write, pending_write["write_delay"])
+
+        if timer:
+            logger.error(f"Failed to write pending value to {key[1]}, retrying: {e}")
+            timer.start()
+        else:
+            logger.error(f"Failed to write pending value to {key[1]}: {e}")
+        if not retry:
+            raise
+
+
+def _write_if_changed(
+    key: tuple,
+    value: str,
+    write: Callable[[str], bool],
+    read: Callable[[], str | None],
+) -> None:
+    value_hash = hashlib.sha256(str(value).encode()).hexdigest()
+
+    if os.environ.get(COMPARE_BEFORE_WRITE_ENV, "0") == "1":
+        with _lock:
+            last_written = _last_written.get(key)
+        if last_written and last_written[0] == value_hash:
+            logger.info(f"Not updating {key[1]} because the value is unchanged")
+            return
+
+        if not last_written and read() == str(value):
+            logger.info(f"Not updating {key[1]} because the value is unchanged")
+            with _lock:
+                # The value wasn't written, so there's no write time to record
+                _last_written[key] = (value_hash, -math.inf)
+            return
+
+    if write(value):
+        with _lock:
+            _last_written[key] = (value_hash, monotonic())
+
+
+def _get_write_delay() -> float:
+    write_delay = os.environ.get(WRITE_DELAY_ENV)
+    if not write_delay:
+        return 0
+
+    try:
+        return float(write_delay)
+    except ValueError:
+        logger.warning(
+            f"Invalid value for {WRITE_DELAY_ENV}: {write_delay}. Writes won't be"
+            " delayed"
+        )
+        return 0
+
+
+def _flush_pending_writes_at_exit() -> None:
+    # Each failure has already been logged, and there's no caller to raise it to
+    with contextlib.suppress(Exception):
+        flush_pending_writes()
+
+
+atexit.register(_flush_pending_writes_at_exit)
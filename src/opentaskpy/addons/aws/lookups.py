@@ -0,0 +1,279 @@
+"""Helpers shared by the AWS lookup plugins.
+
+Lookups made while loading config can be cached in memory, so a variable that's
+referenced by many task definitions is only read from AWS once. The cache is disabled
+unless OTF_AWS_LOOKUP_CACHE_TTL is set to the number of seconds to keep each value for.
+The number of values kept is limited by OTF_AWS_LOOKUP_CACHE_SIZE, with the least
+recently used value evicted first.
+
+Lookups can also be resolved concurrently with resolve_lookups, or
+resolve_lookups_async, rather than one after another.
+"""
+
+import asyncio
+import importlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+from typing import Any
+
+import opentaskpy.otflogging
+
+LOOKUP_CACHE_TTL_ENV = "OTF_AWS_LOOKUP_CACHE_TTL"
+LOOKUP_CACHE_SIZE_ENV = "OTF_AWS_LOOKUP_CACHE_SIZE"
+DEFAULT_LOOKUP_CACHE_SIZE = 1024
+LOOKUP_MAX_CONCURRENCY_ENV = "OTF_AWS_LOOKUP_MAX_CONCURRENCY"
+# Matches the default number of connections each pooled client keeps open
+DEFAULT_LOOKUP_MAX_CONCURRENCY = 10
+
+logger = opentaskpy.otflogging.init_logging(__name__, None, None)
+
+# Cached values and the monotonic time they expire, in least recently used order
+_lookup_cache: OrderedDict[tuple, tuple[float, Any]] = OrderedDict()
+_lookup_cache_lock = threading.Lock()
+
+
+def get_lookup_credentials(globals_: dict | None) -> dict:
+    """Get the credentials for a lookup, from the global variables or the environment.
+
+    Args:
+        globals_: The global variables passed to the lookup plugin, if any
+
+    Returns:
+        dict: The credentials, in the form expected by get_aws_client
+    """
+
+    def get_value(name: str) -> str | None:
+        value: str | None = (
+            globals_[name] if globals_ and name in globals_ else os.environ.get(name)
+        )
+        return value
+
+    return {
+        "AccessKeyId": get_value("AWS_ACCESS_KEY_ID"),
+        "SecretAccessKey": get_value("AWS_SECRET_ACCESS_KEY"),
+        "region_name": get_value("AWS_REGION"),
+    }
+
+
+def lookup_cache_key(plugin_name: str, name: str, credentials: dict) -> tuple:
+    """Build the cache key for a lookup.
+
+    Values are cached against the identity of the credentials, region and endpoint used
+    to read them, so lookups using different credentials never share a value.
+
+    Args:
+        plugin_name: The name of the lookup plugin
+        name: The name of the parameter or secret
+        credentials: The credentials used for the lookup
+
+    Returns:
+        tuple: The cache key
+    """
+    return (
+        plugin_name,
+        name,
+        credentials.get("region_name"),
+        credentials.get("AccessKeyId"),
+        os.environ.get("AWS_ENDPOINT_URL"),
+    )
+
+
+def lookup_cache_enabled() -> bool:
+    """Return True if lookup caching is enabled."""
+    return _get_lookup_cache_ttl() > 0
+
+
+def get_cached_lookup(key: tuple) -> Any:
+    """Get a value from the lookup cache.
+
+    Args:
+        key: The cache key, from lookup_cache_key
+
+    Returns:
+        Any: The cached value, or None if it isn't cached or has expired
+    """
+    if not lookup_cache_enabled():
+        return None
+
+    with _lookup_cache_lock:
+        entry = _lookup_cache.get(key)
+        if not entry:
+            return None
+
+        expires, value = entry
+        if monotonic() >= expires:
+            del _lookup_cache[key]
+            return None
+
+        _lookup_cache.move_to_end(key)
+        return value
+
+
+def cache_lookup(key: tuple, value: Any) -> None:
+    """Add a value to the lookup cache, if caching is enabled.
+
+    Args:
+        key: The cache key, from lookup_cache_key
+        value: The value to cache
+    """
+    ttl = _get_lookup_cache_ttl()
+    if ttl <= 0:
+        return
+
+    max_size = _get_lookup_cache_size()
+    with _lookup_cache_lock:
+        _lookup_cache[key] = (monotonic() + ttl, value)
+        _lookup_cache.move_to_end(key)
+        while len(_lookup_cache) > max_size:
+            _lookup_cache.popitem(last=False)
+
+
+def clear_lookup_cache() -> None:
+    """Remove every value from the lookup cache."""
+    with _lookup_cache_lock:
+        _lookup_cache.clear()
+
+
+def resolve_lookups(
+    lookups: list[tuple[str, dict]], max_concurrency: int | None = None
+) -> list:
+    """Run several lookup plugins concurrently, using a thread pool.
+
+    Each lookup is given as a tuple of the plugin name, as it would be passed to
+    lookup() in a template, and the kwargs for the plugin, e.g.
+    ("aws.ssm", {"name": "/otf/param"}). Identical lookups are only run once.
+
+    Args:
+        lookups: The lookups to run
+        max_concurrency: The maximum number of lookups to run at once (optional).
+            Defaults to OTF_AWS_LOOKUP_MAX_CONCURRENCY, or 10 if that isn't set
+
+    Returns:
+        list: The result of each lookup, in the same order as the lookups. If any
+            lookup raises an exception, it's raised here
+    """
+    unique_lookups = _unique_lookups(lookups)
+    if not unique_lookups:
+        return []
+
+    with ThreadPoolExecutor(
+        max_workers=min(
+            max_concurrency or _get_lookup_max_concurrency(), len(unique_lookups)
+        )
+    ) as executor:
+        results = dict(
+            zip(
+                unique_lookups,
+                executor.map(
+                    lambda lookup: _run_lookup(*lookup), unique_lookups.values()
+                ),
+            )
+        )
+
+    return [results[_lookup_key(*lookup)] for lookup in lookups]
+
+
+async def resolve_lookups_async(
+    lookups: list[tuple[str, dict]], max_concurrency: int | None = None
+) -> list:
+    """Run several lookup plugins concurrently, from a coroutine.
+
+    The same as resolve_lookups, but each lookup is run in a thread with
+    asyncio.to_thread, so the event loop isn't blocked while waiting for AWS.
+
+    Args:
+        lookups: The lookups to run
+        max_concurrency: The maximum number of lookups to run at once (optional).
+            Defaults to OTF_AWS_LOOKUP_MAX_CONCURRENCY, or 10 if that isn't set
+
+    Returns:
+        list: The result of each lookup, in the same order as the lookups. If any
+            lookup raises an exception, it's raised here
+    """
+    unique_lookups = _unique_lookups(lookups)
+    semaphore = asyncio.Semaphore(max_concurrency or _get_lookup_max_concurrency())
+
+    async def run_lookup(plugin: str, kwargs: dict) -> Any:
+        async with semaphore:
+            return await asyncio.to_thread(_run_lookup, plugin, kwargs)
+
+    results = dict(
+        zip(
+            unique_lookups,
+            await asyncio.gather(
+                *(run_lookup(*lookup) for lookup in unique_lookups.values())
+            ),
+        )
+    )
+
+    return [results[_lookup_key(*lookup)] for lookup in lookups]
+
+
+def _lookup_key(plugin: str, kwargs: dict) -> tuple:
+    # The globals are usually the same object for every lookup in a config load, and
+    # aren't necessarily hashable, so they're compared by identity
+    return (
+        plugin,
+        repr(sorted((k, v) for k, v in kwargs.items() if k != "globals")),
+        id(kwargs.get("globals")),
+    )
+
+
+def _unique_lookups(lookups: list[tuple[str, dict]]) -> dict[tuple, tuple[str, dict]]:
+    unique_lookups: dict[tuple, tuple[str, dict]] = {}
+    for plugin, kwargs in lookups:
+        unique_lookups.setdefault(_lookup_key(plugin, kwargs), (plugin, kwargs))
+    return unique_lookups
+
+
+def _run_lookup(plugin: str, kwargs: dict) -> Any:
+    # Plugins are found the same way as the config loader finds them
+    return importlib.import_module(f"opentaskpy.plugins.lookup.{plugin}").run(**kwargs)
+
+
+def _get_lookup_max_concurrency() -> int:
+    max_concurrency = os.environ.get(LOOKUP_MAX_CONCURRENCY_ENV)
+    if not max_concurrency:
+        return DEFAULT_LOOKUP_MAX_CONCURRENCY
+
+    try:
+        return max(int(max_concurrency), 1)
+    except ValueError:
+        logger.warning(
+            f"Invalid value for {LOOKUP_MAX_CONCURRENCY_ENV}: {max_concurrency}. Using"
+            f" the default of {DEFAULT_LOOKUP_MAX_CONCURRENCY}"
+        )
+        return DEFAULT_LOOKUP_MAX_CONCURRENCY
+
+
+def _get_lookup_cache_ttl() -> float:
+    ttl = os.environ.get(LOOKUP_CACHE_TTL_ENV)
+    if not ttl:
+        return 0
+
+    try:
+        return float(ttl)
+    except ValueError:
+        logger.warning(
+            f"Invalid value for {LOOKUP_CACHE_TTL_ENV}: {ttl}. Lookup caching is"
+            " disabled"
+        )
+        return 0
+
+
+def _get_lookup_cache_size() -> int:
+    size = os.environ.get(LOOKUP_CACHE_SIZE_ENV)
+    if not size:
+        return DEFAULT_LOOKUP_CACHE_SIZE
+
+    try:
+        return max(int(size), 1)
+    except ValueError:
+        logger.warning(
+            f"Invalid value for {LOOKUP_CACHE_SIZE_ENV}: {size}. Using the default of"
+            f" {DEFAULT_LOOKUP_CACHE_SIZE}"
+        )
+        return DEFAULT_LOOKUP_CACHE_SIZE
@@ -0,0 +1,181 @@
+"""Shared client and credential handling for the AWS remote handlers."""
+
+import logging
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from time import monotonic
+from typing import TYPE_CHECKING
+
+import opentaskpy.otflogging
+from dateutil.tz import tzlocal
+
+from .creds import get_aws_client, release_aws_client, set_aws_creds
+
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
+
+# Temporary credentials are renewed when they're within this long of expiring
+CREDENTIALS_REFRESH_MARGIN = timedelta(minutes=1)
+
+logger = opentaskpy.otflogging.init_logging(__name__, None, None)
+
+# Callables that are passed the name of an event, and a dict of details about it, each
+# time a handler gets or releases a client
+_metrics_hooks: list[Callable[[str, dict], None]] = []
+
+
+def add_metrics_hook(hook: Callable[[str, dict], None]) -> None:
+    """Register a callable to be notified of client events, e.g. to publish metrics.
+
+    The hook is called with one of the following event names, and a dict containing
+    the client_type and task_id of the handler:
+
+    - client_acquired: A handler got a client. The details also include pooled, which
+      is True if an existing client was reused, and elapsed, the seconds it took.
+    - client_released: A handler released its client back to the pool.
+    - credentials_renewed: A handler's temporary credentials were close to expiry, so
+      it's getting its client again.
+
+    Args:
+        hook: The callable to register
+    """
+    _metrics_hooks.append(hook)
+
+
+def remove_metrics_hook(hook: Callable[[str, dict], None]) -> None:
+    """Stop notifying a previously registered metrics hook.
+
+    Args:
+        hook: The callable to remove
+    """
+    _metrics_hooks.remove(hook)
+
+
+class AWSHandlerBase:
+    """Mixin for remote handlers that use a boto3 client.
+
+    Sets the AWS credentials from the spec, and gets a client from the client pool the
+    first time it's used. If the client uses temporary credentials, the time to renew
+    them is stored as a monotonic deadline, so checking whether they need renewing is
+    cheap enough to do before every request.
+
+    Subclasses must set CLIENT_TYPE, and can override get_client_config to customise
+    the client.
+    """
+
+    CLIENT_TYPE: str
+    logger: logging.Logger
+    spec: dict
+
+    def __init__(self, spec: dict, *args, **kwargs):  # type: ignore[no-untyped-def]
+        """Initialise the handler and set the AWS credentials from the spec.
+
+        Args:
+            spec (dict): The spec for the handler.
+            *args: Passed to the parent handler.
+            **kwargs: Passed to the parent handler.
+        """
+        self.aws_access_key_id: str | None = None
+        self.aws_secret_access_key: str | None = None
+        self.region_name: str | None = None
+        self.temporary_creds: dict | None = None
+        self.token_expiry_seconds: int | None = None
+        self.assume_role_arn: str | None = None
+        self.assume_role_external_id: str | None = None
+        self._client: boto3.Client = None
+        self._creds_refresh_deadline: float | None = None
+
+        super().__init__(spec, *args, **kwargs)  # type: ignore[call-arg]
+
+        set_aws_creds(self)
+
+        self.credentials: dict = {
+            "AccessKeyId": self.aws_access_key_id,
+            "SecretAccessKey": self.aws_secret_access_key,
+            "region_name": self.region_name,
+        }
+
+    @property
+    def client(self) -> "boto3.Client":
+        """The client, which is created the first time it's used."""
+        if not self._client:
+            self.validate_or_refresh_creds()
+        return self._client
+
+    def get_client_config(self) -> "Config | None":
+        """Return the botocore config to create the client with, if any."""
+        return None
+
+    def validate_or_refresh_creds(self) -> None:
+        """Get a client, or a new one if the temporary credentials are about to expire."""
+        if self._client and (
+            self._creds_refresh_deadline is None
+            or monotonic() < self._creds_refresh_deadline
+        ):
+            return
+
+        if self._client:
+            self.logger.info("Renewing temporary credentials")
+            self._notify_metrics_hooks("credentials_renewed")
+            self._release_client()
+
+        start = monotonic()
+        client_result = get_aws_client(
+            self.CLIENT_TYPE,
+            self.credentials,
+            token_expiry_seconds=self.token_expiry_seconds,
+            assume_role_arn=self.assume_role_arn,
+            assume_role_external_id=self.assume_role_external_id,
+            config=self.get_client_config(),
+        )
+        self._client = client_result["client"]
+        self.temporary_creds = client_result["temporary_creds"]
+
+        self._creds_refresh_deadline = None
+        if self.temporary_creds:
+            now = datetime.now(tz=tzlocal())
+            self.logger.debug(
+                f"Temporary creds expire at: {self.temporary_creds['Expiration']} - Now: {now}"
+            )
+            self._creds_refresh_deadline = (
+                start
+                + (
+                    self.temporary_creds["Expiration"]
+                    - now
+                    - CREDENTIALS_REFRESH_MARGIN
+                ).total_seconds()
+            )
+
+        self._notify_metrics_hooks(
+            "client_acquired",
+            pooled=client_result["pooled"],
+            elapsed=monotonic() - start,
+        )
+
+    def tidy(self) -> None:
+        """Release the client back to the client pool."""
+        self._release_client()
+
+    def _release_client(self) -> None:
+        if not self._client:
+            return
+
+        release_aws_client(self._client)
+        self._client = None
+        self._notify_metrics_hooks("client_released")
+
+    def _notify_metrics_hooks(self, event: str, **details) -> None:  # type: ignore[no-untyped-def]
+        for hook in list(_metrics_hooks):
+            try:
+                hook(
+                    event,
+                    {
+                        "client_type": self.CLIENT_TYPE,
+                        "task_id": self.spec.get("task_id"),
+                        **details,
+                    },
+                )
+            except Exception as e:  # pylint: disable=broad-exception-caught
+                # A broken hook shouldn't break the task
+                logger.warning(f"Metrics hook {hook} failed for event {event}: {e}")
@@ -2,15 +2,43 @@
 
 import os
 import socket
+import threading
 from time import time
+from typing import TYPE_CHECKING
 
-import boto3
 import opentaskpy.otflogging
-from botocore.args import ClientArgsCreator
-from botocore.config import Config
+
+# boto3 and botocore are slow to import, so they're only imported when the first
+# client is created
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
 
 logger = opentaskpy.otflogging.init_logging(__name__, None, None)
 
+# Clients are shared between handlers that use the same credentials and config, so
+# that each task doesn't need to build its own session and load the service models
+_client_pool: dict[tuple, dict] = {}
+# Every pooled client, indexed by id(client)
+_client_leases: dict[int, dict] = {}
+# Guards the dicts in this module. It's only held briefly, so creating a client or
+# assuming a role is done outside it, holding a lock for just that key. Other callers
+# using the same key wait for it and share the result, while those using other keys
+# aren't held up
+_client_pool_lock = threading.Lock()
+_client_creation_locks: dict[tuple, threading.Lock] = {}
+# Assumed role credentials, shared by every client that uses the same role
+_assumed_role_credentials: dict[tuple, dict] = {}
+_assumed_role_locks: dict[tuple, threading.Lock] = {}
+_sts_clients: dict[str | None, "boto3.Client"] = {}
+_sts_clients_lock = threading.Lock()
+
+# Assumed role credentials are refreshed when a client uses them within the advisory
+# window before expiry. Once inside the mandatory window, every caller waits for the
+# refresh
+ASSUMED_ROLE_ADVISORY_REFRESH_SECONDS = 300
+ASSUMED_ROLE_MANDATORY_REFRESH_SECONDS = 120
+
 
 def _custom_compute_socket_options(self, scoped_config, client_config=None):  # type: ignore[no-untyped-def]
     # This is a workaround for an issue in botocore - See the following PR for more details:
@@ -68,10 +96,21 @@ def get_aws_client(  # pylint: disable=too-many-positional-arguments
     token_expiry_seconds: int | None = 900,
     assume_role_arn: str | None = None,
     assume_role_external_id: str | None = None,
-    config: Config | None = None,
+    config: "Config | None" = None,
 ) -> dict:
     """Get an AWS client of the specified type using the provided credentials.
 
+    Clients are pooled, so callers using the same credentials, role, region, endpoint
+    and config share the same client. Clients should be handed back with
+    release_aws_client once the caller is finished with them, rather than being
+    closed.
+
+    When assuming a role, the credentials are cached and shared between every client
+    using the same role, external id and expiry, so the role is only assumed once.
+    They're refreshed automatically ahead of expiry. temporary_creds in the result
+    holds the latest assumed role credentials, so callers can tell when they expire.
+    pooled is True if an existing client was reused.
+
     Args:
         client_type: The type of client to get
         credentials: The credentials to use
@@ -80,6 +119,242 @@ def get_aws_client(  # pylint: disable=too-many-positional-arguments
         assume_role_external_id: The external id to use when assuming the role (optional)
         config: The config to use for the client (optional)
     """
+    key = (
+        client_type,
+        credentials.get("AccessKeyId"),
+        credentials.get("SessionToken"),
+        assume_role_arn,
+        assume_role_external_id,
+        token_expiry_seconds if assume_role_arn else None,
+        credentials.get("region_name"),
+        os.environ.get("AWS_ENDPOINT_URL"),
+        repr(sorted(vars(config).items())) if config else None,
+    )
+
+    entry = _lease_pooled_client(key)
+    pooled = entry is not None
+    if not entry:
+        with _client_pool_lock:
+            creation_lock = _client_creation_locks.setdefault(key, threading.Lock())
+
+        with creation_lock:
+            # Another caller may have created the client while this one was waiting
+            entry = _lease_pooled_client(key)
+            pooled = entry is not None
+            if not entry:
+                entry = {
+                    "key": key,
+                    "leases": 1,
+                    "superseded": False,
+                    **_create_aws_client(
+                        client_type,
+                        credentials,
+                        token_expiry_seconds=token_expiry_seconds,
+                        assume_role_arn=assume_role_arn,
+                        assume_role_external_id=assume_role_external_id,
+                        config=config,
+                    ),
+                }
+                with _client_pool_lock:
+                    _supersede_pooled_clients(key)
+                    _client_pool[key] = entry
+                    _client_leases[id(entry["client"])] = entry
+
+    temporary_creds = None
+    if entry["assumed_role"]:
+        # Refresh the assumed role credentials now if they're close to expiry, so the
+        # caller gets the latest expiry time
+        entry["assumed_role"]["credentials"].get_frozen_credentials()
+        temporary_creds = entry["assumed_role"]["latest"]
+
+    return {
+        "client": entry["client"],
+        "temporary_creds": temporary_creds,
+        "pooled": pooled,
+    }
+
+
+def release_aws_client(client) -> None:  # type: ignore[no-untyped-def]
+    """Hand a client obtained from get_aws_client back to the pool.
+
+    The client stays open and in the pool, so that it can be reused by the next
+    caller, until clear_aws_client_pool is called. The exception is a client whose
+    session token has since been replaced by a new one, which is closed and removed
+    from the pool once its last caller releases it. Clients that didn't come from the
+    pool are closed.
+
+    Args:
+        client: The client to release
+    """
+    if client is None:
+        return
+
+    with _client_pool_lock:
+        entry = _client_leases.get(id(client))
+        if not entry or entry["client"] is not client:
+            # Not one of ours, so just close it
+            client.close()
+            return
+
+        entry["leases"] = max(entry["leases"] - 1, 0)
+        if entry["superseded"] and not entry["leases"]:
+            _evict_pooled_client(entry)
+
+
+def clear_aws_client_pool() -> None:
+    """Close every pooled client, and forget any cached assumed role credentials."""
+    with _client_pool_lock:
+        for entry in _client_leases.values():
+            entry["client"].close()
+        _client_pool.clear()
+        _client_leases.clear()
+        _client_creation_locks.clear()
+        _assumed_role_credentials.clear()
+        _assumed_role_locks.clear()
+        _sts_clients.clear()
+
+
+def _supersede_pooled_clients(key: tuple) -> None:
+    # Temporary session credentials are replaced with a new session token when they
+    # expire, so any client for the same identity using a different token is stale.
+    # It's closed now if nothing is using it, otherwise when its last lease is released
+    if not key[2]:
+        return
+
+    for other_key, entry in list(_client_pool.items()):
+        if other_key[2] != key[2] and other_key[:2] + other_key[3:] == (
+            key[:2] + key[3:]
+        ):
+            entry["superseded"] = True
+            if not entry["leases"]:
+                _evict_pooled_client(entry)
+
+
+def _evict_pooled_client(entry: dict) -> None:
+    if _client_pool.get(entry["key"]) is entry:
+        del _client_pool[entry["key"]]
+    _client_leases.pop(id(entry["client"]), None)
+    _client_creation_locks.pop(entry["key"], None)
+    entry["client"].close()
+
+
+def _lease_pooled_client(key: tuple) -> dict | None:
+    with _client_pool_lock:
+        entry = _client_pool.get(key)
+        if entry:
+            entry["leases"] += 1
+        return entry
+
+
+def _get_assumed_role_credentials(
+    assume_role_arn: str,
+    assume_role_external_id: str | None,
+    token_expiry_seconds: int | None,
+    endpoint_kwargs: dict,
+) -> dict:
+    # Credentials for a role are shared by every client that assumes it, and are
+    # refreshed by botocore ahead of expiry, the first time a client uses them inside
+    # the refresh window
+    key = (
+        assume_role_arn,
+        assume_role_external_id,
+        token_expiry_seconds,
+        endpoint_kwargs.get("endpoint_url"),
+    )
+    with _client_pool_lock:
+        if key in _assumed_role_credentials:
+            return _assumed_role_credentials[key]
+        role_lock = _assumed_role_locks.setdefault(key, threading.Lock())
+
+    with role_lock:
+        with _client_pool_lock:
+            if key in _assumed_role_credentials:
+                return _assumed_role_credentials[key]
+
+        assumed_role = _assume_role(
+            assume_role_arn,
+            assume_role_external_id,
+            token_expiry_seconds,
+            endpoint_kwargs,
+        )
+        with _client_pool_lock:
+            _assumed_role_credentials[key] = assumed_role
+        return assumed_role
+
+
+def _get_sts_client(endpoint_kwargs: dict) -> "boto3.Client":
+    # pylint: disable=import-outside-toplevel
+    import boto3
+
+    # The default boto3 session isn't safe to create from several threads at once
+    endpoint_url = endpoint_kwargs.get("endpoint_url")
+    with _sts_clients_lock:
+        if endpoint_url not in _sts_clients:
+            _sts_clients[endpoint_url] = boto3.client("sts", **endpoint_kwargs)
+        return _sts_clients[endpoint_url]
+
+
+def _assume_role(
+    assume_role_arn: str,
+    assume_role_external_id: str | None,
+    token_expiry_seconds: int | None,
+    endpoint_kwargs: dict,
+) -> dict:
+    # pylint: disable=import-outside-toplevel
+    from botocore.credentials import RefreshableCredentials
+
+    sts_client = _get_sts_client(endpoint_kwargs)
+
+    assume_role_kwargs = {
+        "RoleArn": assume_role_arn,
+        "DurationSeconds": token_expiry_seconds,
+    }
+    if assume_role_external_id:
+        assume_role_kwargs["ExternalId"] = assume_role_external_id
+
+    assumed_role: dict = {}
+
+    def assume_role() -> dict:
+        if "latest" in assumed_role:
+            logger.info("Renewing temporary credentials")
+        logger.info(f"Assuming role: {assume_role_arn}")
+        credentials = sts_client.assume_role(
+            RoleSessionName=f"OTF{time()}", **assume_role_kwargs
+        )["Credentials"]
+        # Log the assumed role access key id
+        logger.info(f"Assumed role access key id: {credentials['AccessKeyId']}")
+
+        assumed_role["latest"] = credentials
+        return {
+            "access_key": credentials["AccessKeyId"],
+            "secret_key": credentials["SecretAccessKey"],
+            "token": credentials["SessionToken"],
+            "expiry_time": credentials["Expiration"].isoformat(),
+        }
+
+    assumed_role["credentials"] = RefreshableCredentials.create_from_metadata(
+        metadata=assume_role(),
+        refresh_using=assume_role,
+        method="sts-assume-role",
+        advisory_timeout=ASSUMED_ROLE_ADVISORY_REFRESH_SECONDS,
+        mandatory_timeout=ASSUMED_ROLE_MANDATORY_REFRESH_SECONDS,
+    )
+    return assumed_role
+
+
+def _create_aws_client(  # pylint: disable=too-many-positional-arguments
+    client_type: str,
+    credentials: dict,
+    token_expiry_seconds: int | None = 900,
+    assume_role_arn: str | None = None,
+    assume_role_external_id: str | None = None,
+    config: "Config | None" = None,
+) -> dict:
+    # pylint: disable=import-outside-toplevel
+    import boto3
+    import botocore.session
+    from botocore.args import ClientArgsCreator
+
     if client_type == "lambda":
         # Monkey patch the socket options for lambda
         # See above for more details
@@ -87,7 +362,7 @@ def get_aws_client(  # pylint: disable=too-many-positional-arguments
             _custom_compute_socket_options
         )
 
-    supported_types = ["s3", "ecs", "lambda", "logs"]
+    supported_types = ["s3", "ecs", "lambda", "logs", "ssm", "secretsmanager", "sqs"]
     if client_type not in supported_types:
         raise ValueError(
             f"Unsupported client type: {client_type}. Supported types are: {supported_types}"
@@ -98,26 +373,19 @@ def get_aws_client(  # pylint: disable=too-many-positional-arguments
         kwargs["endpoint_url"] = os.environ.get("AWS_ENDPOINT_URL")
 
     if assume_role_arn:
-        logger.info(f"Assuming role: {assume_role_arn}")
-        sts_client = boto3.client("sts", **kwargs)
-
-        if assume_role_external_id:
-            assumed_role_object = sts_client.assume_role(
-                RoleArn=assume_role_arn,
-                ExternalId=assume_role_external_id,
-                RoleSessionName=f"OTF{time()}",
-                DurationSeconds=token_expiry_seconds,
-            )
-        else:
-            assumed_role_object = sts_client.assume_role(
-                RoleArn=assume_role_arn,
-                RoleSessionName=f"OTF{time()}",
-                DurationSeconds=token_expiry_seconds,
-            )
-
-        credentials = assumed_role_object["Credentials"]
-        # Log the assumed role access key id
-        logger.info(f"Assumed role access key id: {credentials['AccessKeyId']}")
+        assumed_role = _get_assumed_role_credentials(
+            assume_role_arn, assume_role_external_id, token_expiry_seconds, kwargs
+        )
+        botocore_session = botocore.session.get_session()
+        botocore_session._credentials = (  # pylint: disable=protected-access
+            assumed_role["credentials"]
+        )
+        session = boto3.session.Session(botocore_session=botocore_session)
+
+        return {
+            "client": session.client(client_type, **kwargs, config=config),
+            "assumed_role": assumed_role,
+        }
 
     kwargs2 = {
         "aws_access_key_id": credentials["AccessKeyId"],
@@ -133,7 +401,7 @@ def get_aws_client(  # pylint: disable=too-many-positional-arguments
 
     return {
         "client": session.client(client_type, **kwargs, config=config),
-        "temporary_creds": credentials if assume_role_arn else None,
+        "assumed_role": None,
     }
 
 
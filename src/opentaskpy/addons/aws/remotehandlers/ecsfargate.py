@@ -1,27 +1,37 @@
 """AWS Fargate Task remote handler."""
 
-from datetime import datetime, timedelta
-from time import sleep
+from time import monotonic
+from typing import TYPE_CHECKING
 
-import boto3
 import opentaskpy.otflogging
-from botocore.exceptions import ClientError
-from dateutil.tz import tzlocal
 from opentaskpy.remotehandlers.remotehandler import RemoteExecutionHandler
 
-from .creds import get_aws_client, set_aws_creds
+from .base import AWSHandlerBase
+from .creds import get_aws_client, release_aws_client
+from .ecspoller import wait_for_task_status
 
+# boto3 is only imported when it's first needed, to keep the import of this module,
+# and the creation of handlers that never make it as far as AWS, fast
+if TYPE_CHECKING:
+    import boto3
 
-class FargateTaskExecution(RemoteExecutionHandler):
+# The task is checked again this often after it's started, and after each change of
+# status, since changes of status tend to happen in quick succession
+DEFAULT_POLL_INTERVAL = 0.5
+# The time between checks doubles while the status stays the same, up to this long
+DEFAULT_MAX_POLL_INTERVAL = 30
+POLL_BACKOFF_FACTOR = 2
+# The task's containers haven't started yet, so there are no logs to follow
+TASK_STARTING_STATUSES = ["PROVISIONING", "PENDING", "ACTIVATING"]
+
+
+class FargateTaskExecution(AWSHandlerBase, RemoteExecutionHandler):
     """AWS Fargate Task remote handler."""
 
     TASK_TYPE = "E"
+    CLIENT_TYPE = "ecs"
     fargate_task_id: str
 
-    def tidy(self) -> None:
-        """Tidy up the ecs client."""
-        self.ecs_client.close()
-
     def __init__(self, spec: dict):
         """Initialise the FargateTaskExecution handler.
 
@@ -31,57 +41,21 @@ class FargateTaskExecution(RemoteExecutionHandler):
         self.logger = opentaskpy.otflogging.init_logging(
             __name__, spec["task_id"], self.TASK_TYPE
         )
-        self.aws_access_key_id: str | None = None
-        self.aws_secret_access_key: str | None = None
-        self.region_name: str | None = None
-        self.temporary_creds: dict | None = None
-        self.token_expiry_seconds: int | None = None
-        self.assume_role_arn: str | None
-        self.ecs_client: boto3.Client = None
 
         super().__init__(spec)
 
-        set_aws_creds(self)
+        # When following the CloudWatch logs of the container being checked, the log
+        # stream, and the token to read the next events from
+        self._logs_client: boto3.Client = None
+        self._container_name: str | None = None
+        self._log_stream_name: str | None = None
+        self._log_stream_checked = False
+        self._log_next_token: str | None = None
 
-        self.credentials: dict = {
-            "AccessKeyId": self.aws_access_key_id,
-            "SecretAccessKey": self.aws_secret_access_key,
-            "region_name": self.region_name,
-        }
-
-        self.validate_or_refresh_creds()
-
-    def validate_or_refresh_creds(self) -> None:
-        """Check the expiry of the temporary credentials, if applicable."""
-        if self.ecs_client and not self.temporary_creds:
-            return
-
-        if self.temporary_creds:
-            self.logger.debug(
-                f"Temporary creds expire at: {self.temporary_creds['Expiration']} - Now: {datetime.now(tz=tzlocal())}"
-            )
-
-        if not self.ecs_client or (
-            self.temporary_creds
-            and self.temporary_creds["Expiration"]
-            < datetime.now(tz=tzlocal()) + timedelta(minutes=1)
-        ):
-
-            if self.temporary_creds:
-                self.logger.info("Renewing temporary credentials")
-
-            client_result = get_aws_client(
-                "ecs",
-                credentials=self.credentials,
-                token_expiry_seconds=self.token_expiry_seconds,
-                assume_role_arn=self.assume_role_arn,
-            )
-            self.temporary_creds = (
-                client_result["temporary_creds"]
-                if client_result["temporary_creds"]
-                else None
-            )
-            self.ecs_client = client_result["client"]
+    @property
+    def ecs_client(self) -> "boto3.Client":
+        """The ECS client, which is created the first time it's used."""
+        return self.client
 
     def kill(self) -> None:
         """Kill the fargate task function.
@@ -98,6 +72,12 @@ class FargateTaskExecution(RemoteExecutionHandler):
         self.tidy()
         self.logger.info("Closed ECS client")
 
+    def tidy(self) -> None:
+        """Release the ECS and CloudWatch Logs clients back to the client pool."""
+        release_aws_client(self._logs_client)
+        self._logs_client = None
+        super().tidy()
+
     def execute(self) -> bool:
         """Execute the Fargate task.
 
@@ -106,17 +86,26 @@ class FargateTaskExecution(RemoteExecutionHandler):
         set within the task definition, it will timeout after that time.
 
         If a cloudwatch log group is defined in the task definition, then the logs will
-        be collected and returned in the output.
+        be followed while the task runs, and returned in the output.
 
         Returns:
             bool: True if the task succeeded, False if it failed.
         """
+        from botocore.exceptions import (  # pylint: disable=import-outside-toplevel
+            ClientError,
+        )
+
         result = True
 
         task = self.spec["taskFamily"]
         cluster_name = self.spec["clusterName"]
         timeout = self.spec.get("timeout", -1)
         init_timeout = self.spec.get("initTimeout", 60)
+        initial_poll_interval = self.spec.get("pollInterval", DEFAULT_POLL_INTERVAL)
+        max_poll_interval = max(
+            self.spec.get("maxPollInterval", DEFAULT_MAX_POLL_INTERVAL),
+            initial_poll_interval,
+        )
 
         try:
             if "containerOverrides" in self.spec:
@@ -153,37 +142,56 @@ class FargateTaskExecution(RemoteExecutionHandler):
                 return False
 
             # Get the task id
-            self.fargate_task_id = run_response["tasks"][0]["taskArn"].split("/")[-1]
-
-            # Now we loop until the task has finished, or until we've timed out
-            # We'll check the status of the task every 5 seconds
-            # If the task has a timeout set, then we'll use that as the timeout
+            task_arn = run_response["tasks"][0]["taskArn"]
+            self.fargate_task_id = task_arn.split("/")[-1]
+
+            # Now we loop until the task has finished, or until we've timed out. The
+            # task is checked frequently at first, and after each change of status,
+            # then less often the longer the status stays the same. Timeouts are
+            # measured from when the task was started.
+            # The checks are made by a poller that's shared with any other tasks
+            # running in this process, so that their describe_tasks calls are batched.
+            # If this task changes status when another task is checked, then the wait
+            # ends early
+            started = monotonic()
+            poll_interval = initial_poll_interval
+            wait_seconds: float = 0
+            last_task_status = None
             while True:
                 self.validate_or_refresh_creds()
                 # Get the task status
                 self.logger.info("Checking status of task")
-                task_status = self.ecs_client.describe_tasks(
-                    cluster=cluster_name, tasks=[self.fargate_task_id]
+                task_description = wait_for_task_status(
+                    self.ecs_client,
+                    cluster_name,
+                    task_arn,
+                    last_task_status,
+                    wait_seconds,
                 )
 
-                # Check that we got a 200 OK response
-                if task_status["ResponseMetadata"]["HTTPStatusCode"] != 200:
+                if not task_description:
                     self.logger.error(
                         f"Failed to get status of fargate task: {task} in cluster"
                         f" {cluster_name}"
                     )
-                    result = False
-                    break
+                    return False
 
                 # Check the status of the task
-                task_status = task_status["tasks"][0]["lastStatus"]
+                task_status = task_description["lastStatus"]
                 self.logger.info(f"Task status: {task_status}")
 
-                # If the task has not started running yet, start decrementing the
-                # init_timer. If the init_timer reaches 0, then we can break out of the
-                # loop and return False
+                if task_status != last_task_status:
+                    poll_interval = initial_poll_interval
+                    last_task_status = task_status
+
+                elapsed = monotonic() - started
+                # Don't sleep past the time that the task would time out
+                remaining = []
+
+                # If the task has not started running yet, check it's not taken longer
+                # than the init timeout
                 if task_status == "PENDING":
-                    if init_timeout <= 0:
+                    if elapsed >= init_timeout:
                         self.logger.error(
                             f"Task: {task} in cluster {cluster_name} timed out while"
                             " initialising."
@@ -191,35 +199,42 @@ class FargateTaskExecution(RemoteExecutionHandler):
                         result = False
                         break
 
-                    init_timeout -= 5
+                    remaining.append(init_timeout - elapsed)
 
                 # If the task has finished, then we can break out of the loop
                 if task_status in ["STOPPED", "DEPROVISIONING"]:
                     break
 
                 # If the task has timed out, then we can break out of the loop
-                if timeout != -1 and timeout <= 0:
-                    self.logger.error(
-                        f"Task: {task} in cluster {cluster_name} timed out"
-                    )
-                    result = False
-                    break
-
-                # If we haven't timed out, then we can sleep for 5 seconds
-                # If the timeout is > -1 then we'll decrement the timeout
                 if timeout != -1:
-                    timeout -= 5
+                    if elapsed >= timeout:
+                        self.logger.error(
+                            f"Task: {task} in cluster {cluster_name} timed out"
+                        )
+                        result = False
+                        break
+
+                    remaining.append(timeout - elapsed)
+
+                # Follow the logs while the task runs, rather than waiting until it's
+                # stopped to fetch them
+                if (
+                    self.spec.get("cloudwatchLogGroupName")
+                    and task_status not in TASK_STARTING_STATUSES
+                    and task_description["containers"]
+                ):
+                    self._follow_cloudwatch_logs(task_description, task, cluster_name)
 
-                sleep(5)
+                wait_seconds = min(poll_interval, *remaining)
+                poll_interval = min(
+                    poll_interval * POLL_BACKOFF_FACTOR, max_poll_interval
+                )
 
             # If we've got this far, then the task has finished. We need to check the
             # status to see if it succeeded or failed, and if necessary, also pull the
-            # logs from CloudWatch Logs
-            task_status = self.ecs_client.describe_tasks(
-                cluster=cluster_name, tasks=[self.fargate_task_id]
-            )
-
-            if len(task_status["tasks"][0]["containers"]) == 0:
+            # logs from CloudWatch Logs. The last check already described the task, so
+            # there's no need to describe it again
+            if len(task_description["containers"]) == 0:
                 # If there's no containers, then the task either failed, or we're
                 # running in a mocked environment. Here we will fail the task
                 self.logger.error(
@@ -227,57 +242,20 @@ class FargateTaskExecution(RemoteExecutionHandler):
                 )
                 return False
 
-            if (
-                len(task_status["tasks"][0]["containers"]) > 1
-                and "containerName" not in self.spec
-            ):
-                # If there are multiple containers, and a specific container is not specified,
-                # we need to warn that we might be checking the wrong container's status
-                # and default to the first container
-                container_name = task_status["tasks"][0]["containers"][0]["name"]
-                self.logger.warning(
-                    f"Multiple containers found for task: {task} in cluster {cluster_name}. "
-                    + "Container Name not specified, so defaulting to first container. "
-                    + f"Checking container: {container_name}"
-                )
-            elif (
-                len(task_status["tasks"][0]["containers"]) == 1
-                and "containerName" not in self.spec
-            ):
-                # If there's only one container, we can safely assume that this is the
-                # container we want to check
-                container_name = task_status["tasks"][0]["containers"][0]["name"]
-                self.logger.info(
-                    f"Only one container found for task: {task} in cluster {cluster_name}."
-                    + f" Checking container: {container_name}"
-                )
-            elif "containerName" in self.spec:
-                # If a specific container is specified, we need to check that it exists
-                container_name = self.spec["containerName"]
-                if not any(
-                    container["name"] == container_name
-                    for container in task_status["tasks"][0]["containers"]
-                ):
-                    self.logger.warning(
-                        f"Container: {container_name} not found in task: {task} in"
-                        + f" cluster {cluster_name}, so defaulting to first container"
-                    )
-                    container_name = task_status["tasks"][0]["containers"][0]["name"]
-                else:
-                    self.logger.info(
-                        f"Checking container: {container_name} for task: {task} in"
-                        + f" cluster {cluster_name}"
-                    )
+            container_name = self._get_container_name(
+                task_description, task, cluster_name
+            )
 
-            # Do we need to obtain logs?
+            # Do we need to obtain logs? Anything logged since they were last
+            # followed is fetched now
             if self.spec.get("cloudwatchLogGroupName"):
-                self._get_cloudwatch_logs(task, container_name, cluster_name)
+                self._follow_cloudwatch_logs(task_description, task, cluster_name)
 
             # Check the exitCode of the specified container to get the result
             container = next(
                 (
                     c
-                    for c in task_status["tasks"][0]["containers"]
+                    for c in task_description["containers"]
                     if c["name"] == container_name
                 ),
                 None,
@@ -306,7 +284,7 @@ class FargateTaskExecution(RemoteExecutionHandler):
                 reason = (
                     container["reason"]
                     if "reason" in container
-                    else task_status["tasks"][0]["stoppedReason"]
+                    else task_description["stoppedReason"]
                 )
 
                 self.logger.error(
@@ -323,69 +301,156 @@ class FargateTaskExecution(RemoteExecutionHandler):
 
         return result
 
-    def _get_cloudwatch_logs(
-        self, task: str, container_name: str, cluster_name: str
-    ) -> None:
-        # Get the task definition to check the logging configuration
-        task_definition = self.ecs_client.describe_task_definition(taskDefinition=task)
-        for container_def in task_definition["taskDefinition"]["containerDefinitions"]:
-            if not (
-                "logConfiguration" in container_def
-                or "options" in container_def["logConfiguration"]
-            ):
-                self.logger.warning(
-                    f"Container: {container_name} in task: {task} in cluster. "
-                    + f" {cluster_name} does not have logging enabled, skipping log fetch"
-                )
-                continue
-
-            # Check if the container has logging enabled to the specified log group
-            if (
-                container_def["logConfiguration"]["options"]["awslogs-group"]
-                != self.spec["cloudwatchLogGroupName"]
+    def _get_container_name(
+        self, task_description: dict, task: str, cluster_name: str
+    ) -> str:
+        if self._container_name:
+            return self._container_name
+
+        container_name: str
+        if len(task_description["containers"]) > 1 and "containerName" not in self.spec:
+            # If there are multiple containers, and a specific container is not specified,
+            # we need to warn that we might be checking the wrong container's status
+            # and default to the first container
+            container_name = task_description["containers"][0]["name"]
+            self.logger.warning(
+                f"Multiple containers found for task: {task} in cluster {cluster_name}. "
+                + "Container Name not specified, so defaulting to first container. "
+                + f"Checking container: {container_name}"
+            )
+        elif (
+            len(task_description["containers"]) == 1
+            and "containerName" not in self.spec
+        ):
+            # If there's only one container, we can safely assume that this is the
+            # container we want to check
+            container_name = task_description["containers"][0]["name"]
+            self.logger.info(
+                f"Only one container found for task: {task} in cluster {cluster_name}."
+                + f" Checking container: {container_name}"
+            )
+        elif "containerName" in self.spec:
+            # If a specific container is specified, we need to check that it exists
+            container_name = self.spec["containerName"]
+            if not any(
+                container["name"] == container_name
+                for container in task_description["containers"]
             ):
                 self.logger.warning(
-                    f"Container: {container_name} in task: {task} in cluster"
-                    f" {cluster_name} does not have logging enabled to the specified log group, skipping log fetch"
+                    f"Container: {container_name} not found in task: {task} in"
+                    + f" cluster {cluster_name}, so defaulting to first container"
                 )
-                continue
-            if (
-                "awslogs-group" in container_def["logConfiguration"]["options"]
-                and container_def["logConfiguration"]["options"]["awslogs-group"]
-                == self.spec["cloudwatchLogGroupName"]
-            ):
+                container_name = task_description["containers"][0]["name"]
+            else:
                 self.logger.info(
-                    f"Container: {container_name} in task: {task} in cluster"
-                    f" {cluster_name} has logging enabled to specified log group, fetching logs"
-                )
-                if (
-                    "awslogs-stream-prefix"
-                    in container_def["logConfiguration"]["options"]
-                ):
-                    logstream_name = f"{container_def['logConfiguration']['options']['awslogs-stream-prefix']}/{container_name}/{self.fargate_task_id}"
-                else:
-                    logstream_name = f"{container_name}/{self.fargate_task_id}"
-                # Get the log events
-                log_events = get_aws_client(
-                    "logs",
-                    credentials=self.credentials,
-                    assume_role_arn=self.assume_role_arn,
-                )["client"].get_log_events(
-                    logGroupName=self.spec["cloudwatchLogGroupName"],
-                    logStreamName=logstream_name,
+                    f"Checking container: {container_name} for task: {task} in"
+                    + f" cluster {cluster_name}"
                 )
 
-                # Get the logs
-                logs = []
+        self._container_name = container_name
+        return container_name
+
+    def _follow_cloudwatch_logs(
+        self, task_description: dict, task: str, cluster_name: str
+    ) -> None:
+        from botocore.exceptions import (  # pylint: disable=import-outside-toplevel
+            ClientError,
+        )
+
+        if not self._log_stream_checked:
+            self._log_stream_checked = True
+            self._log_stream_name = self._get_log_stream_name(
+                task_description, task, cluster_name
+            )
+        if not self._log_stream_name:
+            return
+
+        if not self._logs_client:
+            self._logs_client = get_aws_client(
+                "logs",
+                credentials=self.credentials,
+                token_expiry_seconds=self.token_expiry_seconds,
+                assume_role_arn=self.assume_role_arn,
+                assume_role_external_id=self.assume_role_external_id,
+            )["client"]
+
+        # Read every page of events since the last call, logging each page as it's
+        # returned rather than holding them all in memory
+        try:
+            while True:
+                kwargs = {
+                    "logGroupName": self.spec["cloudwatchLogGroupName"],
+                    "logStreamName": self._log_stream_name,
+                    "startFromHead": True,
+                }
+                if self._log_next_token:
+                    kwargs["nextToken"] = self._log_next_token
+                log_events = self._logs_client.get_log_events(**kwargs)
+
+                if not self._log_next_token:
+                    self.logger.info("Fargate Task output:")
                 for event in log_events["events"]:
-                    logs.append(event["message"])
+                    self.logger.info(event["message"])
 
-                self.logger.info("Fargate Task output:")
-                # Log the messages to the logger
-                for line in logs:
-                    self.logger.info(line)
-            else:
-                self.logger.warning(
-                    f"Container: {container_name} in task: {task} in cluster"
-                    f" {cluster_name} does not have logging enabled, skipping log fetch"
+                # The end of the stream has been reached when the token returned is the
+                # same as the one that was passed in
+                if log_events["nextForwardToken"] == self._log_next_token:
+                    return
+                self._log_next_token = log_events["nextForwardToken"]
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                self.logger.debug(
+                    f"Log stream: {self._log_stream_name} has not been created yet"
                 )
+                return
+
+            self.logger.warning(
+                f"Failed to get logs from log stream: {self._log_stream_name}: {e}"
+            )
+
+    def _get_log_stream_name(
+        self, task_description: dict, task: str, cluster_name: str
+    ) -> str | None:
+        container_name = self._get_container_name(task_description, task, cluster_name)
+
+        # Get the task definition to check the logging configuration of the container
+        task_definition = self.ecs_client.describe_task_definition(
+            taskDefinition=task_description.get("taskDefinitionArn", task)
+        )
+        container_def: dict = next(
+            (
+                container_def
+                for container_def in task_definition["taskDefinition"][
+                    "containerDefinitions"
+                ]
+                if container_def["name"] == container_name
+            ),
+            {},
+        )
+        log_options = container_def.get("logConfiguration", {}).get("options", {})
+
+        if "awslogs-group" not in log_options:
+            self.logger.warning(
+                f"Container: {container_name} in task: {task} in cluster"
+                f" {cluster_name} does not have logging enabled, skipping log fetch"
+            )
+            return None
+
+        if log_options["awslogs-group"] != self.spec["cloudwatchLogGroupName"]:
+            self.logger.warning(
+                f"Container: {container_name} in task: {task} in cluster"
+                f" {cluster_name} does not have logging enabled to the specified log"
+                " group, skipping log fetch"
+            )
+            return None
+
+        self.logger.info(
+            f"Container: {container_name} in task: {task} in cluster"
+            f" {cluster_name} has logging enabled to specified log group, fetching logs"
+        )
+        if "awslogs-stream-prefix" in log_options:
+            return (
+                f"{log_options['awslogs-stream-prefix']}/{container_name}"
+                f"/{self.fargate_task_id}"
+            )
+        return f"{container_name}/{self.fargate_task_id}"
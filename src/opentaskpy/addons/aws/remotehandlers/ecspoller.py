@@ -0,0 +1,159 @@
+"""Batched status checks for ECS tasks.
+
+Rather than each FargateTaskExecution calling describe_tasks for its own task, handlers
+wait for their task through a single poller that's shared by the whole process. Tasks
+in the same cluster, that are being checked with the same client, are described
+together, up to 100 at a time. When a batch of tasks are run at once, this keeps the
+number of calls low enough that ECS doesn't throttle them.
+
+The poller runs in a background thread, which is started when a handler starts waiting
+and stops once nothing is waiting any more.
+"""
+
+import threading
+from time import monotonic
+from typing import TYPE_CHECKING, Any
+
+import opentaskpy.otflogging
+
+if TYPE_CHECKING:
+    import boto3
+
+# The most tasks that describe_tasks accepts in one call
+DESCRIBE_TASKS_BATCH_SIZE = 100
+
+logger = opentaskpy.otflogging.init_logging(__name__, None, None)
+
+# The tasks being waited for, grouped by the client and cluster used to describe them
+_waiters: dict[tuple[Any, str], list[dict]] = {}
+_condition = threading.Condition()
+_poller_thread: threading.Thread | None = None
+
+
+def wait_for_task_status(
+    ecs_client: "boto3.Client",
+    cluster_name: str,
+    task_arn: str,
+    last_status: str | None,
+    timeout: float,
+) -> dict | None:
+    """Wait for a task to change status, and return its latest description.
+
+    The task is described no later than timeout seconds from now. It may be described
+    sooner, along with other tasks in the same cluster, in which case this returns as
+    soon as its status is different to last_status.
+
+    Args:
+        ecs_client: The ECS client to describe the task with
+        cluster_name: The name of the cluster the task is running in
+        task_arn: The ARN of the task
+        last_status: The last status seen for the task, or None if it hasn't been
+            described yet
+        timeout: The longest time to wait, in seconds
+
+    Returns:
+        dict | None: The task, as returned by describe_tasks, or None if ECS couldn't
+            find it. If describe_tasks raises an exception, it's raised here
+    """
+    waiter: dict = {
+        "task_arn": task_arn,
+        "last_status": last_status,
+        "due": monotonic() + max(timeout, 0),
+        "done": threading.Event(),
+        "task": None,
+        "error": None,
+    }
+
+    with _condition:
+        _waiters.setdefault((ecs_client, cluster_name), []).append(waiter)
+        _start_poller()
+        _condition.notify()
+
+    waiter["done"].wait()
+    if waiter["error"]:
+        raise waiter["error"]
+
+    task: dict | None = waiter["task"]
+    return task
+
+
+def _start_poller() -> None:
+    global _poller_thread  # pylint: disable=global-statement
+
+    if _poller_thread and _poller_thread.is_alive():
+        return
+
+    _poller_thread = threading.Thread(
+        target=_poll, name="otf-aws-ecs-poller", daemon=True
+    )
+    _poller_thread.start()
+
+
+def _poll() -> None:
+    global _poller_thread  # pylint: disable=global-statement
+
+    while True:
+        with _condition:
+            if not _waiters:
+                _poller_thread = None
+                return
+
+            now = monotonic()
+            next_due = min(
+                waiter["due"] for waiters in _waiters.values() for waiter in waiters
+            )
+            if next_due > now:
+                # Woken early if another task starts waiting
+                _condition.wait(next_due - now)
+                continue
+
+            # Every task in a group is described as soon as one of them is due, since
+            # it costs no more to include them
+            due_groups = {
+                key: list(waiters)
+                for key, waiters in _waiters.items()
+                if any(waiter["due"] <= now for waiter in waiters)
+            }
+
+        for (ecs_client, cluster_name), waiters in due_groups.items():
+            _describe_tasks(ecs_client, cluster_name, waiters)
+
+
+def _describe_tasks(
+    ecs_client: "boto3.Client", cluster_name: str, waiters: list[dict]
+) -> None:
+    task_arns = list(dict.fromkeys(waiter["task_arn"] for waiter in waiters))
+
+    tasks = {}
+    error = None
+    try:
+        for i in range(0, len(task_arns), DESCRIBE_TASKS_BATCH_SIZE):
+            batch = task_arns[i : i + DESCRIBE_TASKS_BATCH_SIZE]
+            logger.debug(f"Describing {len(batch)} tasks in cluster {cluster_name}")
+            response = ecs_client.describe_tasks(cluster=cluster_name, tasks=batch)
+            tasks.update({task["taskArn"]: task for task in response["tasks"]})
+    except Exception as e:  # pylint: disable=broad-exception-caught
+        # Raised to every handler waiting on these tasks
+        error = e
+
+    now = monotonic()
+    with _condition:
+        group = _waiters[(ecs_client, cluster_name)]
+        for waiter in waiters:
+            task = tasks.get(waiter["task_arn"])
+            if (
+                not error
+                and task
+                and task["lastStatus"] == waiter["last_status"]
+                and waiter["due"] > now
+            ):
+                # Nothing's changed, and it's not time to return yet
+                continue
+
+            waiter["task"] = task
+            waiter["error"] = error
+            group.remove(waiter)
+            waiter["done"].set()
+
+        if not group:
+            del _waiters[(ecs_client, cluster_name)]
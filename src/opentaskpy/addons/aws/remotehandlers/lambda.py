@@ -2,28 +2,26 @@
 
 import base64
 import json
-from datetime import datetime, timedelta
-from typing import Any
+from typing import TYPE_CHECKING, Any
 
-import boto3
 import opentaskpy.otflogging
-from botocore.config import Config
-from botocore.exceptions import ClientError
-from dateutil.tz import tzlocal
 from opentaskpy.exceptions import InvalidConfigError
 from opentaskpy.remotehandlers.remotehandler import RemoteExecutionHandler
 
-from .creds import get_aws_client, set_aws_creds
+from .base import AWSHandlerBase
 
+# boto3 is only imported when it's first needed, to keep the import of this module,
+# and the creation of handlers that never make it as far as AWS, fast
+if TYPE_CHECKING:
+    import boto3
+    from botocore.config import Config
 
-class LambdaExecution(RemoteExecutionHandler):
+
+class LambdaExecution(AWSHandlerBase, RemoteExecutionHandler):
     """AWS Lambda remote handler."""
 
     TASK_TYPE = "E"
-
-    def tidy(self) -> None:
-        """Tidy up the lambda client."""
-        self.lambda_client.close()  # type: ignore[has-type]
+    CLIENT_TYPE = "lambda"
 
     def __init__(self, spec: dict):
         """Initialise the LambdaExecution handler.
@@ -31,89 +29,47 @@ class LambdaExecution(RemoteExecutionHandler):
         Args:
             spec (dict): The spec for the execution.
         """
-        # Ensure that function_arn is defined in the spec
-        # This is really handled by the schema checks
-
         self.logger = opentaskpy.otflogging.init_logging(
             __name__, spec["task_id"], self.TASK_TYPE
         )
 
-        self.aws_access_key_id: str | None = None
-        self.aws_secret_access_key: str | None = None
-        self.region_name: str | None = None
-
         super().__init__(spec)
 
+        # Ensure that function_arn is defined in the spec
+        # This is really handled by the schema checks
         if "functionArn" not in self.spec:
             raise InvalidConfigError("functionArn not defined in spec")
 
-        self.temporary_creds: dict | None = None
-        self.assume_role_arn: str | None
-        self.lambda_client: boto3.Client = None
-
-        super().__init__(spec)
-
-        set_aws_creds(self)
-
-        self.credentials: dict = {
-            "AccessKeyId": self.aws_access_key_id,
-            "SecretAccessKey": self.aws_secret_access_key,
-            "region_name": self.region_name,
-        }
-
-        self.validate_or_refresh_creds()
-
-    def validate_or_refresh_creds(self) -> None:
-        """Check the expiry of the temporary credentials, if applicable."""
-        if self.lambda_client and not self.temporary_creds:
-            return
-
-        if self.temporary_creds:
-            self.logger.debug(
-                f"Temporary creds expire at: {self.temporary_creds['Expiration']} - Now: {datetime.now(tz=tzlocal())}"
+    @property
+    def lambda_client(self) -> "boto3.Client":
+        """The lambda client, which is created the first time it's used."""
+        return self.client
+
+    def get_client_config(self) -> "Config":
+        """Set the retries and read timeout for the lambda client."""
+        # Set boto retries to 0 unless explicitly overridden in spec - retries will normally be handled within lambda code if required
+        config_options: dict[str, Any] = {}
+        if "max_attempts" in self.spec["protocol"]:
+            config_options["retries"] = {
+                "max_attempts": self.spec["protocol"]["max_attempts"]
+            }
+            self.logger.info(
+                f"Setting max attempts to {self.spec['protocol']['max_attempts']}"
             )
+        else:
+            config_options["retries"] = {"max_attempts": 0}
+        # If protocol has a botocoreReadTimeout set, then create a custom config with that set
+        if "botocoreReadTimeout" in self.spec["protocol"]:
+            config_options["read_timeout"] = self.spec["protocol"][
+                "botocoreReadTimeout"
+            ]
+            config_options["tcp_keepalive"] = True
+
+        from botocore.config import (  # pylint: disable=import-outside-toplevel
+            Config,
+        )
 
-        if not self.lambda_client or (
-            self.temporary_creds
-            and self.temporary_creds["Expiration"]
-            < datetime.now(tz=tzlocal()) + timedelta(minutes=1)
-        ):
-
-            if self.temporary_creds:
-                self.logger.info("Renewing temporary credentials")
-
-            # Set boto retries to 0 unless explicitly overridden in spec - retries will normally be handled within lambda code if required
-            config_options: dict[str, Any] = {}
-            if "max_attempts" in self.spec["protocol"]:
-                config_options["retries"] = {
-                    "max_attempts": self.spec["protocol"]["max_attempts"]
-                }
-                self.logger.info(
-                    f"Setting max attempts to {self.spec['protocol']['max_attempts']}"
-                )
-            else:
-                config_options["retries"] = {"max_attempts": 0}
-            # If protocol has a botocoreReadTimeout set, then create a custom config with that set
-            if "botocoreReadTimeout" in self.spec["protocol"]:
-                config_options["read_timeout"] = self.spec["protocol"][
-                    "botocoreReadTimeout"
-                ]
-                config_options["tcp_keepalive"] = True
-
-            config = Config(**config_options)
-
-            client_result = get_aws_client(
-                "lambda",
-                self.credentials,
-                assume_role_arn=self.assume_role_arn,
-                config=config,
-            )
-            self.temporary_creds = (
-                client_result["temporary_creds"]
-                if client_result["temporary_creds"]
-                else None
-            )
-            self.lambda_client = client_result["client"]
+        return Config(**config_options)
 
     def kill(self) -> None:
         """Kill the lambda function.
@@ -137,6 +93,10 @@ class LambdaExecution(RemoteExecutionHandler):
         An async call will not check the status of the lambda function, only if there
         are errors with invoking it.
         """
+        from botocore.exceptions import (  # pylint: disable=import-outside-toplevel
+            ClientError,
+        )
+
         result = True
 
         function_arn = self.spec["functionArn"]
@@ -1,28 +1,163 @@
 """AWS S3 remote handler."""
 
 import glob
+import json
 import os
 import re
-from datetime import datetime, timedelta
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import cached_property
+from itertools import repeat
+from time import monotonic, time
+from typing import TYPE_CHECKING
+from urllib.parse import unquote_plus
 
-import boto3
 import opentaskpy.otflogging
-from botocore.exceptions import ClientError
-from dateutil.tz import tzlocal
 from opentaskpy.remotehandlers.remotehandler import (
     RemoteExecutionHandler,
     RemoteTransferHandler,
 )
 
-from .creds import get_aws_client, set_aws_creds
+from .base import AWSHandlerBase
+from .creds import get_aws_client, release_aws_client
 
-MAX_OBJECTS_PER_QUERY = 100
+# boto3 is only imported when it's first needed, to keep the import of this module,
+# and the creation of handlers that never make it as far as AWS, fast
+if TYPE_CHECKING:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
 
+# S3 won't return more than 1000 keys per page, regardless of what is requested
+DEFAULT_LIST_PAGE_SIZE = 1000
 
-class S3Transfer(RemoteTransferHandler):
+# The number of files to transfer at once, and the size of the client's connection
+# pool when that isn't enough
+DEFAULT_MAX_CONCURRENT_FILES = 10
+DEFAULT_MAX_POOL_CONNECTIONS = 10
+
+# The maximum number of keys that can be deleted in a single delete_objects request
+MAX_KEYS_PER_DELETE = 1000
+
+# Map of the transferConfig protocol attributes to the boto3 TransferConfig arguments
+TRANSFER_CONFIG_ATTRIBUTES = {
+    "multipartThreshold": "multipart_threshold",
+    "multipartChunksize": "multipart_chunksize",
+    "maxConcurrency": "max_concurrency",
+    "maxIoQueue": "max_io_queue",
+    "ioChunksize": "io_chunksize",
+    "useThreads": "use_threads",
+    "maxInMemoryUploadChunks": "max_in_memory_upload_chunks",
+}
+
+REGEX_SPECIAL_CHARACTERS = ".^$*+?{}[]()|"
+REGEX_QUANTIFIERS = "*+?{"
+
+# The longest time SQS allows a receive_message call to wait for messages
+DEFAULT_EVENT_WAIT_TIME_SECONDS = 20
+# The default file watch timeout, as used by the transfer task handler
+DEFAULT_FILE_WATCH_TIMEOUT = 60
+
+
+def get_regex_literal_prefix(pattern: re.Pattern) -> str:
+    """Return the literal text that any match of the pattern must start with.
+
+    This is used to narrow down the prefix used when listing objects, so that S3 only
+    returns keys that could possibly match. It's deliberately conservative; if the
+    pattern contains anything that isn't understood, the prefix stops there.
+
+    Args:
+        pattern (re.Pattern): The compiled regex to get the prefix for.
+
+    Returns:
+        str: The literal prefix, or an empty string if there isn't one.
+    """
+    # Alternation or case insensitivity means there's no single prefix to use
+    if pattern.flags & (re.IGNORECASE | re.VERBOSE) or "|" in pattern.pattern:
+        return ""
+
+    text = pattern.pattern
+    i = 1 if text.startswith("^") else 0
+    prefix = ""
+    while i < len(text):
+        char = text[i]
+        if char == "\\":
+            # Only escaped punctuation is a literal, e.g. \. or \-. Things like \d
+            # are character classes
+            if i + 1 >= len(text) or text[i + 1].isalnum():
+                break
+            literal = text[i + 1]
+            width = 2
+        elif char in REGEX_SPECIAL_CHARACTERS:
+            break
+        else:
+            literal = char
+            width = 1
+
+        # If there's a quantifier after this character, then it might not appear
+        if i + width < len(text) and text[i + width] in REGEX_QUANTIFIERS:
+            break
+
+        prefix += literal
+        i += width
+
+    return prefix
+
+
+def get_created_objects(message_body: str) -> list[dict]:
+    """Return the objects created according to an S3 event notification.
+
+    Handles notifications sent to SQS directly by S3, those sent via SNS, and those
+    sent via EventBridge. Anything else, including the test event S3 sends when
+    notifications are first configured, is ignored.
+
+    Args:
+        message_body (str): The body of the SQS message.
+
+    Returns:
+        list[dict]: The bucket, key, size and event_time of each created object.
+    """
+    try:
+        message = json.loads(message_body)
+        # Notifications delivered via SNS are wrapped in an SNS message
+        if isinstance(message, dict) and message.get("Type") == "Notification":
+            message = json.loads(message["Message"])
+    except (json.JSONDecodeError, KeyError, TypeError):
+        return []
+
+    if not isinstance(message, dict):
+        return []
+
+    # EventBridge events contain a single object
+    if message.get("detail-type") == "Object Created":
+        return [
+            {
+                "bucket": message["detail"]["bucket"]["name"],
+                "key": message["detail"]["object"]["key"],
+                "size": message["detail"]["object"].get("size", 0),
+                "event_time": message["time"],
+            }
+        ]
+
+    return [
+        {
+            "bucket": record["s3"]["bucket"]["name"],
+            # Keys in S3 notifications are URL encoded
+            "key": unquote_plus(record["s3"]["object"]["key"]),
+            "size": record["s3"]["object"].get("size", 0),
+            "event_time": record["eventTime"],
+        }
+        for record in message.get("Records", [])
+        if record.get("eventName", "").startswith("ObjectCreated:")
+    ]
+
+
+class S3Transfer(AWSHandlerBase, RemoteTransferHandler):
     """S3 remote transfer handler."""
 
     TASK_TYPE = "T"
+    CLIENT_TYPE = "s3"
 
     def __init__(self, spec: dict):
         """Initialise the S3Transfer handler.
@@ -34,59 +169,72 @@ class S3Transfer(RemoteTransferHandler):
         self.logger = opentaskpy.otflogging.init_logging(
             __name__, spec["task_id"], self.TASK_TYPE
         )
-        self.aws_access_key_id: str | None = None
-        self.aws_secret_access_key: str | None = None
-        self.region_name: str | None = None
-        self.temporary_creds: dict | None = None
-        self.token_expiry_seconds: int | None = None
-        self.assume_role_arn: str | None
-        self.assume_role_external_id: str | None = None
-        self.s3_client: boto3.Client = None
 
         super().__init__(spec)
 
-        set_aws_creds(self)
-
-        self.credentials: dict = {
-            "AccessKeyId": self.aws_access_key_id,
-            "SecretAccessKey": self.aws_secret_access_key,
-            "region_name": self.region_name,
-        }
-
-        self.validate_or_refresh_creds()
-
-    def validate_or_refresh_creds(self) -> None:
-        """Check the expiry of the temporary credentials, if applicable."""
-        if self.s3_client and not self.temporary_creds:
-            return
-
-        if self.temporary_creds:
-            self.logger.debug(
-                f"Temporary creds expire at: {self.temporary_creds['Expiration']} - Now: {datetime.now(tz=tzlocal())}"
-            )
+        self.list_page_size: int = self.spec["protocol"].get(
+            "listPageSize", DEFAULT_LIST_PAGE_SIZE
+        )
+        self.recursive: bool = self.spec.get("recursive", False)
+        self.max_concurrent_files: int = self.spec["protocol"].get(
+            "maxConcurrentFiles", DEFAULT_MAX_CONCURRENT_FILES
+        )
 
-        if not self.s3_client or (
-            self.temporary_creds
-            and self.temporary_creds["Expiration"]
-            < datetime.now(tz=tzlocal()) + timedelta(minutes=1)
-        ):
+        # Whether the file watch has found any files yet. When it uses event
+        # notifications, the monotonic and wall clock times the watch started
+        self._sqs_client: boto3.Client = None
+        self._file_watch_started: float | None = None
+        self._file_watch_start_time = 0.0
+        self._file_watch_complete = False
+        # When the file watch is incremental, the last key listed
+        self._file_watch_cursor: str | None = None
+
+    @property
+    def s3_client(self) -> "boto3.Client":
+        """The S3 client, which is created the first time it's used."""
+        return self.client
+
+    @cached_property
+    def transfer_config(self) -> "TransferConfig":
+        """The boto3 transfer config built from the transferConfig protocol options."""
+        from boto3.s3.transfer import (  # pylint: disable=import-outside-toplevel
+            TransferConfig,
+        )
 
-            if self.temporary_creds:
-                self.logger.info("Renewing temporary credentials")
+        options = {
+            TRANSFER_CONFIG_ATTRIBUTES[attribute]: value
+            for attribute, value in self.spec["protocol"]
+            .get("transferConfig", {})
+            .items()
+        }
+        # boto3 doesn't accept this as an argument, but s3transfer reads it from the
+        # config
+        max_in_memory_upload_chunks = options.pop("max_in_memory_upload_chunks", None)
+
+        transfer_config = TransferConfig(**options)
+        if max_in_memory_upload_chunks:
+            transfer_config.max_in_memory_upload_chunks = max_in_memory_upload_chunks
+        return transfer_config
+
+    def get_client_config(self) -> "Config":
+        """Size the client's connection pool for the number of concurrent transfers."""
+        from botocore.config import (  # pylint: disable=import-outside-toplevel
+            Config,
+        )
 
-            client_result = get_aws_client(
-                "s3",
-                self.credentials,
-                token_expiry_seconds=self.token_expiry_seconds,
-                assume_role_arn=self.assume_role_arn,
-                assume_role_external_id=self.assume_role_external_id,
+        # Make sure there's a connection available for every thread of every file
+        # being transferred at once
+        return Config(
+            max_pool_connections=max(
+                self.max_concurrent_files
+                * (
+                    self.transfer_config.max_concurrency
+                    if self.transfer_config.use_threads
+                    else 1
+                ),
+                DEFAULT_MAX_POOL_CONNECTIONS,
             )
-            self.temporary_creds = (
-                client_result["temporary_creds"]
-                if client_result["temporary_creds"]
-                else None
-            )
-            self.s3_client = client_result["client"]
+        )
 
     def supports_direct_transfer(self) -> bool:
         """Return True, as you can do bucket to bucket transfers."""
@@ -95,6 +243,9 @@ class S3Transfer(RemoteTransferHandler):
     def handle_post_copy_action(self, files: list[str]) -> int:
         """Handle the post copy action specified in the config.
 
+        For move and rename, the files are copied concurrently, and the originals are
+        then deleted in batches.
+
         Args:
             files (list[str]): A list of files that need to be handled.
 
@@ -108,43 +259,21 @@ class S3Transfer(RemoteTransferHandler):
         # Delete the files
         if self.spec["postCopyAction"]["action"] == "delete":
             self.logger.info(f"Deleting files: {files}")
-            response = self.s3_client.delete_objects(
-                Bucket=self.spec["bucket"],
-                Delete={
-                    "Objects": [{"Key": file} for file in files],
-                    "Quiet": True,
-                },
-            )
-
-            # Check response for errors
-            if response.get("Errors"):
-                self.logger.error(response)
+            if self._delete_objects(self.spec["bucket"], list(files)) != 0:
                 return 1
 
             # Verify the files have been deleted
-            for file in files:
-                try:
-                    response = self.s3_client.head_object(
-                        Bucket=self.spec["bucket"], Key=file
-                    )
-                    self.logger.error(response)
-                    self.logger.error(f"Failed to delete file: {file}")
-                    return 1
-                except ClientError as e:
-                    # If it's a 404 then its good
-                    if e.response["Error"]["Code"] == "404":
-                        continue
-                    # Otherwise, it's an error
-                    self.logger.exception(e)
-                    return 1
+            return self._verify_deleted(self.spec["bucket"], list(files))
 
         # Copy the files to the new location, and then delete the originals
         if (
             self.spec["postCopyAction"]["action"] == "move"
             or self.spec["postCopyAction"]["action"] == "rename"
         ):
+            source_bucket = self.spec["bucket"]
+            dest_buckets = []
+            new_files = []
             for file in files:
-                source_bucket = self.spec["bucket"]
                 dest_bucket = self.spec["bucket"]
                 new_file = (
                     f"{self.spec['postCopyAction']['destination']}{file.split('/')[-1]}"
@@ -169,55 +298,131 @@ class S3Transfer(RemoteTransferHandler):
                             + file.split("/")[-1]
                         )
 
-                self.logger.info(
-                    f'"Moving" file from s3://{source_bucket}/{file} to s3://{dest_bucket}/{new_file}'
-                )
-                copy_source = {"Bucket": source_bucket, "Key": file}
-                self.s3_client.copy(copy_source, dest_bucket, new_file)
-
-                # Check that the copy worked
-                try:
-                    self.s3_client.head_object(Bucket=dest_bucket, Key=new_file)
-                except Exception as e:
-                    # Print the exception message
-                    self.logger.error(e)
-                    self.logger.error(f"Failed to copy file: {file}")
-                    return 1
+                dest_buckets.append(dest_bucket)
+                new_files.append(new_file)
 
-                response = self.s3_client.delete_objects(
-                    Bucket=source_bucket,
-                    Delete={
-                        "Objects": [{"Key": file}],
-                        "Quiet": True,
-                    },
-                )
-                # Check response for errors
-                if response.get("Errors"):
-                    self.logger.error(response)
+            copy_results = self._map_concurrently(
+                self._move_file, files, dest_buckets, new_files
+            )
+
+            # The managed copy raises an exception if it fails, so there's no need to
+            # HEAD the new objects. Only the files that were copied successfully are
+            # deleted
+            copied_files = [
+                file
+                for file, copy_result in zip(files, copy_results, strict=True)
+                if copy_result == 0
+            ]
+            result = 1 if len(copied_files) != len(copy_results) else 0
+
+            if copied_files:
+                if self._delete_objects(source_bucket, copied_files) != 0:
                     return 1
 
                 # Check that the delete worked
-                try:
-                    response = self.s3_client.head_object(
-                        Bucket=source_bucket, Key=file
-                    )
-                    self.logger.error(response)
-                    self.logger.error(f"Failed to delete file: {file}")
-                    return 1
-                except ClientError as e:
-                    # If it's a 404 then its good
-                    if e.response["Error"]["Code"] == "404":
-                        continue
-                    # Otherwise, it's an error
-                    self.logger.exception(e)
+                if self._verify_deleted(source_bucket, copied_files) != 0:
                     return 1
+
+            return result
+
+        return 0
+
+    def _move_file(self, file: str, dest_bucket: str, new_file: str) -> int:
+        source_bucket = self.spec["bucket"]
+        self.logger.info(
+            f'"Moving" file from s3://{source_bucket}/{file} to s3://{dest_bucket}/{new_file}'
+        )
+        copy_source = {"Bucket": source_bucket, "Key": file}
+        try:
+            self.s3_client.copy(
+                copy_source, dest_bucket, new_file, Config=self.transfer_config
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            # Print the exception message
+            self.logger.error(e)
+            self.logger.error(f"Failed to copy file: {file}")
+            return 1
+
         return 0
 
+    def _delete_objects(self, bucket: str, keys: list[str]) -> int:
+        """Delete the objects from the bucket, in batches of up to 1000 keys.
+
+        Args:
+            bucket (str): The bucket to delete the objects from.
+            keys (list[str]): The keys of the objects to delete.
+
+        Returns:
+            int: 0 if successful, 1 if not.
+        """
+        for i in range(0, len(keys), MAX_KEYS_PER_DELETE):
+            response = self.s3_client.delete_objects(
+                Bucket=bucket,
+                Delete={
+                    "Objects": [
+                        {"Key": key} for key in keys[i : i + MAX_KEYS_PER_DELETE]
+                    ],
+                    "Quiet": True,
+                },
+            )
+
+            # Check response for errors
+            if response.get("Errors"):
+                self.logger.error(response)
+                return 1
+
+        return 0
+
+    def _verify_deleted(self, bucket: str, keys: list[str]) -> int:
+        """Check that each of the objects no longer exists in the bucket.
+
+        Any keys that failed to delete are already reported in the errors returned
+        by delete_objects, so this is only done if verifyDeletes is set in the
+        postCopyAction.
+
+        Args:
+            bucket (str): The bucket the objects were deleted from.
+            keys (list[str]): The keys of the objects that were deleted.
+
+        Returns:
+            int: 0 if none of the objects exist, 1 if not.
+        """
+        if not self.spec["postCopyAction"].get("verifyDeletes", False):
+            return 0
+
+        return self._run_concurrently(self._verify_object_deleted, repeat(bucket), keys)
+
+    def _verify_object_deleted(self, bucket: str, key: str) -> int:
+        from botocore.exceptions import (  # pylint: disable=import-outside-toplevel
+            ClientError,
+        )
+
+        try:
+            response = self.s3_client.head_object(Bucket=bucket, Key=key)
+            self.logger.error(response)
+            self.logger.error(f"Failed to delete file: {key}")
+            return 1
+        except ClientError as e:
+            # If it's a 404 then its good
+            if e.response["Error"]["Code"] == "404":
+                return 0
+            # Otherwise, it's an error
+            self.logger.exception(e)
+            return 1
+
     def list_files(
         self, directory: str | None = None, file_pattern: str | None = None
     ) -> dict:
         """Return list of files that match the source definition.
 
+        If the file watch has an eventSource, then calls made while watching for files
+        list the bucket the first time only, to find any files that already exist.
+        After that, they wait for S3 event notifications on the SQS queue instead.
+
+        If the file watch is incremental, then each call made while watching for files
+        only lists the keys after the last one listed by the previous call, so only new
+        files are returned.
+
         Args:
             directory (str, optional): The directory to search in. Defaults to None.
             file_pattern (str, optional): The file pattern to search for. Defaults to
@@ -226,77 +431,319 @@ class S3Transfer(RemoteTransferHandler):
         Returns:
             dict: A dict of files that match the source definition.
         """
+        if self._is_file_watch(directory, file_pattern):
+            if "eventSource" in self.spec["fileWatch"]:
+                return self._watch_for_files(directory, file_pattern)
+            if self._is_incremental_file_watch():
+                return self._list_new_files(directory, file_pattern)
+
+        return dict(self.iter_files(directory=directory, file_pattern=file_pattern))
+
+    def tidy(self) -> None:
+        """Release the S3 and SQS clients back to the client pool."""
+        release_aws_client(self._sqs_client)
+        self._sqs_client = None
+        super().tidy()
+
+    def _is_file_watch(self, directory: str | None, file_pattern: str | None) -> bool:
+        file_watch = self.spec.get("fileWatch")
+        if not file_watch or self._file_watch_complete:
+            return False
+
+        # The transfer lists the files being watched for until it finds some, then
+        # lists the files to transfer. Those can be the same files, but once the watch
+        # has found them, any further listing is a normal one
+        watch_directory = file_watch.get("directory", self.spec.get("directory"))
+        watch_file_pattern = file_watch.get("fileRegex", self.spec.get("fileRegex"))
+        return bool(directory == watch_directory and file_pattern == watch_file_pattern)
+
+    def _is_incremental_file_watch(self) -> bool:
+        if not self.spec["fileWatch"].get("incremental"):
+            return False
+
+        # Files that fail the conditionals need to be returned again by later calls,
+        # e.g. once they're old enough, so they have to be listed in full
+        if "checkDuringFilewatch" in self.spec.get("conditionals", {}):
+            self.logger.info(
+                "Not listing incrementally, since conditionals are checked during the"
+                " file watch"
+            )
+            return False
+
+        return True
+
+    def _list_new_files(self, directory: str | None, file_pattern: str | None) -> dict:
+        file_regex = re.compile(file_pattern) if file_pattern else None
+
+        files = {}
+        for object_ in self._list_objects(
+            directory, file_regex, start_after=self._file_watch_cursor
+        ):
+            key = object_["Key"]
+            # Keys are listed in order, so the next call can start after this one
+            self._file_watch_cursor = key
+
+            if not self._key_matches(key, directory, file_regex):
+                continue
+
+            self.logger.info(f"Found new file: {key}")
+            files[key] = {
+                "size": object_["Size"],
+                "modified_time": object_["LastModified"].timestamp(),
+            }
+
+        if files:
+            self._file_watch_complete = True
+        return files
+
+    def _watch_for_files(self, directory: str | None, file_pattern: str | None) -> dict:
+        if self._file_watch_started is None:
+            self._file_watch_started = monotonic()
+            self._file_watch_start_time = time()
+            files = dict(
+                self.iter_files(directory=directory, file_pattern=file_pattern)
+            )
+        else:
+            # Don't wait for longer than the file watch has left
+            remaining_seconds = self.spec["fileWatch"].get(
+                "timeout", DEFAULT_FILE_WATCH_TIMEOUT
+            ) - (monotonic() - self._file_watch_started)
+            files = self._receive_created_files(
+                directory, file_pattern, remaining_seconds
+            )
+
+        if files:
+            self._file_watch_complete = True
+        return files
+
+    def _receive_created_files(
+        self,
+        directory: str | None,
+        file_pattern: str | None,
+        remaining_seconds: float,
+    ) -> dict:
+        event_source = self.spec["fileWatch"]["eventSource"]
+        file_regex = re.compile(file_pattern) if file_pattern else None
+
+        wait_time_seconds = max(
+            min(
+                event_source.get("waitTimeSeconds", DEFAULT_EVENT_WAIT_TIME_SECONDS),
+                int(remaining_seconds),
+            ),
+            0,
+        )
+
+        if not self._sqs_client:
+            self._sqs_client = get_aws_client(
+                "sqs",
+                self.credentials,
+                token_expiry_seconds=self.token_expiry_seconds,
+                assume_role_arn=self.assume_role_arn,
+                assume_role_external_id=self.assume_role_external_id,
+            )["client"]
+
+        self.logger.info(
+            f"Waiting up to {wait_time_seconds} secs for events from"
+            f" {event_source['queueUrl']}"
+        )
+        response = self._sqs_client.receive_message(
+            QueueUrl=event_source["queueUrl"],
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=wait_time_seconds,
+        )
+
+        files = {}
+        for message in response.get("Messages", []):
+            for created_object in get_created_objects(message["Body"]):
+                key = created_object["key"]
+                event_time = datetime.fromisoformat(
+                    created_object["event_time"]
+                ).timestamp()
+
+                if created_object["bucket"] != self.spec["bucket"]:
+                    self.logger.warning(
+                        f"Dropping event for {key} in another bucket:"
+                        f" {created_object['bucket']}"
+                    )
+                    continue
+                # Anything created before the watch started was found by the initial
+                # listing, so old notifications left on the queue are ignored
+                if event_time < self._file_watch_start_time:
+                    self.logger.info(
+                        f"Ignoring event for {key} from before the file watch started"
+                    )
+                    continue
+                if not self._key_matches(key, directory, file_regex):
+                    self.logger.debug(f"Ignoring event for non-matching file: {key}")
+                    continue
+
+                self.logger.info(f"Found file: {key}")
+                files[key] = {
+                    "size": created_object["size"],
+                    "modified_time": event_time,
+                }
+
+            # The queue is only used by this watch, so every message is deleted once
+            # it's been read, whether or not it was for a file being watched for.
+            # Otherwise it would be received again by every later check
+            self._sqs_client.delete_message(
+                QueueUrl=event_source["queueUrl"],
+                ReceiptHandle=message["ReceiptHandle"],
+            )
+
+        return files
+
+    def _key_matches(
+        self, key: str, directory: str | None, file_regex: re.Pattern | None
+    ) -> bool:
+        # Apply the same rules as listing the files would
+        if file_regex and not file_regex.match(key.split("/")[-1]):
+            return False
+
+        if directory:
+            if self.recursive:
+                return key.startswith(f"{directory}/")
+            return os.path.dirname(key) == directory
+
+        if "directory" in self.spec and str(self.spec["directory"]):
+            return key.startswith(str(self.spec["directory"]))
+
+        return not key.startswith("/")
+
+    def iter_files(
+        self, directory: str | None = None, file_pattern: str | None = None
+    ) -> Iterator[tuple[str, dict]]:
+        """Yield files that match the source definition as each page is listed.
+
+        This is the streaming equivalent of list_files. Matches are yielded as soon as
+        the page containing them is returned from S3, so callers can stop early
+        without listing the entire prefix.
+
+        When a directory is given, only the objects directly within it are listed,
+        unless recursive is set to true in the spec, in which case objects in any
+        subdirectory beneath it are also returned.
+
+        Args:
+            directory (str, optional): The directory to search in. Defaults to None.
+            file_pattern (str, optional): The file pattern to search for. Defaults to
+            None.
+
+        Yields:
+            tuple[str, dict]: The object key, and a dict containing the size and
+            modified time of the object.
+        """
+        file_regex = re.compile(file_pattern) if file_pattern else None
+
+        for object_ in self._list_objects(directory, file_regex):
+            key = object_["Key"]
+            # Get the filename from the key
+            filename = key.split("/")[-1]
+
+            if file_regex and not file_regex.match(filename):
+                continue
+
+            # Also check the directory
+            if directory and not self.recursive:
+                # Get the directory from the key (using basename)
+                file_directory = os.path.dirname(key)
+                if file_directory != directory:
+                    continue
+
+            if key.startswith("/"):
+                # Make sure that there is no directory in the key
+                # otherwise skip it too as we dont want anything in a subdir
+                # (as directory is not set)
+                continue
+
+            self.logger.info(f"Found file: {filename}")
+
+            # The listing already contains the size and modified time, so there's no
+            # need to HEAD each object
+            yield key, {
+                "size": object_["Size"],
+                "modified_time": object_["LastModified"].timestamp(),
+            }
+
+    def _list_objects(
+        self,
+        directory: str | None,
+        file_regex: re.Pattern | None,
+        start_after: str | None = None,
+    ) -> Iterator[dict]:
         kwargs = {
             "Bucket": self.spec["bucket"],
-            "MaxKeys": MAX_OBJECTS_PER_QUERY,
         }
         if directory:
-            kwargs["Prefix"] = directory
+            # Only list the direct children of the directory, unless a recursive
+            # listing has been requested. Without the delimiter, S3 would return every
+            # key in every subdirectory beneath this one
+            kwargs["Prefix"] = f"{directory}/"
+            if not self.recursive:
+                kwargs["Delimiter"] = "/"
+                # Every matching key must also start with any literal text at the
+                # start of the file pattern, so S3 can filter on that too
+                if file_regex:
+                    kwargs["Prefix"] += get_regex_literal_prefix(file_regex)
         elif "directory" in self.spec and str(self.spec["directory"]):
             kwargs["Prefix"] = str(self.spec["directory"])
 
-        remote_files = {}
+        if start_after:
+            kwargs["StartAfter"] = start_after
 
         self.logger.info(
             f"Listing files in {self.spec['bucket']} matching"
-            f" {file_pattern}{' in ' + (directory or '<Bucket Root directory>')}"
+            f" {file_regex.pattern if file_regex else None}"
+            f"{' in ' + (directory or '<Bucket Root directory>')}"
+            f"{' after ' + start_after if start_after else ''}"
         )
 
-        try:  # pylint: disable=too-many-nested-blocks
+        try:
             while True:
                 # Check that our creds are valid
                 self.validate_or_refresh_creds()
-                response = self.s3_client.list_objects_v2(**kwargs)
-
-                if response["KeyCount"]:
-                    for object_ in response["Contents"]:
-                        key = object_["Key"]
-                        # Get the filename from the key
-                        filename = key.split("/")[-1]
-
-                        if file_pattern and not re.match(file_pattern, filename):
-                            continue
-
-                        # Also check the directory
-                        if directory:
-                            # Get the directory from the key (using basename)
-                            file_directory = os.path.dirname(key)
-                            if directory and file_directory != directory:
-                                continue
-
-                        if key.startswith("/"):
-                            # Make sure that there is no directory in the key
-                            # otherwise skip it too as we dont want anything in a subdir
-                            # (as directory is not set)
-                            continue
-
-                        self.logger.info(f"Found file: {filename}")
-
-                        # Get the size and modified time
-                        file_attr = self.s3_client.head_object(
-                            Bucket=self.spec["bucket"], Key=key
-                        )
-
-                        remote_files[key] = {
-                            "size": file_attr["ContentLength"],
-                            "modified_time": file_attr["LastModified"].timestamp(),
-                        }
-
-                    # This handles the pagination
-                    # if the NextContinuationToken doesn't exist, then we'll break out
-                    # of the loop
-                    try:
-                        kwargs["ContinuationToken"] = response["NextContinuationToken"]
-                    except KeyError:
+                s3_client = self.s3_client
+                paginator = s3_client.get_paginator("list_objects_v2")
+
+                for page in paginator.paginate(
+                    **kwargs, PaginationConfig={"PageSize": self.list_page_size}
+                ):
+                    yield from page.get("Contents", [])
+
+                    if "NextContinuationToken" not in page:
+                        return
+
+                    # If the credentials needed renewing, then the paginator is still
+                    # bound to the old client, so restart it from where we got to
+                    kwargs["ContinuationToken"] = page["NextContinuationToken"]
+                    self.validate_or_refresh_creds()
+                    if self.s3_client is not s3_client:
                         break
                 else:
-                    break
+                    return
         except Exception as e:  # pylint: disable=broad-exception-caught
             self.logger.error(f"Error listing files: {self.spec['bucket']}")
             self.logger.exception(e)
             raise e
 
-        return remote_files
+    def get_object_metadata(self, key: str) -> dict:
+        """Return the full metadata for a single object in the bucket.
+
+        list_files only returns the size and modified time, since that is all that
+        comes back from the object listing. Use this when anything else is needed,
+        e.g. user metadata or server side encryption details.
+
+        Args:
+            key (str): The key of the object to get the metadata for.
+
+        Returns:
+            dict: The response from head_object.
+        """
+        # Check that our creds are valid
+        self.validate_or_refresh_creds()
+
+        return self.s3_client.head_object(  # type: ignore[no-any-return]
+            Bucket=self.spec["bucket"], Key=key
+        )
 
     def move_files_to_final_location(self, files: list[str]) -> None:
         """Not implemented for this handler."""
@@ -312,6 +759,8 @@ class S3Transfer(RemoteTransferHandler):
     ) -> int:
         """Push files from the worker to the destination server.
 
+        Up to max_concurrent_files files are uploaded at once.
+
         Args:
             local_staging_directory (str): The local staging directory to upload the
             files from.
@@ -323,8 +772,6 @@ class S3Transfer(RemoteTransferHandler):
         # Check that our creds are valid
         self.validate_or_refresh_creds()
 
-        result = 0
-
         if file_list:
             files = list(file_list.keys())
         else:
@@ -334,40 +781,44 @@ class S3Transfer(RemoteTransferHandler):
         if self.bucket_owner_full_control:
             kwargs["ACL"] = "bucket-owner-full-control"
 
-        for file in files:
-            # Strip the directory from the file
-            file_name = file.split("/")[-1]
-            # Handle any rename that might be specified in the spec
-            if "rename" in self.spec:
-                rename_regex = self.spec["rename"]["pattern"]
-                rename_sub = self.spec["rename"]["sub"]
+        return self._run_concurrently(self._upload_file, files, repeat(kwargs))
 
-                file_name = re.sub(rename_regex, rename_sub, file_name)
-                self.logger.info(f"Renaming file to {file_name}")
-            self.logger.info(
-                f"Transferring file: {file} to"
-                f" s3://{self.spec['bucket']}/{self.spec['directory']}/{file_name}"
+    def _upload_file(self, file: str, extra_args: dict) -> int:
+        # Strip the directory from the file
+        file_name = file.split("/")[-1]
+        # Handle any rename that might be specified in the spec
+        if "rename" in self.spec:
+            rename_regex = self.spec["rename"]["pattern"]
+            rename_sub = self.spec["rename"]["sub"]
+
+            file_name = re.sub(rename_regex, rename_sub, file_name)
+            self.logger.info(f"Renaming file to {file_name}")
+        self.logger.info(
+            f"Transferring file: {file} to"
+            f" s3://{self.spec['bucket']}/{self.spec['directory']}/{file_name}"
+        )
+        try:
+            self.s3_client.upload_file(
+                file,
+                self.spec["bucket"],
+                f"{self.spec['directory']}/{file_name}",
+                ExtraArgs=extra_args,
+                Config=self.transfer_config,
             )
-            try:
-                self.s3_client.upload_file(
-                    file,
-                    self.spec["bucket"],
-                    f"{self.spec['directory']}/{file_name}",
-                    ExtraArgs=kwargs,
-                )
-            except Exception as e:  # pylint: disable=broad-exception-caught
-                self.logger.error(f"Failed to transfer file: {file}")
-                self.logger.exception(e)
-                result = 1
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Failed to transfer file: {file}")
+            self.logger.exception(e)
+            return 1
 
-        return result
+        return 0
 
     def pull_files_to_worker(
         self, files: list[str], local_staging_directory: str
     ) -> int:
         """Pull files to the worker.
 
-        Download files from AWS S3 to the local staging directory.
+        Download files from AWS S3 to the local staging directory. Up to
+        max_concurrent_files files are downloaded at once.
 
         Args:
             files (list): A list of files to download.
@@ -380,23 +831,61 @@ class S3Transfer(RemoteTransferHandler):
         # Check that our creds are valid
         self.validate_or_refresh_creds()
 
-        result = 0
-        for file in files:
-            # Strip the directory from the file
-            file_name = file.split("/")[-1]
-            self.logger.info(f"Downloading file: {file}")
-            try:
-                self.s3_client.download_file(
-                    self.spec["bucket"],
-                    file,
-                    f"{local_staging_directory}/{file_name}",
-                )
-            except Exception as e:  # pylint: disable=broad-exception-caught
-                self.logger.error(f"Failed to transfer file: {file}")
-                self.logger.exception(e)
-                result = 1
+        return self._run_concurrently(
+            self._download_file, list(files), repeat(local_staging_directory)
+        )
 
-        return result
+    def _download_file(self, file: str, local_staging_directory: str) -> int:
+        # Strip the directory from the file
+        file_name = file.split("/")[-1]
+        self.logger.info(f"Downloading file: {file}")
+        try:
+            self.s3_client.download_file(
+                self.spec["bucket"],
+                file,
+                f"{local_staging_directory}/{file_name}",
+                Config=self.transfer_config,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Failed to transfer file: {file}")
+            self.logger.exception(e)
+            return 1
+
+        return 0
+
+    def _map_concurrently(
+        self, function: Callable[..., int], *iterables: Iterable
+    ) -> list[int]:
+        """Call the function for each set of arguments, using a pool of threads.
+
+        The boto3 client is thread safe, so all threads share the same one. At most
+        max_concurrent_files calls will be running at once.
+
+        Args:
+            function (Callable[..., int]): The function to call. This should return 0
+            if successful, or 1 if not.
+            *iterables (Iterable): The arguments to pass to the function, as with map.
+
+        Returns:
+            list[int]: The result of each call, in the same order as the arguments.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_files) as executor:
+            return list(executor.map(function, *iterables))
+
+    def _run_concurrently(
+        self, function: Callable[..., int], *iterables: Iterable
+    ) -> int:
+        """Call the function for each set of arguments, using a pool of threads.
+
+        Args:
+            function (Callable[..., int]): The function to call. This should return 0
+            if successful, or 1 if not.
+            *iterables (Iterable): The arguments to pass to the function, as with map.
+
+        Returns:
+            int: 0 if every call was successful, 1 if not.
+        """
+        return 1 if any(self._map_concurrently(function, *iterables)) else 0
 
     def transfer_files(
         self,
@@ -406,6 +895,15 @@ class S3Transfer(RemoteTransferHandler):
     ) -> int:
         """Transfer files from the source S3 bucket to the destination bucket.
 
+        The copies are done server side, with up to max_concurrent_files files being
+        copied at once. Files larger than the multipart threshold in the transfer config are
+        copied in parts using UploadPartCopy, with each part copied in parallel.
+
+        If streamingProxy is set in the destination protocol, each file is instead read
+        using the source's credentials and uploaded using the destination's, streaming
+        through the worker in memory. This allows transfers between buckets that can't
+        be accessed with the same credentials, without staging the files on disk.
+
         Args:
             files (dict): A dictionary of files to transfer.
             remote_spec (dict): Not used by this handler.
@@ -422,36 +920,111 @@ class S3Transfer(RemoteTransferHandler):
         # Check the remote handler, if it's another S3Transfer, then it's simple
         # to do an S3 copy via boto
 
-        result = 0
-        for file in files:
-            # Strip the directory from the file
-            file_name = file.split("/")[-1]
-            # Handle any rename that might be specified in the spec
-            if "rename" in dest_remote_handler.spec:
-                rename_regex = dest_remote_handler.spec["rename"]["pattern"]
-                rename_sub = dest_remote_handler.spec["rename"]["sub"]
-
-                file_name = re.sub(rename_regex, rename_sub, file_name)
-                self.logger.info(f"Renaming file to {file_name}")
-            self.logger.info(
-                f"Transferring file: {file} from {self.spec['bucket']} to"
-                f" {dest_remote_handler.spec['bucket']}/{file_name}"
+        # Prefer the destination's transfer config for the copy, if it has one
+        transfer_config = (
+            dest_remote_handler.transfer_config  # type: ignore[attr-defined]
+            if "transferConfig" in dest_remote_handler.spec["protocol"]
+            else self.transfer_config
+        )
+
+        if dest_remote_handler.spec["protocol"].get("streamingProxy", False):
+            dest_remote_handler.validate_or_refresh_creds()  # type: ignore[attr-defined]
+            return self._run_concurrently(
+                self._stream_file,
+                list(files),
+                repeat(dest_remote_handler),
+                repeat(transfer_config),
             )
+
+        return self._run_concurrently(
+            self._copy_file,
+            list(files),
+            repeat(dest_remote_handler),
+            repeat(transfer_config),
+        )
+
+    def _get_dest_file_name(
+        self, file: str, dest_remote_handler: RemoteTransferHandler
+    ) -> str:
+        # Strip the directory from the file
+        file_name = file.split("/")[-1]
+        # Handle any rename that might be specified in the spec
+        if "rename" in dest_remote_handler.spec:
+            rename_regex = dest_remote_handler.spec["rename"]["pattern"]
+            rename_sub = dest_remote_handler.spec["rename"]["sub"]
+
+            file_name = re.sub(rename_regex, rename_sub, file_name)
+            self.logger.info(f"Renaming file to {file_name}")
+        return file_name
+
+    def _copy_file(
+        self,
+        file: str,
+        dest_remote_handler: RemoteTransferHandler,
+        transfer_config: "TransferConfig",
+    ) -> int:
+        file_name = self._get_dest_file_name(file, dest_remote_handler)
+        self.logger.info(
+            f"Transferring file: {file} from {self.spec['bucket']} to"
+            f" {dest_remote_handler.spec['bucket']}/{file_name}"
+        )
+        try:
+            self.s3_client.copy(
+                {
+                    "Bucket": self.spec["bucket"],
+                    "Key": file,
+                },
+                dest_remote_handler.spec["bucket"],
+                f"{dest_remote_handler.spec['directory']}/{file_name}",
+                Config=transfer_config,
+            )
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Error transferring file: {file}")
+            self.logger.exception(e)
+            return 1
+
+        return 0
+
+    def _stream_file(
+        self,
+        file: str,
+        dest_remote_handler: RemoteTransferHandler,
+        transfer_config: "TransferConfig",
+    ) -> int:
+        file_name = self._get_dest_file_name(file, dest_remote_handler)
+        self.logger.info(
+            f"Streaming file: {file} from {self.spec['bucket']} to"
+            f" {dest_remote_handler.spec['bucket']}/{file_name}"
+        )
+
+        extra_args = {}
+        if dest_remote_handler.bucket_owner_full_control:  # type: ignore[attr-defined]
+            extra_args["ACL"] = "bucket-owner-full-control"
+
+        try:
+            body = self.s3_client.get_object(Bucket=self.spec["bucket"], Key=file)[
+                "Body"
+            ]
             try:
-                self.s3_client.copy(
-                    {
-                        "Bucket": self.spec["bucket"],
-                        "Key": file,
-                    },
+                # The body can't be seeked, so it's read one part at a time, and
+                # uploaded as a multipart upload once it's larger than the multipart
+                # threshold. At most max_in_memory_upload_chunks parts of each file
+                # are held in memory at once
+                dest_remote_handler.s3_client.upload_fileobj(  # type: ignore[attr-defined]
+                    body,
                     dest_remote_handler.spec["bucket"],
                     f"{dest_remote_handler.spec['directory']}/{file_name}",
+                    ExtraArgs=extra_args,
+                    Config=transfer_config,
                 )
-            except Exception as e:  # pylint: disable=broad-exception-caught
-                self.logger.error(f"Error transferring file: {file}")
-                self.logger.exception(e)
-                result = 1
+            finally:
+                body.close()
+        except Exception as e:  # pylint: disable=broad-exception-caught
+            self.logger.error(f"Error transferring file: {file}")
+            self.logger.exception(e)
+            return 1
 
-        return result
+        return 0
 
     def create_flag_files(self) -> int:
         """Create the flag files on the S3 bucket.
@@ -482,13 +1055,8 @@ class S3Transfer(RemoteTransferHandler):
 
         return result
 
-    def tidy(self) -> None:
-        """Tidy up the S3 client."""
-        self.s3_client.close()
-        self.s3_client = None  # allow botocore objects to be garbage collected
-
 
-class S3Execution(RemoteExecutionHandler):
+class S3Execution(AWSHandlerBase, RemoteExecutionHandler):
     """S3 remote execution handler.
 
     This is a strange one, because it's not really an execution. But it's a way to
@@ -496,6 +1064,7 @@ class S3Execution(RemoteExecutionHandler):
     """
 
     TASK_TYPE = "E"
+    CLIENT_TYPE = "s3"
 
     def __init__(self, spec: dict):
         """Initialise the S3Execution handler.
@@ -507,57 +1076,12 @@ class S3Execution(RemoteExecutionHandler):
             __name__, spec["task_id"], self.TASK_TYPE
         )
 
-        self.aws_access_key_id: str | None = None
-        self.aws_secret_access_key: str | None = None
-        self.region_name: str | None = None
-        self.temporary_creds: dict | None = None
-        self.assume_role_arn: str | None
-        self.assume_role_external_id: str | None = None
-        self.s3_client: boto3.Client = None
-
         super().__init__(spec)
 
-        set_aws_creds(self)
-
-        self.credentials: dict = {
-            "AccessKeyId": self.aws_access_key_id,
-            "SecretAccessKey": self.aws_secret_access_key,
-            "region_name": self.region_name,
-        }
-
-        self.validate_or_refresh_creds()
-
-    def validate_or_refresh_creds(self) -> None:
-        """Check the expiry of the temporary credentials, if applicable."""
-        if self.s3_client and not self.temporary_creds:
-            return
-
-        if self.temporary_creds:
-            self.logger.debug(
-                f"Temporary creds expire at: {self.temporary_creds['Expiration']} - Now: {datetime.now(tz=tzlocal())}"
-            )
-
-        if not self.s3_client or (
-            self.temporary_creds
-            and self.temporary_creds["Expiration"]
-            < datetime.now(tz=tzlocal()) + timedelta(minutes=1)
-        ):
-
-            if self.temporary_creds:
-                self.logger.info("Renewing temporary credentials")
-
-            client_result = get_aws_client(
-                "s3",
-                self.credentials,
-                assume_role_arn=self.assume_role_arn,
-                assume_role_external_id=self.assume_role_external_id,
-            )
-            self.temporary_creds = (
-                client_result["temporary_creds"]
-                if client_result["temporary_creds"]
-                else None
-            )
-            self.s3_client = client_result["client"]
+    @property
+    def s3_client(self) -> "boto3.Client":
+        """The S3 client, which is created the first time it's used."""
+        return self.client
 
     # This cannot be long running, so kill doesn't really need to do anything
     def kill(self) -> None:
@@ -590,8 +1114,3 @@ class S3Execution(RemoteExecutionHandler):
             result = False
 
         return result
-
-    def tidy(self) -> None:
-        """Tidy up the S3 client."""
-        self.s3_client.close()
-        self.s3_client = None  # allow botocore objects to be garbage collected
@@ -5,19 +5,39 @@ This uses AWS authentication, either from the IAM role of the host,
 by using environment variables, or variables in variables.json file
 """
 
+import asyncio
 import json
 import os
+from collections.abc import Iterator
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any
 
-import boto3
 import opentaskpy.otflogging
-from botocore.exceptions import ClientError
-from jsonpath_ng import parse
+from jsonpath_ng import JSONPath, parse
 from opentaskpy.exceptions import LookupPluginError
 
+from opentaskpy.addons.aws.lookups import (
+    cache_lookup,
+    get_cached_lookup,
+    get_lookup_credentials,
+    lookup_cache_enabled,
+    lookup_cache_key,
+)
+from opentaskpy.addons.aws.remotehandlers.creds import (
+    get_aws_client,
+    release_aws_client,
+)
+
+if TYPE_CHECKING:
+    import boto3
+
 logger = opentaskpy.otflogging.init_logging(__name__)
 
 plugin_name = "secretsmanager"
 
+# The maximum number of secrets that can be passed to a single BatchGetSecretValue call
+BATCH_GET_SECRET_VALUE_BATCH_SIZE = 20
+
 
 def run(**kwargs):  # type: ignore[no-untyped-def]
     """Pull a secret from AWS Secrets Manager.
@@ -54,56 +74,40 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
         os.environ.get("OTF_AWS_SECRETS_LOOKUP_FAILED_IS_ERROR", "0") == "1"
     )
 
-    globals_ = kwargs.get("globals", None)
+    # botocore is imported here rather than at the top of the module, as it's slow to
+    # import and isn't needed until the plugin is actually run
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import ClientError
 
-    aws_access_key_id = (
-        globals_["AWS_ACCESS_KEY_ID"]
-        if globals_ and "AWS_ACCESS_KEY_ID" in globals_
-        else os.environ.get("AWS_ACCESS_KEY_ID")
-    )
-    aws_secret_access_key = (
-        globals_["AWS_SECRET_ACCESS_KEY"]
-        if globals_ and "AWS_SECRET_ACCESS_KEY" in globals_
-        else os.environ.get("AWS_SECRET_ACCESS_KEY")
-    )
+    credentials = get_lookup_credentials(kwargs.get("globals", None))
+    cache_key = lookup_cache_key(plugin_name, kwargs["name"], credentials)
 
-    region_name = (
-        globals_["AWS_REGION"]
-        if globals_ and "AWS_REGION" in globals_
-        else os.environ.get("AWS_REGION")
-    )
-    boto3_kwargs = {
-        "aws_access_key_id": aws_access_key_id,
-        "aws_secret_access_key": aws_secret_access_key,
-        "region_name": region_name,
-    }
-    # If there's an override for endpoint_url in the environment, then use that
-    kwargs2 = {}
-    if os.environ.get("AWS_ENDPOINT_URL"):
-        kwargs2["endpoint_url"] = os.environ.get("AWS_ENDPOINT_URL")
-
-    result = None
+    client = None
     try:
-        session = boto3.session.Session(**boto3_kwargs)
-        secretsmanager = session.client("secretsmanager", **kwargs2)
-        response = secretsmanager.get_secret_value(SecretId=kwargs["name"])
-        result = response["SecretString"]
+        result = get_cached_lookup(cache_key)
+        if result is not None:
+            logger.log(12, f"Using cached value for secret {kwargs['name']}")
+        else:
+            client = get_aws_client("secretsmanager", credentials)["client"]
+            response = client.get_secret_value(SecretId=kwargs["name"])
+            result = response["SecretString"]
+            cache_lookup(cache_key, result)
 
-        # Very simple redacting filter here for secrets, e.g. pgp private keys,
-        # or ssh private keys
-        log_result = result
-        if " private " in result.lower():
-            log_result = "REDACTED"
+            # Very simple redacting filter here for secrets, e.g. pgp private keys,
+            # or ssh private keys
+            log_result = result
+            if " private " in result.lower():
+                log_result = "REDACTED"
 
-        logger.log(12, f"Read '{log_result}' from param {kwargs['name']}")
+            logger.log(12, f"Read '{log_result}' from param {kwargs['name']}")
 
         # If requested to pull a value from the JSON, then parse it and extract the
         # value at the path
         if "value" in kwargs:
             try:
-                result = json.loads(result)
+                result = _load_json(result, cache_key)
                 # Handle the JSONPath
-                jsonpath_expr = parse(kwargs["value"])
+                jsonpath_expr = _compile_json_path(kwargs["value"])
                 result = jsonpath_expr.find(result)
 
                 result = result[0].value
@@ -166,6 +170,8 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
 
         logger.warning("Secrets Manager lookup failed but continuing anyway")
         return "LOOKUP_FAILED"
+    finally:
+        release_aws_client(client)
 
     # Escape any escape characters so they can be stored in JSON as a string
     if result and isinstance(result, str):
@@ -176,3 +182,137 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
         result = result[1:-1]
 
     return result
+
+
+async def run_async(**kwargs):  # type: ignore[no-untyped-def]
+    """Look up a secret without blocking the event loop.
+
+    Runs run in a thread, so several lookups can be awaited concurrently. See
+    resolve_lookups_async in opentaskpy.addons.aws.lookups to resolve many at once.
+
+    Args:
+        **kwargs: The same kwargs as run
+
+    Returns:
+        _type_: The same value as run
+    """
+    return await asyncio.to_thread(run, **kwargs)
+
+
+def prefetch_secrets(names: list[str], globals_: dict | None = None) -> dict:
+    """Read several secrets at once, and add them to the lookup cache.
+
+    Secrets are read using BatchGetSecretValue, 20 at a time, so any lookups of them
+    that follow are served from the cache rather than each making a request. Names
+    that are already cached are skipped. Lookup caching must be enabled by setting
+    OTF_AWS_LOOKUP_CACHE_TTL, otherwise nothing is read.
+
+    BatchGetSecretValue needs boto3 1.33 or later. With older versions, each secret is
+    read with GetSecretValue instead.
+
+    Secrets that can't be read are ignored here, and are reported as normal when
+    they're looked up.
+
+    Args:
+        names: The names or ARNs of the secrets to read
+        globals_: The global variables, used to get the AWS credentials (optional)
+
+    Returns:
+        dict: The secret strings that were read, keyed by the name or ARN requested
+    """
+    if not lookup_cache_enabled():
+        logger.debug("Lookup caching is disabled, so not prefetching secrets")
+        return {}
+
+    credentials = get_lookup_credentials(globals_)
+    names = [
+        name
+        for name in dict.fromkeys(names)
+        if get_cached_lookup(lookup_cache_key(plugin_name, name, credentials)) is None
+    ]
+    if not names:
+        return {}
+
+    values = {}
+    client = get_aws_client("secretsmanager", credentials)["client"]
+    try:
+        if hasattr(client, "batch_get_secret_value"):
+            secrets = _batch_get_secret_values(client, names)
+        else:
+            secrets = _get_secret_values(client, names)
+
+        for name, secret_string in secrets:
+            values[name] = secret_string
+            cache_lookup(
+                lookup_cache_key(plugin_name, name, credentials), secret_string
+            )
+    finally:
+        release_aws_client(client)
+
+    logger.log(12, f"Prefetched {len(values)} of {len(names)} secrets")
+    return values
+
+
+def _batch_get_secret_values(
+    client: "boto3.Client", names: list[str]
+) -> Iterator[tuple[str, str]]:
+    for i in range(0, len(names), BATCH_GET_SECRET_VALUE_BATCH_SIZE):
+        batch = names[i : i + BATCH_GET_SECRET_VALUE_BATCH_SIZE]
+        pagination_kwargs: dict = {}
+        while True:
+            response = client.batch_get_secret_value(
+                SecretIdList=batch, **pagination_kwargs
+            )
+            for secret in response["SecretValues"]:
+                if "SecretString" not in secret:
+                    continue
+                # Secrets can be requested by either name or ARN
+                for name in {secret["Name"], secret["ARN"]} & set(batch):
+                    yield name, secret["SecretString"]
+            for error in response.get("Errors", []):
+                logger.debug(
+                    f"Failed to read secret while prefetching: {error['SecretId']}:"
+                    f" {error['ErrorCode']}"
+                )
+
+            if not response.get("NextToken"):
+                break
+            pagination_kwargs["NextToken"] = response["NextToken"]
+
+
+def _get_secret_values(
+    client: "boto3.Client", names: list[str]
+) -> Iterator[tuple[str, str]]:
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import ClientError
+
+    for name in names:
+        try:
+            response = client.get_secret_value(SecretId=name)
+        except ClientError as e:
+            logger.debug(
+                f"Failed to read secret while prefetching: {name}:"
+                f" {e.response['Error']['Code']}"
+            )
+            continue
+        if "SecretString" in response:
+            yield name, response["SecretString"]
+
+
+@lru_cache(maxsize=256)
+def _compile_json_path(path: str) -> JSONPath:
+    return parse(path)
+
+
+def _load_json(secret: str, cache_key: tuple) -> Any:
+    # Secrets are often used by several lookups with different JSONPaths, so the parsed
+    # JSON is cached alongside the secret. The secret is stored with it, so a secret
+    # that's changed since it was parsed is parsed again
+    json_cache_key = (f"{plugin_name}_json", *cache_key)
+    cached = get_cached_lookup(json_cache_key)
+    if cached is not None and cached[0] == secret:
+        return cached[1]
+
+    parsed = json.loads(secret)
+    cache_lookup(json_cache_key, (secret, parsed))
+    return parsed
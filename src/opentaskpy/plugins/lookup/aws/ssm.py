@@ -5,18 +5,33 @@ This uses AWS authentication, either from the IAM role of the host,
 by using environment variables, or variables in variables.json file
 """
 
+import asyncio
 import json
 import os
 
-import boto3
 import opentaskpy.otflogging
-from botocore.exceptions import ClientError
 from opentaskpy.exceptions import LookupPluginError
 
+from opentaskpy.addons.aws.lookups import (
+    cache_lookup,
+    get_cached_lookup,
+    get_lookup_credentials,
+    lookup_cache_enabled,
+    lookup_cache_key,
+)
+from opentaskpy.addons.aws.remotehandlers.creds import (
+    get_aws_client,
+    release_aws_client,
+)
+
 logger = opentaskpy.otflogging.init_logging(__name__)
 
 plugin_name = "ssm"
 
+PREFETCH_PATHS_ENV = "OTF_AWS_SSM_PREFETCH_PATHS"
+# The maximum number of names that can be passed to a single GetParameters call
+GET_PARAMETERS_BATCH_SIZE = 10
+
 
 def run(**kwargs):  # type: ignore[no-untyped-def]
     """Pull a variable from AWS SSM.
@@ -45,48 +60,35 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
         os.environ.get("OTF_AWS_SECRETS_LOOKUP_FAILED_IS_ERROR", "0") == "1"
     )
 
-    globals_ = kwargs.get("globals", None)
+    # botocore is imported here rather than at the top of the module, as it's slow to
+    # import and isn't needed until the plugin is actually run
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import ClientError
 
-    aws_access_key_id = (
-        globals_["AWS_ACCESS_KEY_ID"]
-        if globals_ and "AWS_ACCESS_KEY_ID" in globals_
-        else os.environ.get("AWS_ACCESS_KEY_ID")
-    )
-    aws_secret_access_key = (
-        globals_["AWS_SECRET_ACCESS_KEY"]
-        if globals_ and "AWS_SECRET_ACCESS_KEY" in globals_
-        else os.environ.get("AWS_SECRET_ACCESS_KEY")
-    )
+    credentials = get_lookup_credentials(kwargs.get("globals", None))
+    cache_key = lookup_cache_key(plugin_name, kwargs["name"], credentials)
 
-    region_name = (
-        globals_["AWS_REGION"]
-        if globals_ and "AWS_REGION" in globals_
-        else os.environ.get("AWS_REGION")
-    )
-    boto3_kwargs = {
-        "aws_access_key_id": aws_access_key_id,
-        "aws_secret_access_key": aws_secret_access_key,
-        "region_name": region_name,
-    }
-    # If there's an override for endpoint_url in the environment, then use that
-    kwargs2 = {}
-    if os.environ.get("AWS_ENDPOINT_URL"):
-        kwargs2["endpoint_url"] = os.environ.get("AWS_ENDPOINT_URL")
-
-    result = None
+    client = None
     try:
-        session = boto3.session.Session(**boto3_kwargs)
-        ssm = session.client("ssm", **kwargs2)
-        response = ssm.get_parameter(Name=kwargs["name"], WithDecryption=True)
-        result = response["Parameter"]["Value"]
+        result = get_cached_lookup(cache_key)
+        if result is None and _prefetch_path(kwargs["name"], credentials):
+            result = get_cached_lookup(cache_key)
+
+        if result is not None:
+            logger.log(12, f"Using cached value for param {kwargs['name']}")
+        else:
+            client = get_aws_client("ssm", credentials)["client"]
+            response = client.get_parameter(Name=kwargs["name"], WithDecryption=True)
+            result = response["Parameter"]["Value"]
+            cache_lookup(cache_key, result)
 
-        # Very simple redacting filter here for secrets, e.g. pgp private keys,
-        # or ssh private keys
-        log_result = result
-        if " private " in result.lower():
-            log_result = "REDACTED"
+            # Very simple redacting filter here for secrets, e.g. pgp private keys,
+            # or ssh private keys
+            log_result = result
+            if " private " in result.lower():
+                log_result = "REDACTED"
 
-        logger.log(12, f"Read '{log_result}' from param {kwargs['name']}")
+            logger.log(12, f"Read '{log_result}' from param {kwargs['name']}")
 
     except ClientError as e:
         # To prevent complete failure of all jobs in an environment on failed lookup return 'LOOKUP_FAILED and log error instead of throwing exception'
@@ -108,6 +110,8 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
 
         logger.warning("SSM parameter lookup failed but continuing anyway")
         return "LOOKUP_FAILED"
+    finally:
+        release_aws_client(client)
 
     # Escape any escape characters so they can be stored in JSON as a string
     if result:
@@ -118,3 +122,152 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
         result = result[1:-1]
 
     return result
+
+
+async def run_async(**kwargs):  # type: ignore[no-untyped-def]
+    """Look up a parameter without blocking the event loop.
+
+    Runs run in a thread, so several lookups can be awaited concurrently. See
+    resolve_lookups_async in opentaskpy.addons.aws.lookups to resolve many at once.
+
+    Args:
+        **kwargs: The same kwargs as run
+
+    Returns:
+        _type_: The same value as run
+    """
+    return await asyncio.to_thread(run, **kwargs)
+
+
+def prefetch_parameters(names: list[str], globals_: dict | None = None) -> dict:
+    """Read several SSM parameters at once, and add them to the lookup cache.
+
+    Parameters are read using GetParameters, in batches of 10, so any lookups of them
+    that follow are served from the cache rather than each making a request. Names
+    that are already cached are skipped. Lookup caching must be enabled by setting
+    OTF_AWS_LOOKUP_CACHE_TTL, otherwise nothing is read.
+
+    Parameters that don't exist are ignored here, and are reported as normal when
+    they're looked up.
+
+    Args:
+        names: The names of the parameters to read
+        globals_: The global variables, used to get the AWS credentials (optional)
+
+    Returns:
+        dict: The values that were read, keyed by parameter name
+    """
+    if not lookup_cache_enabled():
+        logger.debug("Lookup caching is disabled, so not prefetching SSM parameters")
+        return {}
+
+    credentials = get_lookup_credentials(globals_)
+    names = [
+        name
+        for name in dict.fromkeys(names)
+        if get_cached_lookup(lookup_cache_key(plugin_name, name, credentials)) is None
+    ]
+    if not names:
+        return {}
+
+    values = {}
+    client = get_aws_client("ssm", credentials)["client"]
+    try:
+        for i in range(0, len(names), GET_PARAMETERS_BATCH_SIZE):
+            response = client.get_parameters(
+                Names=names[i : i + GET_PARAMETERS_BATCH_SIZE], WithDecryption=True
+            )
+            for parameter in response["Parameters"]:
+                values[parameter["Name"]] = parameter["Value"]
+                cache_lookup(
+                    lookup_cache_key(plugin_name, parameter["Name"], credentials),
+                    parameter["Value"],
+                )
+            if response["InvalidParameters"]:
+                logger.debug(
+                    f"Parameters not found while prefetching: {response['InvalidParameters']}"
+                )
+    finally:
+        release_aws_client(client)
+
+    logger.log(12, f"Prefetched {len(values)} of {len(names)} SSM parameters")
+    return values
+
+
+def prefetch_parameters_by_path(path: str, globals_: dict | None = None) -> dict:
+    """Read every SSM parameter beneath a path, and add them to the lookup cache.
+
+    Parameters are read using GetParametersByPath, recursively. Lookup caching must be
+    enabled by setting OTF_AWS_LOOKUP_CACHE_TTL, otherwise nothing is read.
+
+    Args:
+        path: The path to read the parameters beneath, e.g. /otf/prod/
+        globals_: The global variables, used to get the AWS credentials (optional)
+
+    Returns:
+        dict: The values that were read, keyed by parameter name
+    """
+    if not lookup_cache_enabled():
+        logger.debug("Lookup caching is disabled, so not prefetching SSM parameters")
+        return {}
+
+    credentials = get_lookup_credentials(globals_)
+    return _get_parameters_by_path(path, credentials)
+
+
+def _get_parameters_by_path(path: str, credentials: dict) -> dict:
+    values = {}
+    client = get_aws_client("ssm", credentials)["client"]
+    try:
+        paginator = client.get_paginator("get_parameters_by_path")
+        for page in paginator.paginate(Path=path, Recursive=True, WithDecryption=True):
+            for parameter in page["Parameters"]:
+                values[parameter["Name"]] = parameter["Value"]
+                cache_lookup(
+                    lookup_cache_key(plugin_name, parameter["Name"], credentials),
+                    parameter["Value"],
+                )
+    finally:
+        release_aws_client(client)
+
+    # Record that the path has been read, so it's not read again until the cached
+    # values expire
+    cache_lookup(lookup_cache_key(f"{plugin_name}_path", path, credentials), path)
+
+    logger.log(12, f"Prefetched {len(values)} SSM parameters beneath {path}")
+    return values
+
+
+def _prefetch_path(name: str, credentials: dict) -> bool:
+    # If the parameter is beneath one of the paths configured to be prefetched, and
+    # that path hasn't already been read, then read the whole path. Returns True if a
+    # path was read
+    paths = [
+        path.strip()
+        for path in os.environ.get(PREFETCH_PATHS_ENV, "").split(",")
+        if path.strip()
+    ]
+    if not paths or not lookup_cache_enabled():
+        return False
+
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import BotoCoreError, ClientError
+
+    for path in paths:
+        if not name.startswith(path.rstrip("/") + "/"):
+            continue
+
+        path_key = lookup_cache_key(f"{plugin_name}_path", path, credentials)
+        if get_cached_lookup(path_key) is not None:
+            continue
+
+        try:
+            _get_parameters_by_path(path, credentials)
+            return True
+        except (ClientError, BotoCoreError) as e:
+            # Fall back to reading parameters on their own, and don't try the path
+            # again until the cache entry expires
+            logger.warning(f"Failed to prefetch SSM parameters beneath {path}: {e}")
+            cache_lookup(path_key, path)
+
+    return False
@@ -1,14 +1,26 @@
 """Caching plugin for writing variables to AWS Secrets Manager."""
 
-import os
 from datetime import datetime, timedelta
 
-import boto3
 import opentaskpy.otflogging
-from botocore.exceptions import ClientError
 from dateutil.tz import tzlocal
 from opentaskpy.exceptions import CachingPluginError
 
+from opentaskpy.addons.aws.cachewrites import (
+    cache_write_key,
+    seconds_since_last_write,
+    write_variable,
+)
+from opentaskpy.addons.aws.lookups import (
+    cache_lookup,
+    get_lookup_credentials,
+    lookup_cache_key,
+)
+from opentaskpy.addons.aws.remotehandlers.creds import (
+    get_aws_client,
+    release_aws_client,
+)
+
 logger = opentaskpy.otflogging.init_logging(__name__)
 
 CACHE_NAME = "vc_secretsmanager"
@@ -23,6 +35,13 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
          Optional kwargs named 'min_cache_age'. This should be the minimum amount of time (in seconds) to wait before saving this variable in secrets manager again
          (recommended > 10 mins to avoid possible issues with running out of secret versions)
 
+    With OTF_AWS_CACHE_COMPARE_BEFORE_WRITE set, the write is skipped if the value is
+    unchanged. Only the first write to each name reads the stored value, so a change
+    made elsewhere isn't overwritten by a write of the value this process last wrote.
+    The write may be delayed so that repeated writes are combined. A delayed write
+    is made after this returns, so if it fails, it's retried, and the error is raised by
+    flush_pending_writes. See opentaskpy.addons.aws.cachewrites.
+
     Raises:
         CachingPluginError: Returned if the kwarg 'name' or 'value' is not provided
         FileNotFoundError: Returned if the file does not exist
@@ -36,56 +55,71 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
                 f" '{CACHE_NAME}'"
             )
 
-    globals_ = kwargs.get("globals", None)
-
-    aws_access_key_id = (
-        globals_["AWS_ACCESS_KEY_ID"]
-        if globals_ and "AWS_ACCESS_KEY_ID" in globals_
-        else os.environ.get("AWS_ACCESS_KEY_ID")
-    )
-    aws_secret_access_key = (
-        globals_["AWS_SECRET_ACCESS_KEY"]
-        if globals_ and "AWS_SECRET_ACCESS_KEY" in globals_
-        else os.environ.get("AWS_SECRET_ACCESS_KEY")
-    )
-
-    region_name = (
-        globals_["AWS_REGION"]
-        if globals_ and "AWS_REGION" in globals_
-        else os.environ.get("AWS_REGION")
-    )
-    boto3_kwargs = {
-        "aws_access_key_id": aws_access_key_id,
-        "aws_secret_access_key": aws_secret_access_key,
-        "region_name": region_name,
-    }
-    # If there's an override for endpoint_url in the environment, then use that
-    kwargs2 = {}
-    if os.environ.get("AWS_ENDPOINT_URL"):
-        kwargs2["endpoint_url"] = os.environ.get("AWS_ENDPOINT_URL")
+    # botocore is imported here rather than at the top of the module, as it's slow to
+    # import and isn't needed until the plugin is actually run
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import ClientError
 
-    try:
-        session = boto3.session.Session(**boto3_kwargs)
-        secrets_manager = session.client("secretsmanager", **kwargs2)
+    credentials = get_lookup_credentials(kwargs.get("globals", None))
+    key = cache_write_key(CACHE_NAME, kwargs["name"], credentials)
 
+    def write(value: str) -> bool:
         # Check if this secret has been updated more recently than min cache age (if applicable)
         if "min_cache_age" in kwargs:
-            secret = secrets_manager.describe_secret(
-                SecretId=kwargs["name"],
-            )
-            if secret["LastChangedDate"] > datetime.now(tz=tzlocal()) - timedelta(
-                seconds=int(kwargs["min_cache_age"])
-            ):
+            min_cache_age = int(kwargs["min_cache_age"])
+
+            # If this process updated it recently, there's no need to check
+            seconds_since_write = seconds_since_last_write(key)
+            if seconds_since_write is not None and seconds_since_write < min_cache_age:
                 logger.warning(
-                    f"Not updating secret because secret last updated at {secret['LastChangedDate']}, and min_cache_age is {kwargs['min_cache_age']}"
+                    f"Not updating secret because secret last updated {seconds_since_write:.0f} seconds ago, and min_cache_age is {kwargs['min_cache_age']}"
+                )
+                return False
+
+        client = get_aws_client("secretsmanager", credentials)["client"]
+        try:
+            if "min_cache_age" in kwargs:
+                secret = client.describe_secret(
+                    SecretId=kwargs["name"],
                 )
-                return
+                if secret["LastChangedDate"] > datetime.now(tz=tzlocal()) - timedelta(
+                    seconds=min_cache_age
+                ):
+                    logger.warning(
+                        f"Not updating secret because secret last updated at {secret['LastChangedDate']}, and min_cache_age is {kwargs['min_cache_age']}"
+                    )
+                    return False
 
-        # Write the value to secrets manager
-        secrets_manager.put_secret_value(
-            SecretId=kwargs["name"],
-            SecretString=kwargs["value"],
+            # Write the value to secrets manager
+            client.put_secret_value(
+                SecretId=kwargs["name"],
+                SecretString=value,
+            )
+        finally:
+            release_aws_client(client)
+
+        # Keep the secretsmanager lookup plugin from returning the old value from its
+        # cache
+        cache_lookup(
+            lookup_cache_key("secretsmanager", kwargs["name"], credentials), value
         )
+        return True
+
+    def read() -> str | None:
+        client = get_aws_client("secretsmanager", credentials)["client"]
+        try:
+            response = client.get_secret_value(SecretId=kwargs["name"])
+            secret_string: str | None = response.get("SecretString")
+            return secret_string
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ResourceNotFoundException":
+                return None
+            raise e
+        finally:
+            release_aws_client(client)
+
+    try:
+        write_variable(key, kwargs["value"], write, read)
     except ClientError as e:
         if e.response["Error"]["Code"] == "ResourceNotFoundException":
             logger.error(f"Secret not found: {kwargs['name']}: {e}")
@@ -1,12 +1,19 @@
 """Caching plugin for writing variables to AWS SSM."""
 
-import os
-
-import boto3
 import opentaskpy.otflogging
-from botocore.exceptions import ClientError
 from opentaskpy.exceptions import CachingPluginError
 
+from opentaskpy.addons.aws.cachewrites import cache_write_key, write_variable
+from opentaskpy.addons.aws.lookups import (
+    cache_lookup,
+    get_lookup_credentials,
+    lookup_cache_key,
+)
+from opentaskpy.addons.aws.remotehandlers.creds import (
+    get_aws_client,
+    release_aws_client,
+)
+
 logger = opentaskpy.otflogging.init_logging(__name__)
 
 CACHE_NAME = "vc_ssm"
@@ -19,6 +26,13 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
         **kwargs: Expect kwargs named 'name', and 'value'. This should be the Parameter
          Store parameter value to write to, and the value to put into the file
 
+    With OTF_AWS_CACHE_COMPARE_BEFORE_WRITE set, the write is skipped if the value is
+    unchanged. Only the first write to each name reads the stored value, so a change
+    made elsewhere isn't overwritten by a write of the value this process last wrote.
+    The write may be delayed so that repeated writes are combined. A delayed write
+    is made after this returns, so if it fails, it's retried, and the error is raised by
+    flush_pending_writes. See opentaskpy.addons.aws.cachewrites.
+
     Raises:
         CachingPluginError: Returned if the kwarg 'name' or 'value' is not provided
         FileNotFoundError: Returned if the file does not exist
@@ -32,44 +46,48 @@ def run(**kwargs):  # type: ignore[no-untyped-def]
                 f" '{CACHE_NAME}'"
             )
 
-    globals_ = kwargs.get("globals", None)
+    # botocore is imported here rather than at the top of the module, as it's slow to
+    # import and isn't needed until the plugin is actually run
+    # pylint: disable=import-outside-toplevel
+    from botocore.exceptions import ClientError
+
+    credentials = get_lookup_credentials(kwargs.get("globals", None))
 
-    aws_access_key_id = (
-        globals_["AWS_ACCESS_KEY_ID"]
-        if globals_ and "AWS_ACCESS_KEY_ID" in globals_
-        else os.environ.get("AWS_ACCESS_KEY_ID")
-    )
-    aws_secret_access_key = (
-        globals_["AWS_SECRET_ACCESS_KEY"]
-        if globals_ and "AWS_SECRET_ACCESS_KEY" in globals_
-        else os.environ.get("AWS_SECRET_ACCESS_KEY")
-    )
+    def write(value: str) -> bool:
+        client = get_aws_client("ssm", credentials)["client"]
+        try:
+            # Write the value to the SSM parameter
+            client.put_parameter(
+                Name=kwargs["name"],
+                Value=value,
+                Type="SecureString",
+                Overwrite=True,
+            )
+        finally:
+            release_aws_client(client)
 
-    region_name = (
-        globals_["AWS_REGION"]
-        if globals_ and "AWS_REGION" in globals_
-        else os.environ.get("AWS_REGION")
-    )
-    boto3_kwargs = {
-        "aws_access_key_id": aws_access_key_id,
-        "aws_secret_access_key": aws_secret_access_key,
-        "region_name": region_name,
-    }
-    # If there's an override for endpoint_url in the environment, then use that
-    kwargs2 = {}
-    if os.environ.get("AWS_ENDPOINT_URL"):
-        kwargs2["endpoint_url"] = os.environ.get("AWS_ENDPOINT_URL")
+        # Keep the ssm lookup plugin from returning the old value from its cache
+        cache_lookup(lookup_cache_key("ssm", kwargs["name"], credentials), value)
+        return True
 
-    try:
-        session = boto3.session.Session(**boto3_kwargs)
-        ssm = session.client("ssm", **kwargs2)
+    def read() -> str | None:
+        client = get_aws_client("ssm", credentials)["client"]
+        try:
+            response = client.get_parameter(Name=kwargs["name"], WithDecryption=True)
+            return str(response["Parameter"]["Value"])
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "ParameterNotFound":
+                return None
+            raise e
+        finally:
+            release_aws_client(client)
 
-        # Write the value to the SSM parameter
-        ssm.put_parameter(
-            Name=kwargs["name"],
-            Value=kwargs["value"],
-            Type="SecureString",
-            Overwrite=True,
+    try:
+        write_variable(
+            cache_write_key(CACHE_NAME, kwargs["name"], credentials),
+            kwargs["value"],
+            write,
+            read,
         )
     except ClientError as e:
         if e.response["Error"]["Code"] == "ParameterNotFound":
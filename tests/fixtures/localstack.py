@@ -5,6 +5,9 @@ import os
 import boto3
 import pytest
 
+from opentaskpy.addons.aws.lookups import clear_lookup_cache
+from opentaskpy.addons.aws.remotehandlers.creds import clear_aws_client_pool
+
 
 def github_actions() -> bool:
     if os.getenv("GITHUB_ACTIONS"):
@@ -74,6 +77,21 @@ def cleanup_credentials():
         del os.environ["OTF_AWS_SECRETS_LOOKUP_FAILED_IS_ERROR"]
 
 
+@pytest.fixture(scope="function")
+def client_pool():
+    clear_aws_client_pool()
+    yield
+    clear_aws_client_pool()
+
+
+@pytest.fixture(scope="function")
+def lookup_cache(monkeypatch):
+    monkeypatch.setenv("OTF_AWS_LOOKUP_CACHE_TTL", "60")
+    clear_lookup_cache()
+    yield
+    clear_lookup_cache()
+
+
 @pytest.fixture(scope="function")
 def ssm_client(floci, credentials):
     kwargs = {
@@ -0,0 +1,149 @@
+# pylint: skip-file
+# ruff: noqa
+import datetime
+import os
+
+import freezegun
+import pytest
+
+from opentaskpy.addons.aws.remotehandlers import creds
+from opentaskpy.addons.aws.remotehandlers.base import (
+    add_metrics_hook,
+    remove_metrics_hook,
+)
+from opentaskpy.addons.aws.remotehandlers.s3 import S3Execution, S3Transfer
+from tests.fixtures.localstack import *
+
+os.environ["OTF_NO_LOG"] = "0"
+os.environ["OTF_LOG_LEVEL"] = "DEBUG"
+
+BUCKET_NAME = "otf-addons-aws-handler-base-test"
+
+s3_transfer_spec = {
+    "task_id": "handler-base",
+    "bucket": BUCKET_NAME,
+    "directory": "src",
+    "fileRegex": ".*\\.txt",
+    "protocol": {"name": "opentaskpy.addons.aws.remotehandlers.s3.S3Transfer"},
+}
+
+s3_execution_spec = {
+    "task_id": "handler-base",
+    "bucket": BUCKET_NAME,
+    "key": "flag.txt",
+    "protocol": {"name": "opentaskpy.addons.aws.remotehandlers.s3.S3Execution"},
+}
+
+
+@pytest.fixture(scope="function")
+def static_credentials(cleanup_credentials):
+    os.environ["AWS_ACCESS_KEY_ID"] = "test"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "test"
+    os.environ["AWS_REGION"] = "eu-west-1"
+
+
+@pytest.fixture(scope="function")
+def metrics_events():
+    events = []
+
+    def hook(event, details):
+        events.append((event, details))
+
+    add_metrics_hook(hook)
+    yield events
+    remove_metrics_hook(hook)
+
+
+def test_metrics_hooks(static_credentials, client_pool, metrics_events):
+    handler_1 = S3Transfer(s3_transfer_spec)
+    handler_2 = S3Transfer(s3_transfer_spec)
+
+    # Nothing happens until the client is used
+    assert not metrics_events
+
+    assert handler_1.s3_client is handler_2.s3_client
+
+    assert [event for event, _ in metrics_events] == [
+        "client_acquired",
+        "client_acquired",
+    ]
+    assert metrics_events[0][1]["client_type"] == "s3"
+    assert metrics_events[0][1]["task_id"] == "handler-base"
+    assert not metrics_events[0][1]["pooled"]
+    assert metrics_events[1][1]["pooled"]
+    assert metrics_events[1][1]["elapsed"] >= 0
+
+    handler_1.tidy()
+    # A second tidy has nothing to release
+    handler_1.tidy()
+    assert [event for event, _ in metrics_events][2:] == ["client_released"]
+
+
+def test_broken_metrics_hook(static_credentials, client_pool):
+    def hook(event, details):
+        raise ValueError("Broken hook")
+
+    add_metrics_hook(hook)
+    try:
+        handler = S3Transfer(s3_transfer_spec)
+        assert handler.s3_client is not None
+    finally:
+        remove_metrics_hook(hook)
+
+
+def test_validate_or_refresh_creds_static_credentials(static_credentials, client_pool):
+    handler = S3Transfer(s3_transfer_spec)
+    client = handler.s3_client
+
+    # There's no expiry for static credentials, so the client is kept
+    assert handler._creds_refresh_deadline is None
+    handler.validate_or_refresh_creds()
+    assert handler.s3_client is client
+
+
+def test_validate_or_refresh_creds_renews_at_deadline(
+    credentials, client_pool, metrics_events
+):
+    spec = {
+        **s3_transfer_spec,
+        "protocol": {
+            **s3_transfer_spec["protocol"],
+            "assume_role_arn": "arn:aws:iam::000000000000:role/otf-test",
+        },
+    }
+
+    with freezegun.freeze_time(datetime.datetime.now()) as frozen_datetime:
+        handler = S3Transfer(spec)
+        handler.validate_or_refresh_creds()
+        assert handler._creds_refresh_deadline
+
+        # Still well within the expiry, so nothing is renewed
+        handler.validate_or_refresh_creds()
+        assert "credentials_renewed" not in [event for event, _ in metrics_events]
+
+        frozen_datetime.move_to(
+            datetime.datetime.now() + datetime.timedelta(minutes=14, seconds=5)
+        )
+
+        # Now it's within a minute of expiry, so the credentials are renewed
+        first_access_key_id = handler.temporary_creds["AccessKeyId"]
+        handler.validate_or_refresh_creds()
+        assert "credentials_renewed" in [event for event, _ in metrics_events]
+        assert handler.temporary_creds["AccessKeyId"] != first_access_key_id
+
+
+def test_s3_execution_token_expiry_seconds(credentials, client_pool):
+    spec = {
+        **s3_execution_spec,
+        "protocol": {
+            **s3_execution_spec["protocol"],
+            "assume_role_arn": "arn:aws:iam::000000000000:role/otf-test",
+            "token_expiry_seconds": 1234,
+        },
+    }
+
+    handler = S3Execution(spec)
+    assert handler.s3_client is not None
+
+    # The credentials should have been assumed with the requested expiry
+    assert [key[2] for key in creds._assumed_role_credentials] == [1234]
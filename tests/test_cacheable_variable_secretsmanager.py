@@ -9,6 +9,8 @@ import pytest
 from botocore.exceptions import ClientError
 from opentaskpy.exceptions import CachingPluginError
 
+from opentaskpy.addons.aws.cachewrites import clear_write_history
+from opentaskpy.plugins.lookup.aws import secrets_manager
 from opentaskpy.variablecaching.aws import vc_secretsmanager
 from tests.fixtures.localstack import *  # noqa: F403
 
@@ -26,7 +28,6 @@ def test_cacheable_variable_ssm_args():
 
 
 def test_cacheable_variable_vc_secretsmanager(secretsmanager_client):
-
     # Create a new ParamStore value
     secretsmanager_client.create_secret(
         Name="/test/variable",
@@ -55,7 +56,6 @@ def test_cacheable_variable_vc_secretsmanager(secretsmanager_client):
 
 
 def test_cacheable_variable_secretsmanager_failure(secretsmanager_client):
-
     kwargs = {"name": "xxxx", "value": "newvalue"}
 
     # Remove the AWS_ENDPOINT_URL env var, so it tries to go to something that doesn't exist
@@ -68,7 +68,6 @@ def test_cacheable_variable_secretsmanager_failure(secretsmanager_client):
 def test_cacheable_variable_vc_secretsmanager_min_cache_age(
     secretsmanager_client, caplog
 ):
-
     # Create a new ParamStore value
     secretsmanager_client.create_secret(
         Name="/test/min_cache_variable",
@@ -116,3 +115,46 @@ def test_cacheable_variable_vc_secretsmanager_min_cache_age(
         ]
         == "newvalue"
     )
+
+
+def test_cacheable_variable_vc_secretsmanager_unchanged(
+    secretsmanager_client, monkeypatch
+):
+    monkeypatch.setenv("OTF_AWS_CACHE_COMPARE_BEFORE_WRITE", "1")
+    clear_write_history()
+
+    secretsmanager_client.create_secret(
+        Name="/test/unchanged_variable",
+        SecretString="originalvalue",
+    )
+
+    kwargs = {"name": "/test/unchanged_variable", "value": "newvalue"}
+    vc_secretsmanager.run(**kwargs)
+    versions = secretsmanager_client.list_secret_version_ids(
+        SecretId="/test/unchanged_variable", IncludeDeprecated=True
+    )["Versions"]
+
+    # Writing the same value again doesn't create a new version
+    vc_secretsmanager.run(**kwargs)
+    assert (
+        secretsmanager_client.list_secret_version_ids(
+            SecretId="/test/unchanged_variable", IncludeDeprecated=True
+        )["Versions"]
+        == versions
+    )
+
+
+def test_cacheable_variable_vc_secretsmanager_updates_lookup_cache(
+    secretsmanager_client, lookup_cache
+):
+    clear_write_history()
+
+    secretsmanager_client.create_secret(
+        Name="/test/cached_variable",
+        SecretString="originalvalue",
+    )
+    assert secrets_manager.run(name="/test/cached_variable") == "originalvalue"
+
+    # The lookup returns the value just written, rather than the cached one
+    vc_secretsmanager.run(name="/test/cached_variable", value="newvalue")
+    assert secrets_manager.run(name="/test/cached_variable") == "newvalue"
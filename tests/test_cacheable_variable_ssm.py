@@ -7,6 +7,8 @@ import pytest
 from botocore.exceptions import ClientError
 from opentaskpy.exceptions import CachingPluginError
 
+from opentaskpy.addons.aws.cachewrites import clear_write_history
+from opentaskpy.plugins.lookup.aws import ssm
 from opentaskpy.variablecaching.aws import vc_ssm
 from tests.fixtures.localstack import *  # noqa: F403
 
@@ -24,7 +26,6 @@ def test_cacheable_variable_ssm_args():
 
 
 def test_cacheable_variable_ssm(ssm_client):
-
     # Create a new ParamStore value
     ssm_client.put_parameter(
         Name="/test/variable",
@@ -51,7 +52,6 @@ def test_cacheable_variable_ssm(ssm_client):
 
 
 def test_cacheable_variable_ssm_failure(ssm_client):
-
     spec = {"task_id": "1234", "x": {"y": "value"}}
 
     kwargs = {"name": f"xxxx", "value": "newvalue"}
@@ -61,3 +61,47 @@ def test_cacheable_variable_ssm_failure(ssm_client):
 
     with pytest.raises(ClientError):
         vc_ssm.run(**kwargs)
+
+
+def test_cacheable_variable_ssm_unchanged(ssm_client, monkeypatch):
+    monkeypatch.setenv("OTF_AWS_CACHE_COMPARE_BEFORE_WRITE", "1")
+    clear_write_history()
+
+    kwargs = {"name": "/test/unchanged_variable", "value": "newvalue"}
+    vc_ssm.run(**kwargs)
+    version = ssm_client.get_parameter(Name="/test/unchanged_variable")["Parameter"][
+        "Version"
+    ]
+
+    # Writing the same value again doesn't create a new version
+    vc_ssm.run(**kwargs)
+    assert (
+        ssm_client.get_parameter(Name="/test/unchanged_variable")["Parameter"][
+            "Version"
+        ]
+        == version
+    )
+
+    vc_ssm.run(name="/test/unchanged_variable", value="othervalue")
+    assert (
+        ssm_client.get_parameter(Name="/test/unchanged_variable")["Parameter"][
+            "Version"
+        ]
+        == version + 1
+    )
+
+
+def test_cacheable_variable_ssm_updates_lookup_cache(ssm_client, lookup_cache):
+    clear_write_history()
+
+    ssm_client.put_parameter(
+        Name="/test/cached_variable",
+        Value="originalvalue",
+        Type="SecureString",
+        Overwrite=True,
+    )
+    assert ssm.run(name="/test/cached_variable") == "originalvalue"
+
+    # The lookup returns the value just written, rather than the cached one
+    vc_ssm.run(name="/test/cached_variable", value="newvalue")
+    assert ssm.run(name="/test/cached_variable") == "newvalue"
@@ -0,0 +1,189 @@
+# pylint: skip-file
+# ruff: noqa
+import os
+import time
+
+import pytest
+
+from opentaskpy.addons.aws.cachewrites import (
+    MAX_DELAYED_WRITE_ATTEMPTS,
+    cache_write_key,
+    clear_write_history,
+    flush_pending_writes,
+    seconds_since_last_write,
+    write_variable,
+)
+
+credentials = {
+    "AccessKeyId": "test",
+    "SecretAccessKey": "test",
+    "region_name": "eu-west-1",
+}
+
+
+@pytest.fixture(scope="function")
+def store():
+    # A fake parameter store, recording every read and write
+    clear_write_history()
+    state = {"value": None, "reads": 0, "writes": []}
+
+    def write(value):
+        state["writes"].append(value)
+        state["value"] = value
+        return True
+
+    def read():
+        state["reads"] += 1
+        return state["value"]
+
+    state["write"] = write
+    state["read"] = read
+    yield state
+    clear_write_history()
+    os.environ.pop("OTF_AWS_CACHE_COMPARE_BEFORE_WRITE", None)
+    os.environ.pop("OTF_AWS_CACHE_WRITE_DELAY", None)
+
+
+def test_every_value_written_by_default(store):
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+    assert seconds_since_last_write(key) is None
+
+    write_variable(key, "value1", store["write"], store["read"])
+    write_variable(key, "value1", store["write"], store["read"])
+
+    # Without comparing, there's no way to tell if something else changed the value
+    assert store["writes"] == ["value1", "value1"]
+    assert store["reads"] == 0
+    assert seconds_since_last_write(key) < 1
+
+
+def test_unchanged_value_not_written(store):
+    os.environ["OTF_AWS_CACHE_COMPARE_BEFORE_WRITE"] = "1"
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+
+    write_variable(key, "value1", store["write"], store["read"])
+    write_variable(key, "value1", store["write"], store["read"])
+    write_variable(key, "value2", store["write"], store["read"])
+    write_variable(key, "value2", store["write"], store["read"])
+
+    assert store["writes"] == ["value1", "value2"]
+    # The current value is only read for the first write
+    assert store["reads"] == 1
+    assert seconds_since_last_write(key) < 1
+
+    # Writes with different credentials are tracked separately
+    other_key = cache_write_key(
+        "vc_test", "/test/variable", {**credentials, "AccessKeyId": "other"}
+    )
+    write_variable(other_key, "value1", store["write"], store["read"])
+    assert store["writes"] == ["value1", "value2", "value1"]
+
+
+def test_write_refused(store):
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+
+    # If the write doesn't happen, the value isn't recorded as written
+    write_variable(key, "value1", lambda value: False, store["read"])
+    write_variable(key, "value1", store["write"], store["read"])
+
+    assert store["writes"] == ["value1"]
+
+
+def test_compare_before_write(store):
+    os.environ["OTF_AWS_CACHE_COMPARE_BEFORE_WRITE"] = "1"
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+    store["value"] = "value1"
+
+    write_variable(key, "value1", store["write"], store["read"])
+    assert store["reads"] == 1
+    assert not store["writes"]
+
+    # The value is now known, so it isn't read again
+    write_variable(key, "value1", store["write"], store["read"])
+    write_variable(key, "value2", store["write"], store["read"])
+    assert store["reads"] == 1
+    assert store["writes"] == ["value2"]
+
+
+def test_write_delay(store):
+    os.environ["OTF_AWS_CACHE_WRITE_DELAY"] = "0.2"
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+
+    for i in range(5):
+        write_variable(key, f"value{i}", store["write"], store["read"])
+    assert not store["writes"]
+
+    # Only the final value is written, once the delay has passed
+    time.sleep(0.5)
+    assert store["writes"] == ["value4"]
+
+    write_variable(key, "value5", store["write"], store["read"])
+    flush_pending_writes()
+    assert store["writes"] == ["value4", "value5"]
+
+
+def test_write_delay_failure(store):
+    os.environ["OTF_AWS_CACHE_WRITE_DELAY"] = "0.1"
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+    attempts = []
+
+    def write(value):
+        attempts.append(value)
+        if len(attempts) < 3:
+            raise ValueError("Failed to write")
+        return store["write"](value)
+
+    write_variable(key, "value1", write, store["read"])
+
+    # The failed value stays pending, and is retried until it's written
+    time.sleep(0.6)
+    assert attempts == ["value1", "value1", "value1"]
+    assert store["writes"] == ["value1"]
+
+
+def test_write_delay_failure_replaced(store):
+    os.environ["OTF_AWS_CACHE_WRITE_DELAY"] = "60"
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+
+    def write(value):
+        raise ValueError("Failed to write")
+
+    write_variable(key, "value1", write, store["read"])
+    with pytest.raises(ValueError, match="Failed to write"):
+        flush_pending_writes()
+
+    # The next write isn't affected by the earlier failure, and replaces its value
+    write_variable(key, "value2", store["write"], store["read"])
+    flush_pending_writes()
+    assert store["writes"] == ["value2"]
+
+
+def test_write_delay_failure_raised_by_flush(store):
+    os.environ["OTF_AWS_CACHE_WRITE_DELAY"] = "0.05"
+    key = cache_write_key("vc_test", "/test/variable", credentials)
+    other_key = cache_write_key("vc_test", "/test/other", credentials)
+    attempts = []
+
+    def write(value):
+        attempts.append(value)
+        raise ValueError("Failed to write")
+
+    write_variable(key, "value1", write, store["read"])
+
+    # Once the retries run out, the value waits for flush_pending_writes
+    time.sleep(0.5)
+    assert len(attempts) == MAX_DELAYED_WRITE_ATTEMPTS
+    assert seconds_since_last_write(key) is None
+
+    # Every pending value is flushed, then the failure is raised
+    os.environ["OTF_AWS_CACHE_WRITE_DELAY"] = "60"
+    write_variable(other_key, "value2", store["write"], store["read"])
+    with pytest.raises(ValueError, match="Failed to write"):
+        flush_pending_writes()
+    assert len(attempts) == MAX_DELAYED_WRITE_ATTEMPTS + 1
+    assert store["writes"] == ["value2"]
+
+    # The value is still pending, so it's written once the problem is fixed
+    write_variable(key, "value1", store["write"], store["read"])
+    flush_pending_writes()
+    assert store["writes"] == ["value2", "value1"]
@@ -0,0 +1,199 @@
+# pylint: skip-file
+# ruff: noqa
+import datetime
+import os
+import threading
+
+import freezegun
+import pytest
+from botocore.config import Config
+
+from opentaskpy.addons.aws.remotehandlers import creds
+from opentaskpy.addons.aws.remotehandlers.creds import (
+    get_aws_client,
+    release_aws_client,
+)
+from tests.fixtures.localstack import *
+
+os.environ["OTF_NO_LOG"] = "0"
+os.environ["OTF_LOG_LEVEL"] = "DEBUG"
+
+static_credentials = {
+    "AccessKeyId": "test",
+    "SecretAccessKey": "test",
+    "region_name": "eu-west-1",
+}
+
+
+def test_get_aws_client_reuses_pooled_client(cleanup_credentials, client_pool):
+    client_1 = get_aws_client("s3", static_credentials)["client"]
+    client_2 = get_aws_client("s3", static_credentials)["client"]
+
+    assert client_1 is client_2
+
+    # Anything that changes the key should get a different client
+    assert get_aws_client("ecs", static_credentials)["client"] is not client_1
+    assert (
+        get_aws_client("s3", {**static_credentials, "region_name": "us-east-1"})[
+            "client"
+        ]
+        is not client_1
+    )
+    assert (
+        get_aws_client(
+            "s3", static_credentials, config=Config(max_pool_connections=50)
+        )["client"]
+        is not client_1
+    )
+
+    # But an equivalent config should be shared
+    client_3 = get_aws_client(
+        "s3", static_credentials, config=Config(max_pool_connections=50)
+    )["client"]
+    client_4 = get_aws_client(
+        "s3", static_credentials, config=Config(max_pool_connections=50)
+    )["client"]
+    assert client_3 is client_4
+
+
+def test_release_aws_client_keeps_client_pooled(cleanup_credentials, client_pool):
+    client_1 = get_aws_client("s3", static_credentials)["client"]
+    release_aws_client(client_1)
+
+    assert get_aws_client("s3", static_credentials)["client"] is client_1
+
+    # Releasing None does nothing
+    release_aws_client(None)
+
+
+def test_get_aws_client_creates_clients_outside_pool_lock(
+    cleanup_credentials, client_pool, monkeypatch
+):
+    create_aws_client = creds._create_aws_client
+    created = []
+    s3_creating = threading.Event()
+    finish_s3 = threading.Event()
+
+    def slow_create_aws_client(client_type, *args, **kwargs):
+        created.append(client_type)
+        if client_type == "s3":
+            s3_creating.set()
+            finish_s3.wait(10)
+        return create_aws_client(client_type, *args, **kwargs)
+
+    monkeypatch.setattr(creds, "_create_aws_client", slow_create_aws_client)
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(get_aws_client("s3", static_credentials))
+        )
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    assert s3_creating.wait(10)
+
+    # Other clients can be created while the s3 client is still being created
+    assert get_aws_client("ecs", static_credentials)["client"]
+    assert len(results) == 0
+
+    finish_s3.set()
+    for thread in threads:
+        thread.join()
+
+    # The s3 client was only created once, and every caller waiting for it shares it
+    assert created.count("s3") == 1
+    assert len({id(result["client"]) for result in results}) == 1
+    assert sorted(result["pooled"] for result in results) == [
+        False,
+        True,
+        True,
+        True,
+        True,
+    ]
+
+
+def test_get_aws_client_unsupported_type(cleanup_credentials, client_pool):
+    with pytest.raises(ValueError):
+        get_aws_client("ec2", static_credentials)
+
+    assert not creds._client_pool
+
+
+def test_get_aws_client_shares_assumed_role_credentials(credentials, client_pool):
+    with freezegun.freeze_time(datetime.datetime.now()) as frozen_datetime:
+        s3_result = get_aws_client(
+            "s3",
+            static_credentials,
+            assume_role_arn="arn:aws:iam::000000000000:role/otf-test",
+        )
+        ecs_result = get_aws_client(
+            "ecs",
+            static_credentials,
+            assume_role_arn="arn:aws:iam::000000000000:role/otf-test",
+        )
+
+        # The role should only have been assumed once for both clients
+        assert len(creds._assumed_role_credentials) == 1
+        assert s3_result["temporary_creds"] is ecs_result["temporary_creds"]
+
+        # A different expiry needs its own credentials
+        get_aws_client(
+            "s3",
+            static_credentials,
+            token_expiry_seconds=1234,
+            assume_role_arn="arn:aws:iam::000000000000:role/otf-test",
+        )
+        assert len(creds._assumed_role_credentials) == 2
+
+        frozen_datetime.move_to(
+            datetime.datetime.now() + datetime.timedelta(minutes=15, seconds=5)
+        )
+
+        # Now the temporary creds have expired, they should be refreshed, but the
+        # same client is still used
+        s3_result_2 = get_aws_client(
+            "s3",
+            static_credentials,
+            assume_role_arn="arn:aws:iam::000000000000:role/otf-test",
+        )
+        assert s3_result_2["client"] is s3_result["client"]
+        assert (
+            s3_result_2["temporary_creds"]["AccessKeyId"]
+            != s3_result["temporary_creds"]["AccessKeyId"]
+        )
+        assert s3_result_2["temporary_creds"]["Expiration"] > datetime.datetime.now(
+            tz=datetime.timezone.utc
+        ) + datetime.timedelta(minutes=1)
+
+
+def test_superseded_session_clients_are_evicted(cleanup_credentials, client_pool):
+    session_1 = {**static_credentials, "SessionToken": "session-1"}
+    session_2 = {**static_credentials, "SessionToken": "session-2"}
+
+    client_1 = get_aws_client("s3", session_1)["client"]
+    client_2 = get_aws_client("s3", session_2)["client"]
+    assert client_1 is not client_2
+
+    # The old session's client is still in use, so it stays until it's released
+    assert len(creds._client_pool) == 2
+    release_aws_client(client_1)
+    assert len(creds._client_pool) == 1
+    assert id(client_1) not in creds._client_leases
+
+    # The current session's client stays pooled after its last release
+    release_aws_client(client_2)
+    assert get_aws_client("s3", session_2)["client"] is client_2
+
+    # Idle clients for an old session are closed as soon as a new session replaces it
+    client_3 = get_aws_client(
+        "s3", {**static_credentials, "SessionToken": "session-3"}
+    )["client"]
+    release_aws_client(client_2)
+    assert list(creds._client_pool.values())[0]["client"] is client_3
+
+    # Clients for other identities aren't affected
+    get_aws_client("ecs", session_1)
+    get_aws_client("s3", {**session_1, "AccessKeyId": "other"})
+    assert len(creds._client_pool) == 3
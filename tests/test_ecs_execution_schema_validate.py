@@ -42,3 +42,22 @@ def test_fargate():
     # Remove protocol
     del json_data["protocol"]
     assert not validate_execution_json(json_data)
+
+
+def test_fargate_poll_interval():
+    json_data = {
+        "type": "execution",
+    }
+    json_data.update(valid_execution)
+
+    json_data["pollInterval"] = 0.5
+    json_data["maxPollInterval"] = 60
+    assert validate_execution_json(json_data)
+
+    # Both must be greater than 0
+    json_data["pollInterval"] = 0
+    assert not validate_execution_json(json_data)
+
+    json_data["pollInterval"] = 1
+    json_data["maxPollInterval"] = -1
+    assert not validate_execution_json(json_data)
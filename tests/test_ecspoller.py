@@ -0,0 +1,147 @@
+# pylint: skip-file
+# ruff: noqa
+import os
+import threading
+import time
+
+import boto3
+import botocore.exceptions
+import pytest
+from moto import mock_aws
+from moto.moto_api import state_manager
+
+from opentaskpy.addons.aws.remotehandlers.ecspoller import wait_for_task_status
+from tests.fixtures.localstack import *
+
+CLUSTER_NAME = "otf-addons-aws-poller-test"
+
+
+@pytest.fixture(scope="function")
+def ecs_client(cleanup_credentials):
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-1"
+    # Keep mocked tasks RUNNING until they're stopped, rather than moving them on to the
+    # next status each time they're described
+    state_manager.set_transition(
+        model_name="ecs::task", transition={"progression": "manual", "times": 1000}
+    )
+    with mock_aws():
+        client = boto3.client("ecs")
+        client.create_cluster(clusterName=CLUSTER_NAME)
+        client.register_task_definition(
+            family="otf-poller-test",
+            containerDefinitions=[
+                {"name": "otf-poller-test", "image": "otf-poller-test", "memory": 100}
+            ],
+        )
+        yield client
+    state_manager.unset_transition("ecs::task")
+
+
+@pytest.fixture(scope="function")
+def describe_calls(ecs_client):
+    calls = []
+    ecs_client.meta.events.register(
+        "before-parameter-build.ecs.DescribeTasks",
+        lambda params, **kwargs: calls.append(params["tasks"]),
+    )
+    return calls
+
+
+def run_tasks(ecs_client, count):
+    task_arns = []
+    while len(task_arns) < count:
+        response = ecs_client.run_task(
+            cluster=CLUSTER_NAME,
+            taskDefinition="otf-poller-test",
+            count=min(count - len(task_arns), 10),
+            launchType="FARGATE",
+        )
+        task_arns.extend(task["taskArn"] for task in response["tasks"])
+    return task_arns
+
+
+def test_wait_for_task_status(ecs_client, describe_calls):
+    task_arn = run_tasks(ecs_client, 1)[0]
+
+    task = wait_for_task_status(ecs_client, CLUSTER_NAME, task_arn, None, 0)
+    assert task["taskArn"] == task_arn
+    assert task["lastStatus"] == "RUNNING"
+
+    # Nothing changes, so this waits for the whole timeout
+    start = time.monotonic()
+    task = wait_for_task_status(ecs_client, CLUSTER_NAME, task_arn, "RUNNING", 0.5)
+    assert time.monotonic() - start >= 0.5
+    assert task["lastStatus"] == "RUNNING"
+
+    assert describe_calls == [[task_arn], [task_arn]]
+
+
+def test_wait_for_task_status_batched(ecs_client, describe_calls):
+    task_arns = run_tasks(ecs_client, 120)
+
+    results = {}
+
+    def wait(task_arn):
+        results[task_arn] = wait_for_task_status(
+            ecs_client, CLUSTER_NAME, task_arn, None, 1
+        )
+
+    threads = [threading.Thread(target=wait, args=[arn]) for arn in task_arns]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert {arn: task["taskArn"] for arn, task in results.items()} == {
+        arn: arn for arn in task_arns
+    }
+
+    # Every task was described together, in batches of up to 100
+    assert [len(tasks) for tasks in describe_calls] == [100, 20]
+
+
+def test_wait_for_task_status_wakes_on_change(ecs_client, describe_calls):
+    task_arn_1, task_arn_2 = run_tasks(ecs_client, 2)
+
+    result = {}
+
+    def wait():
+        result["task"] = wait_for_task_status(
+            ecs_client, CLUSTER_NAME, task_arn_1, "RUNNING", 30
+        )
+        result["elapsed"] = time.monotonic() - start
+
+    start = time.monotonic()
+    thread = threading.Thread(target=wait)
+    thread.start()
+
+    ecs_client.stop_task(cluster=CLUSTER_NAME, task=task_arn_1)
+
+    # Checking the other task also checks the first one, which has now stopped
+    task = wait_for_task_status(ecs_client, CLUSTER_NAME, task_arn_2, "RUNNING", 0.5)
+    assert task["lastStatus"] == "RUNNING"
+
+    thread.join()
+    assert result["task"]["lastStatus"] == "STOPPED"
+    assert result["elapsed"] < 2
+
+    assert sorted(describe_calls[0]) == sorted([task_arn_1, task_arn_2])
+
+
+def test_wait_for_task_status_not_found(ecs_client):
+    run_tasks(ecs_client, 1)
+    task_arn = (
+        "arn:aws:ecs:eu-west-1:123456789012:task/"
+        f"{CLUSTER_NAME}/00000000000000000000000000000000"
+    )
+
+    assert wait_for_task_status(ecs_client, CLUSTER_NAME, task_arn, None, 0) is None
+
+
+def test_wait_for_task_status_error(ecs_client):
+    task_arn = run_tasks(ecs_client, 1)[0]
+
+    with pytest.raises(botocore.exceptions.ClientError):
+        wait_for_task_status(ecs_client, "otf-missing-cluster", task_arn, None, 0)
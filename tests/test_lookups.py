@@ -0,0 +1,168 @@
+# pylint: skip-file
+# ruff: noqa
+import asyncio
+import threading
+import time
+
+import freezegun
+import pytest
+
+from opentaskpy.addons.aws import lookups
+from opentaskpy.addons.aws.lookups import (
+    cache_lookup,
+    clear_lookup_cache,
+    get_cached_lookup,
+    get_lookup_credentials,
+    lookup_cache_key,
+    resolve_lookups,
+    resolve_lookups_async,
+)
+from opentaskpy.plugins.lookup.aws import secrets_manager, ssm
+from tests.fixtures.localstack import *
+
+credentials = {
+    "AccessKeyId": "test",
+    "SecretAccessKey": "test",
+    "region_name": "eu-west-1",
+}
+
+
+@pytest.fixture(scope="function")
+def slow_lookups(monkeypatch):
+    # Replace the plugins with ones that take a while, and record how many run at once
+    state = {"running": 0, "max_running": 0, "calls": []}
+    lock = threading.Lock()
+
+    def slow_run(plugin):
+        def run(**kwargs):
+            with lock:
+                state["calls"].append((plugin, kwargs["name"]))
+                state["running"] += 1
+                state["max_running"] = max(state["max_running"], state["running"])
+            time.sleep(0.1)
+            with lock:
+                state["running"] -= 1
+            return f"{plugin}:{kwargs['name']}"
+
+        return run
+
+    monkeypatch.setattr(ssm, "run", slow_run("ssm"))
+    monkeypatch.setattr(secrets_manager, "run", slow_run("secretsmanager"))
+    return state
+
+
+def test_get_lookup_credentials(cleanup_credentials, monkeypatch):
+    monkeypatch.setenv("AWS_ACCESS_KEY_ID", "env_key")
+    monkeypatch.setenv("AWS_SECRET_ACCESS_KEY", "env_secret")
+    monkeypatch.setenv("AWS_REGION", "eu-west-1")
+
+    assert get_lookup_credentials(None) == {
+        "AccessKeyId": "env_key",
+        "SecretAccessKey": "env_secret",
+        "region_name": "eu-west-1",
+    }
+
+    # Global variables take precedence over the environment
+    assert get_lookup_credentials(
+        {"AWS_ACCESS_KEY_ID": "global_key", "AWS_REGION": "eu-west-2"}
+    ) == {
+        "AccessKeyId": "global_key",
+        "SecretAccessKey": "env_secret",
+        "region_name": "eu-west-2",
+    }
+
+
+def test_lookup_cache_disabled(cleanup_credentials, monkeypatch):
+    clear_lookup_cache()
+    key = lookup_cache_key("ssm", "param", credentials)
+
+    cache_lookup(key, "value")
+    assert get_cached_lookup(key) is None
+
+    # An invalid TTL disables the cache
+    monkeypatch.setenv("OTF_AWS_LOOKUP_CACHE_TTL", "invalid")
+    cache_lookup(key, "value")
+    assert get_cached_lookup(key) is None
+
+
+def test_lookup_cache_key():
+    key = lookup_cache_key("ssm", "param", credentials)
+
+    assert key != lookup_cache_key("secretsmanager", "param", credentials)
+    assert key != lookup_cache_key(
+        "ssm", "param", {**credentials, "region_name": "eu-west-2"}
+    )
+    assert key != lookup_cache_key(
+        "ssm", "param", {**credentials, "AccessKeyId": "other"}
+    )
+
+
+def test_lookup_cache_expiry(cleanup_credentials, lookup_cache):
+    key = lookup_cache_key("ssm", "param", credentials)
+
+    with freezegun.freeze_time() as frozen_datetime:
+        cache_lookup(key, "value")
+        assert get_cached_lookup(key) == "value"
+
+        frozen_datetime.tick(59)
+        assert get_cached_lookup(key) == "value"
+
+        frozen_datetime.tick(1)
+        assert get_cached_lookup(key) is None
+        assert not lookups._lookup_cache
+
+
+def test_lookup_cache_eviction(cleanup_credentials, monkeypatch, lookup_cache):
+    monkeypatch.setenv("OTF_AWS_LOOKUP_CACHE_SIZE", "2")
+
+    keys = [lookup_cache_key("ssm", f"param{i}", credentials) for i in range(3)]
+
+    cache_lookup(keys[0], "value0")
+    cache_lookup(keys[1], "value1")
+
+    # Using the first value makes the second the least recently used
+    assert get_cached_lookup(keys[0]) == "value0"
+
+    cache_lookup(keys[2], "value2")
+    assert get_cached_lookup(keys[0]) == "value0"
+    assert get_cached_lookup(keys[1]) is None
+    assert get_cached_lookup(keys[2]) == "value2"
+
+
+def test_resolve_lookups(slow_lookups):
+    requests = [("aws.ssm", {"name": f"param{i}"}) for i in range(20)]
+    requests.append(("aws.secrets_manager", {"name": "secret"}))
+    # Identical lookups are only run once
+    requests.append(("aws.ssm", {"name": "param0"}))
+
+    start = time.monotonic()
+    results = resolve_lookups(requests, max_concurrency=5)
+    elapsed = time.monotonic() - start
+
+    assert results == [
+        *[f"ssm:param{i}" for i in range(20)],
+        "secretsmanager:secret",
+        "ssm:param0",
+    ]
+    assert len(slow_lookups["calls"]) == 21
+    assert slow_lookups["max_running"] == 5
+    # 21 lookups, 5 at a time, rather than one after another
+    assert elapsed < 1
+
+
+def test_resolve_lookups_async(slow_lookups, monkeypatch):
+    monkeypatch.setenv("OTF_AWS_LOOKUP_MAX_CONCURRENCY", "4")
+    requests = [("aws.ssm", {"name": f"param{i}"}) for i in range(8)]
+    results = asyncio.run(resolve_lookups_async(requests))
+
+    assert results == [f"ssm:param{i}" for i in range(8)]
+    assert slow_lookups["max_running"] == 4
+
+
+def test_run_async(slow_lookups):
+    async def run_lookups():
+        return await asyncio.gather(
+            ssm.run_async(name="param"), secrets_manager.run_async(name="secret")
+        )
+
+    assert asyncio.run(run_lookups()) == ["ssm:param", "secretsmanager:secret"]
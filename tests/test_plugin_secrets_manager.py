@@ -11,7 +11,12 @@ from opentaskpy.config.loader import ConfigLoader
 from opentaskpy.exceptions import LookupPluginError
 from pytest_shell import fs
 
-from opentaskpy.plugins.lookup.aws.secrets_manager import run
+from opentaskpy.addons.aws.lookups import clear_lookup_cache, get_lookup_credentials
+from opentaskpy.addons.aws.remotehandlers.creds import (
+    get_aws_client,
+    release_aws_client,
+)
+from opentaskpy.plugins.lookup.aws.secrets_manager import prefetch_secrets, run
 from tests.fixtures.localstack import *  # noqa: F403
 
 PLUGIN_NAME = "secretsmanager"
@@ -257,3 +262,62 @@ def test_config_loader_using_secretsmanager_plugin_invalid_json(
         config_loader = ConfigLoader(tmpdir)
         config_loader._load_global_variables()
         config_loader._resolve_templated_variables()
+
+
+def test_secrets_manager_plugin_cached_lookup(secrets_manager_client, lookup_cache):
+    secrets_manager_client.create_secret(
+        Name="cached_secret",
+        SecretString=json.dumps({"username": "user1", "password": "password1"}),
+    )
+    assert run(name="cached_secret", value="username") == "user1"
+
+    secrets_manager_client.put_secret_value(
+        SecretId="cached_secret",
+        SecretString=json.dumps({"username": "user2", "password": "password2"}),
+    )
+
+    # Lookups of different paths in the same secret share the cached value
+    assert run(name="cached_secret", value="username") == "user1"
+    assert run(name="cached_secret", value="password") == "password1"
+
+    clear_lookup_cache()
+    assert run(name="cached_secret", value="password") == "password2"
+
+
+def test_secrets_manager_plugin_prefetch_secrets(secrets_manager_client, lookup_cache):
+    names = [f"prefetch_secret{i}" for i in range(25)]
+    for name in names:
+        secrets_manager_client.create_secret(
+            Name=name, SecretString=json.dumps({"name": name})
+        )
+
+    # More than one batch is needed, and missing secrets are ignored
+    values = prefetch_secrets([*names, "prefetch_secret_does_not_exist"])
+    assert values == {name: json.dumps({"name": name}) for name in names}
+
+    # The lookups are now served from the cache
+    secrets_manager_client.put_secret_value(
+        SecretId=names[0], SecretString=json.dumps({"name": "changed"})
+    )
+    assert run(name=names[0], value="name") == names[0]
+    assert run(name="prefetch_secret_does_not_exist") == "LOOKUP_FAILED"
+
+
+def test_secrets_manager_plugin_prefetch_secrets_without_batch_get(
+    secrets_manager_client, monkeypatch, lookup_cache
+):
+    # Older versions of boto3 don't have batch_get_secret_value
+    client = get_aws_client("secretsmanager", get_lookup_credentials(None))["client"]
+    release_aws_client(client)
+    monkeypatch.delattr(type(client), "batch_get_secret_value")
+
+    names = [f"prefetch_single_secret{i}" for i in range(3)]
+    for name in names:
+        secrets_manager_client.create_secret(Name=name, SecretString=name)
+
+    # Each secret is read on its own, and missing secrets are still ignored
+    values = prefetch_secrets([*names, "prefetch_secret_does_not_exist"])
+    assert values == {name: name for name in names}
+
+    secrets_manager_client.put_secret_value(SecretId=names[0], SecretString="changed")
+    assert run(name=names[0]) == names[0]
@@ -4,11 +4,13 @@ import json
 import logging
 
 import pytest
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, ReadTimeoutError
 from opentaskpy.config.loader import ConfigLoader
 from pytest_shell import fs
 
-from opentaskpy.plugins.lookup.aws.ssm import run
+from opentaskpy.addons.aws.lookups import clear_lookup_cache
+from opentaskpy.plugins.lookup.aws import ssm
+from opentaskpy.plugins.lookup.aws.ssm import prefetch_parameters, run
 from tests.fixtures.localstack import *  # noqa: F403
 
 PLUGIN_NAME = "ssm"
@@ -105,3 +107,111 @@ def test_config_loader_using_ssm_plugin(ssm_client, tmpdir):
     config_loader._resolve_templated_variables()
 
     assert config_loader.get_global_variables()["testLookup"] == expected_result
+
+
+def test_ssm_plugin_cached_lookup(ssm_client, lookup_cache):
+    ssm_client.put_parameter(
+        Name="my_cached_param", Value="first", Type="String", Overwrite=True
+    )
+    assert run(name="my_cached_param") == "first"
+
+    # The value has changed, but the cached value is still returned
+    ssm_client.put_parameter(
+        Name="my_cached_param", Value="second", Type="String", Overwrite=True
+    )
+    assert run(name="my_cached_param") == "first"
+
+    # Different credentials don't share the cached value
+    assert (
+        run(
+            name="my_cached_param",
+            globals={"AWS_ACCESS_KEY_ID": "other", "AWS_SECRET_ACCESS_KEY": "test"},
+        )
+        == "second"
+    )
+
+    clear_lookup_cache()
+    assert run(name="my_cached_param") == "second"
+
+
+def test_ssm_plugin_lookup_not_cached_by_default(ssm_client):
+    clear_lookup_cache()
+
+    ssm_client.put_parameter(
+        Name="my_uncached_param", Value="first", Type="String", Overwrite=True
+    )
+    assert run(name="my_uncached_param") == "first"
+
+    ssm_client.put_parameter(
+        Name="my_uncached_param", Value="second", Type="String", Overwrite=True
+    )
+    assert run(name="my_uncached_param") == "second"
+
+
+def test_ssm_plugin_prefetch_parameters(ssm_client, lookup_cache):
+    names = [f"/otf/prefetch/param{i}" for i in range(15)]
+    for name in names:
+        ssm_client.put_parameter(
+            Name=name, Value=f"{name}_value", Type="SecureString", Overwrite=True
+        )
+
+    # More than one batch is needed, and missing parameters are ignored
+    values = prefetch_parameters([*names, "/otf/prefetch/does_not_exist"])
+    assert values == {name: f"{name}_value" for name in names}
+
+    # The lookups are now served from the cache
+    ssm_client.put_parameter(
+        Name=names[0], Value="changed", Type="SecureString", Overwrite=True
+    )
+    assert run(name=names[0]) == f"{names[0]}_value"
+    assert run(name="/otf/prefetch/does_not_exist") == "LOOKUP_FAILED"
+
+
+def test_ssm_plugin_prefetch_path(ssm_client, monkeypatch, lookup_cache):
+    monkeypatch.setenv("OTF_AWS_SSM_PREFETCH_PATHS", "/otf/path/")
+
+    ssm_client.put_parameter(
+        Name="/otf/path/param1", Value="value1", Type="String", Overwrite=True
+    )
+    ssm_client.put_parameter(
+        Name="/otf/path/nested/param2",
+        Value="value2",
+        Type="String",
+        Overwrite=True,
+    )
+
+    # Looking up one parameter beneath the path reads all of them
+    assert run(name="/otf/path/param1") == "value1"
+
+    ssm_client.put_parameter(
+        Name="/otf/path/nested/param2",
+        Value="changed",
+        Type="String",
+        Overwrite=True,
+    )
+    assert run(name="/otf/path/nested/param2") == "value2"
+
+
+def test_ssm_plugin_prefetch_path_failure(ssm_client, monkeypatch, lookup_cache):
+    monkeypatch.setenv("OTF_AWS_SSM_PREFETCH_PATHS", "/otf/failing_path/")
+
+    calls = []
+
+    def get_parameters_by_path(path, credentials):
+        calls.append(path)
+        raise ReadTimeoutError(endpoint_url="http://localhost")
+
+    monkeypatch.setattr(ssm, "_get_parameters_by_path", get_parameters_by_path)
+
+    ssm_client.put_parameter(
+        Name="/otf/failing_path/param1",
+        Value="value1",
+        Type="String",
+        Overwrite=True,
+    )
+
+    # Errors that aren't from AWS also fall back to reading the parameter on its
+    # own, and the path isn't tried again
+    assert run(name="/otf/failing_path/param1") == "value1"
+    assert run(name="/otf/failing_path/param2") == "LOOKUP_FAILED"
+    assert calls == ["/otf/failing_path/"]
@@ -1,15 +1,23 @@
 # pylint: skip-file
 # ruff: noqa
+import itertools
 import logging
 import os
+import threading
+import time
 from copy import deepcopy
 
 import boto3
 import botocore.exceptions
 import opentaskpy.otflogging
 import pytest
+from moto import mock_aws
+from moto.moto_api import state_manager
 from opentaskpy.taskhandlers import execution
 
+from opentaskpy.addons.aws.remotehandlers import ecsfargate
+from opentaskpy.addons.aws.remotehandlers.creds import clear_aws_client_pool
+from opentaskpy.addons.aws.remotehandlers.ecsfargate import FargateTaskExecution
 from tests.fixtures.localstack import *  # noqa: F403, F405, F401
 from tests.fixtures.moto import *  # noqa: F403, F405, F401
 
@@ -83,6 +91,28 @@ def credentials_aws_dev(cleanup_credentials):
             del os.environ["AWS_ENDPOINT_URL"]
 
 
+@pytest.fixture(scope="function")
+def ecs_moto(cleanup_credentials, tmp_path, monkeypatch):
+    # Task logs go to a temporary directory rather than into the working tree
+    monkeypatch.setenv("OTF_LOG_DIRECTORY", str(tmp_path / "logs"))
+    os.environ["AWS_ACCESS_KEY_ID"] = "testing"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "testing"
+    os.environ["AWS_REGION"] = "eu-west-1"
+    os.environ["AWS_DEFAULT_REGION"] = "eu-west-1"
+    clear_aws_client_pool()
+    # Keep mocked tasks RUNNING until they're stopped, rather than moving them on to the
+    # next status each time they're described
+    state_manager.set_transition(
+        model_name="ecs::task", transition={"progression": "manual", "times": 1000}
+    )
+    with mock_aws():
+        create_ecs_cluster()
+        create_fargate_task()
+        yield
+    state_manager.unset_transition("ecs::task")
+    clear_aws_client_pool()
+
+
 def create_ecs_cluster():
     session = boto3.session.Session()
 
@@ -193,3 +223,168 @@ def test_run_fargate_task_fail(credentials_aws_dev):
 #     # Execute the task. This will always timeout, because the mock never changes from
 #     # RUNNING status
 #     assert not fargate_task_execution.execute()
+
+
+def test_fargate_task_timeout_backoff(ecs_moto, monkeypatch):
+    spec = deepcopy(fargate_execution_task_definition)
+    spec["task_id"] = "fargate-backoff"
+    del spec["cloudwatchLogGroupName"]
+    spec["timeout"] = 3
+    spec["pollInterval"] = 0.1
+    spec["maxPollInterval"] = 0.8
+    fargate_task_execution = FargateTaskExecution(spec)
+
+    # Each check reports the task as still RUNNING, and moves the clock on by however
+    # long the handler asked to wait, so nothing here depends on real time passing
+    clock = {"now": 0.0}
+    timeouts = []
+
+    def wait_for_task_status(ecs_client, cluster_name, task_arn, last_status, timeout):
+        timeouts.append(timeout)
+        clock["now"] += timeout
+        return {"lastStatus": "RUNNING", "containers": []}
+
+    monkeypatch.setattr(ecsfargate, "monotonic", lambda: clock["now"])
+    monkeypatch.setattr(ecsfargate, "wait_for_task_status", wait_for_task_status)
+
+    assert not fargate_task_execution.execute()
+
+    # Checked straight away, then backing off until the max poll interval is reached
+    assert timeouts[:6] == pytest.approx([0, 0.1, 0.2, 0.4, 0.8, 0.8])
+    # The last wait is cut short so the timeout is noticed as soon as it passes
+    assert sum(timeouts) == pytest.approx(3)
+    assert len(timeouts) <= 8
+
+
+def test_fargate_task_stopped_promptly(ecs_moto):
+    spec = deepcopy(fargate_execution_task_definition)
+    spec["task_id"] = "fargate-stopped"
+    del spec["cloudwatchLogGroupName"]
+    fargate_task_execution = FargateTaskExecution(spec)
+
+    def stop_task():
+        ecs_client = boto3.client("ecs")
+        task_arn = ecs_client.list_tasks(cluster="test_cluster")["taskArns"][0]
+        ecs_client.stop_task(cluster="test_cluster", task=task_arn)
+
+    threading.Timer(1, stop_task).start()
+
+    # The stop should be noticed within a couple of seconds, rather than the default
+    # max poll interval of 30 seconds
+    start = time.monotonic()
+    assert fargate_task_execution.execute()
+    assert time.monotonic() - start < 3
+
+
+def test_fargate_tasks_share_describe_tasks(ecs_moto):
+    handlers = []
+    for i in range(5):
+        spec = deepcopy(fargate_execution_task_definition)
+        spec["task_id"] = f"fargate-shared-{i}"
+        spec["timeout"] = 2
+        spec["pollInterval"] = 0.5
+        spec["maxPollInterval"] = 0.5
+        del spec["cloudwatchLogGroupName"]
+        handlers.append(FargateTaskExecution(spec))
+
+    # The handlers all use the same credentials, so they share a pooled client
+    assert len({handler.ecs_client for handler in handlers}) == 1
+    calls = []
+    handlers[0].ecs_client.meta.events.register(
+        "before-parameter-build.ecs.DescribeTasks",
+        lambda params, **kwargs: calls.append(params["tasks"]),
+    )
+
+    # The mocked tasks never leave the RUNNING status, so these all time out
+    threads = [threading.Thread(target=handler.execute) for handler in handlers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Each handler checks its task several times, but those checks are batched
+    # together, so there are fewer calls than task checks
+    assert max(len(tasks) for tasks in calls) == 5
+    assert len(calls) < sum(len(tasks) for tasks in calls)
+
+
+def test_fargate_task_follow_logs(ecs_moto, caplog):
+    ecs_client = boto3.client("ecs")
+    ecs_client.register_task_definition(
+        family="opentaskpy-aws-logs",
+        containerDefinitions=[
+            {
+                "name": "opentaskpy-aws",
+                "image": "opentaskpy-aws",
+                "memory": 100,
+                "logConfiguration": {
+                    "logDriver": "awslogs",
+                    "options": {
+                        "awslogs-group": "/otf/fargate",
+                        "awslogs-region": "eu-west-1",
+                        "awslogs-stream-prefix": "ecs",
+                    },
+                },
+            }
+        ],
+    )
+    logs_client = boto3.client("logs")
+    logs_client.create_log_group(logGroupName="/otf/fargate")
+
+    spec = deepcopy(fargate_execution_task_definition)
+    spec["task_id"] = "fargate-follow-logs"
+    spec["taskFamily"] = "opentaskpy-aws-logs"
+    spec["cloudwatchLogGroupName"] = "/otf/fargate"
+    spec["pollInterval"] = 0.2
+    spec["maxPollInterval"] = 0.2
+    fargate_task_execution = FargateTaskExecution(spec)
+
+    # Events are ordered by their timestamp, so give every event a later one
+    timestamps = itertools.count(int(time.time() * 1000))
+
+    def put_log_events(log_stream_name, messages):
+        # Only 10,000 events can be put at once
+        for i in range(0, len(messages), 10000):
+            logs_client.put_log_events(
+                logGroupName="/otf/fargate",
+                logStreamName=log_stream_name,
+                logEvents=[
+                    {"timestamp": next(timestamps), "message": message}
+                    for message in messages[i : i + 10000]
+                ],
+            )
+
+    def run_container():
+        while not ecs_client.list_tasks(cluster="test_cluster")["taskArns"]:
+            time.sleep(0.05)
+        task_arn = ecs_client.list_tasks(cluster="test_cluster")["taskArns"][0]
+        log_stream_name = f"ecs/opentaskpy-aws/{task_arn.split('/')[-1]}"
+        logs_client.create_log_stream(
+            logGroupName="/otf/fargate", logStreamName=log_stream_name
+        )
+
+        # More than fits in a single page of get_log_events
+        put_log_events(log_stream_name, [f"line {i}" for i in range(10050)])
+        time.sleep(1)
+        put_log_events(log_stream_name, ["last line"])
+        ecs_client.stop_task(cluster="test_cluster", task=task_arn)
+
+    thread = threading.Thread(target=run_container)
+    with caplog.at_level(logging.INFO):
+        thread.start()
+        fargate_task_execution.execute()
+        thread.join()
+
+    messages = [record.getMessage() for record in caplog.records]
+    output = [
+        message
+        for message in messages
+        if message.startswith("line ") or message == "last line"
+    ]
+    # Every line is logged once, in order
+    assert output == [f"line {i}" for i in range(10050)] + ["last line"]
+    # The logs were followed while the task was still running
+    assert messages.index("line 0") < messages.index("Task status: STOPPED")
+
+    fargate_task_execution.tidy()
+    assert fargate_task_execution._logs_client is None
@@ -2,6 +2,7 @@
 # ruff: noqa
 # flake8: noqa
 import datetime
+import json
 import logging
 import os
 import re
@@ -16,7 +17,12 @@ from opentaskpy.taskhandlers import transfer
 from pytest_shell import fs
 
 from opentaskpy import exceptions
-from opentaskpy.addons.aws.remotehandlers.s3 import S3Transfer
+from opentaskpy.addons.aws.remotehandlers.creds import get_aws_client
+from opentaskpy.addons.aws.remotehandlers.s3 import (
+    S3Transfer,
+    get_created_objects,
+    get_regex_literal_prefix,
+)
 from tests.fixtures.localstack import *
 
 os.environ["OTF_NO_LOG"] = "0"
@@ -47,6 +53,27 @@ s3_file_watch_task_definition = {
     },
 }
 
+s3_file_watch_event_source_task_definition = {
+    "type": "transfer",
+    "source": {
+        "bucket": BUCKET_NAME,
+        "directory": "src",
+        "fileRegex": ".*\\.txt",
+        "protocol": {
+            "name": "opentaskpy.addons.aws.remotehandlers.s3.S3Transfer",
+        },
+        "fileWatch": {
+            "timeout": 20,
+            "sleepTime": 1,
+            "watchOnly": True,
+            "eventSource": {
+                "queueUrl": "",
+                "waitTimeSeconds": 2,
+            },
+        },
+    },
+}
+
 s3_file_watch_pagination_task_definition = {
     "type": "transfer",
     "source": {
@@ -177,6 +204,33 @@ s3_to_s3_copy_2_task_definition = {
     ],
 }
 
+s3_to_s3_streaming_proxy_task_definition = {
+    "type": "transfer",
+    "source": {
+        "bucket": BUCKET_NAME,
+        "directory": "src",
+        "fileRegex": ".*\\.txt",
+        "protocol": {
+            "name": "opentaskpy.addons.aws.remotehandlers.s3.S3Transfer",
+        },
+    },
+    "destination": [
+        {
+            "bucket": BUCKET_NAME_2,
+            "directory": "dest",
+            "protocol": {
+                "name": "opentaskpy.addons.aws.remotehandlers.s3.S3Transfer",
+                "streamingProxy": True,
+                "transferConfig": {
+                    "multipartThreshold": 5242880,
+                    "multipartChunksize": 5242880,
+                    "maxInMemoryUploadChunks": 2,
+                },
+            },
+        },
+    ],
+}
+
 s3_to_s3_proxy_task_definition = {
     "type": "transfer",
     "source": {
@@ -450,7 +504,7 @@ ssh_to_s3_copy_task_definition = {
 
 
 @pytest.fixture(scope="function")
-def setup_bucket(credentials, s3_client):
+def setup_bucket(credentials, s3_client, client_pool):
     # This all relies on docker container for the AWS stack being set up and running
     # The AWS CLI should also be installed
 
@@ -672,6 +726,38 @@ def test_s3_to_s3_proxy(setup_bucket, s3_client, tmp_path):
     assert s3_response["ResponseMetadata"]["HTTPStatusCode"] == 200
 
 
+def test_s3_to_s3_streaming_proxy(setup_bucket, s3_client, tmp_path):
+    transfer_obj = transfer.Transfer(
+        None, "s3-to-s3-streaming-proxy", s3_to_s3_streaming_proxy_task_definition
+    )
+
+    # One file small enough to upload in one request, and one that needs a multipart
+    # upload
+    fs.create_files([{f"{tmp_path}/small.txt": {"content": "test1234"}}])
+    with open(f"{tmp_path}/large.txt", "wb") as f:
+        f.write(os.urandom(12 * 1024 * 1024))
+    create_s3_file(s3_client, f"{tmp_path}/small.txt", "src/small.txt")
+    create_s3_file(s3_client, f"{tmp_path}/large.txt", "src/large.txt")
+
+    assert transfer_obj.run()
+
+    # Check that the files are in the destination bucket
+    assert (
+        s3_client.get_object(Bucket=BUCKET_NAME_2, Key="dest/small.txt")["Body"].read()
+        == b"test1234"
+    )
+    with open(f"{tmp_path}/large.txt", "rb") as f:
+        assert (
+            s3_client.get_object(Bucket=BUCKET_NAME_2, Key="dest/large.txt")[
+                "Body"
+            ].read()
+            == f.read()
+        )
+
+    # Nothing should have been staged locally
+    assert not os.path.exists(transfer_obj.local_staging_dir)
+
+
 def test_local_to_s3_proxy(setup_bucket, s3_client, tmp_path):
 
     # Create a file to watch for with the current date
@@ -869,7 +955,7 @@ def test_local_to_s3_assume_role_expiry_long_token_expiry(
     assert found_duration
 
 
-def test_local_to_s3_assume_role_real(tmp_path, credentials_aws_dev):
+def test_local_to_s3_assume_role_real(tmp_path, credentials_aws_dev, client_pool):
 
     task_definition = {
         "type": "transfer",
@@ -892,7 +978,6 @@ def test_local_to_s3_assume_role_real(tmp_path, credentials_aws_dev):
     }
 
     with freezegun.freeze_time(datetime.datetime.now()) as frozen_datetime:
-
         transfer_obj = transfer.Transfer(
             None, "local-to-s3-assume-role", task_definition
         )
@@ -925,6 +1010,14 @@ def test_local_to_s3_assume_role_real(tmp_path, credentials_aws_dev):
         # Add the log capture handler to the logger
         logger.addHandler(LogCaptureHandler())
 
+        # The S3 client isn't created until it's first used, which is after the time
+        # has moved on, so assume the role now to have credentials that'll expire
+        get_aws_client(
+            "s3",
+            {"AccessKeyId": None, "SecretAccessKey": None},
+            assume_role_arn=os.environ["S3_AWS_ASSUME_ROLE_ARN"],
+        )
+
         # Run the transfer
         assert transfer_obj.run()
 
@@ -1224,6 +1317,454 @@ def test_s3_file_watch_pagination(s3_client, setup_bucket, tmp_path):
     assert transfer_obj.run()
 
 
+def test_s3_file_watch_incremental(setup_bucket, s3_client, tmp_path):
+    fs.create_files([{f"{tmp_path}/test.txt": {"content": "test1234"}}])
+
+    # Files that were there before the watch started
+    for i in range(5):
+        create_s3_file(s3_client, f"{tmp_path}/test.txt", f"src/20240101-{i}.csv")
+
+    spec = deepcopy(s3_file_watch_task_definition["source"])
+    spec["task_id"] = "s3-file-watch-incremental"
+    spec["fileWatch"]["incremental"] = True
+    s3_transfer = S3Transfer(spec)
+
+    assert s3_transfer.list_files(directory="src", file_pattern=".*\\.txt") == {}
+    assert s3_transfer._file_watch_cursor == "src/20240101-4.csv"
+
+    create_s3_file(s3_client, f"{tmp_path}/test.txt", "src/20240102-0.csv")
+    create_s3_file(s3_client, f"{tmp_path}/test.txt", "src/20240102-1.txt")
+
+    # Only the new keys are listed
+    files = s3_transfer.list_files(directory="src", file_pattern=".*\\.txt")
+    assert list(files) == ["src/20240102-1.txt"]
+    assert s3_transfer._file_watch_cursor == "src/20240102-1.txt"
+
+    # Once the watch has found files, the listing is a normal one
+    create_s3_file(s3_client, f"{tmp_path}/test.txt", "src/20240101-9.txt")
+    files = s3_transfer.list_files(directory="src", file_pattern=".*\\.txt")
+    assert sorted(files) == ["src/20240101-9.txt", "src/20240102-1.txt"]
+
+
+def test_s3_file_watch_incremental_overwrite(setup_bucket, s3_client, tmp_path):
+    fs.create_files([{f"{tmp_path}/test.txt": {"content": "test1234"}}])
+    fs.create_files([{f"{tmp_path}/test2.txt": {"content": "changed"}}])
+
+    create_s3_file(s3_client, f"{tmp_path}/test.txt", "src/20240101-0.txt")
+
+    spec = deepcopy(s3_file_watch_task_definition["source"])
+    spec["task_id"] = "s3-file-watch-incremental-overwrite"
+    spec["fileWatch"]["incremental"] = True
+    spec["fileWatch"]["fileRegex"] = ".*\\.csv"
+    s3_transfer = S3Transfer(spec)
+
+    assert s3_transfer.list_files(directory="src", file_pattern=".*\\.csv") == {}
+    assert s3_transfer._file_watch_cursor == "src/20240101-0.txt"
+
+    # Overwriting a key that's already been listed doesn't make it new again
+    create_s3_file(s3_client, f"{tmp_path}/test2.txt", "src/20240101-0.txt")
+    assert s3_transfer.list_files(directory="src", file_pattern=".*\\.csv") == {}
+    assert s3_transfer._file_watch_cursor == "src/20240101-0.txt"
+
+
+def s3_event(bucket, key, size=8, event_time=None):
+    if not event_time:
+        event_time = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    return {
+        "Records": [
+            {
+                "eventSource": "aws:s3",
+                "eventName": "ObjectCreated:Put",
+                "eventTime": event_time,
+                "s3": {
+                    "bucket": {"name": bucket},
+                    "object": {"key": key, "size": size},
+                },
+            }
+        ]
+    }
+
+
+def create_event_queue(queue_name):
+    sqs_client = get_aws_client(
+        "sqs",
+        {
+            "AccessKeyId": os.environ["AWS_ACCESS_KEY_ID"],
+            "SecretAccessKey": os.environ["AWS_SECRET_ACCESS_KEY"],
+            "region_name": os.environ["AWS_REGION"],
+        },
+    )["client"]
+    queue_url = sqs_client.create_queue(QueueName=queue_name)["QueueUrl"]
+    sqs_client.purge_queue(QueueUrl=queue_url)
+    return sqs_client, queue_url
+
+
+def test_s3_file_watch_event_source(s3_client, setup_bucket, tmp_path):
+    sqs_client, queue_url = create_event_queue("otf-addons-aws-s3-events")
+
+    task_definition = deepcopy(s3_file_watch_event_source_task_definition)
+    task_definition["source"]["fileWatch"]["eventSource"]["queueUrl"] = queue_url
+    transfer_obj = transfer.Transfer(None, "s3-file-watch-event", task_definition)
+
+    fs.create_files([{f"{tmp_path}/test.txt": {"content": "test1234"}}])
+
+    def create_file_and_notify():
+        create_s3_file(s3_client, f"{tmp_path}/test.txt", "src/test.txt")
+        # Events for other buckets and files that don't match are dropped
+        sqs_client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(s3_event(BUCKET_NAME_2, "src/test.txt")),
+        )
+        sqs_client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(s3_event(BUCKET_NAME, "src/test.csv")),
+        )
+        sqs_client.send_message(
+            QueueUrl=queue_url,
+            MessageBody=json.dumps(s3_event(BUCKET_NAME, "src/test.txt")),
+        )
+
+    t = threading.Timer(3, create_file_and_notify)
+    t.start()
+
+    assert transfer_obj.run()
+
+    # Every message was deleted once it had been read
+    assert "Messages" not in sqs_client.receive_message(
+        QueueUrl=queue_url, WaitTimeSeconds=0
+    )
+
+
+def test_s3_file_watch_event_source_stale(s3_client, setup_bucket):
+    sqs_client, queue_url = create_event_queue("otf-addons-aws-s3-events-stale")
+
+    # A notification left on the queue from before the watch started, for a file
+    # that has since been deleted
+    sqs_client.send_message(
+        QueueUrl=queue_url,
+        MessageBody=json.dumps(
+            s3_event(BUCKET_NAME, "src/test.txt", event_time="2026-01-01T00:00:00Z")
+        ),
+    )
+
+    spec = deepcopy(s3_file_watch_event_source_task_definition["source"])
+    spec["task_id"] = "s3-file-watch-event-stale"
+    spec["fileWatch"]["eventSource"]["queueUrl"] = queue_url
+    spec["fileWatch"]["eventSource"]["waitTimeSeconds"] = 1
+    s3_transfer = S3Transfer(spec)
+
+    # The initial listing, then a check that reads the stale notification
+    assert s3_transfer.list_files(directory="src", file_pattern=".*\\.txt") == {}
+    assert s3_transfer.list_files(directory="src", file_pattern=".*\\.txt") == {}
+    assert not s3_transfer._file_watch_complete
+
+    # It's been dropped rather than left to be received again
+    assert "Messages" not in sqs_client.receive_message(
+        QueueUrl=queue_url, WaitTimeSeconds=0
+    )
+    s3_transfer.tidy()
+
+
+@pytest.mark.parametrize(
+    "message_body, expected",
+    [
+        (
+            json.dumps(s3_event("bucket", "src/file+name%281%29.txt", 5)),
+            [{"bucket": "bucket", "key": "src/file name(1).txt", "size": 5}],
+        ),
+        # Delivered through SNS
+        (
+            json.dumps(
+                {
+                    "Type": "Notification",
+                    "Message": json.dumps(s3_event("bucket", "src/file.txt")),
+                }
+            ),
+            [{"bucket": "bucket", "key": "src/file.txt", "size": 8}],
+        ),
+        # Delivered through EventBridge
+        (
+            json.dumps(
+                {
+                    "detail-type": "Object Created",
+                    "time": "2026-01-01T00:00:00Z",
+                    "detail": {
+                        "bucket": {"name": "bucket"},
+                        "object": {"key": "src/file.txt", "size": 8},
+                    },
+                }
+            ),
+            [{"bucket": "bucket", "key": "src/file.txt", "size": 8}],
+        ),
+        # The test event sent when notifications are configured
+        (json.dumps({"Service": "Amazon S3", "Event": "s3:TestEvent"}), []),
+        ("not json", []),
+    ],
+)
+def test_get_created_objects(message_body, expected):
+    created_objects = get_created_objects(message_body)
+    assert [
+        {key: created_object[key] for key in ("bucket", "key", "size")}
+        for created_object in created_objects
+    ] == expected
+
+
+def test_s3_list_files_without_head_object(
+    setup_bucket, s3_client, tmp_path, client_pool, monkeypatch
+):
+    fs.create_files([{f"{tmp_path}/regex-test-5.txt": {"content": "test1234"}}])
+    create_s3_file(s3_client, f"{tmp_path}/regex-test-5.txt", "src/regex-test-5.txt")
+
+    s3_remote_handler = S3Transfer(s3_to_s3_copy_2_task_definition["source"])
+
+    # The listing should provide everything needed, so head_object must not be called
+    def head_object(**kwargs):
+        raise AssertionError("head_object should not be called by list_files")
+
+    # The client is pooled, so the patch must not outlive this test
+    monkeypatch.setattr(s3_remote_handler.s3_client, "head_object", head_object)
+
+    files = s3_remote_handler.list_files(
+        directory=s3_remote_handler.spec["directory"],
+        file_pattern=s3_remote_handler.spec["fileRegex"],
+    )
+    assert list(files.keys()) == ["src/regex-test-5.txt"]
+    assert files["src/regex-test-5.txt"]["size"] == 8
+    assert files["src/regex-test-5.txt"]["modified_time"] > 0
+
+
+def test_s3_iter_files_small_page_size(setup_bucket, s3_client, tmp_path):
+    for i in range(10):
+        fs.create_files([{f"{tmp_path}/regex-test-{i}.txt": {"content": "test1234"}}])
+        create_s3_file(
+            s3_client, f"{tmp_path}/regex-test-{i}.txt", f"src/regex-test-{i}.txt"
+        )
+
+    source_spec = deepcopy(s3_to_s3_copy_task_definition["source"])
+    source_spec["protocol"]["listPageSize"] = 3
+    s3_remote_handler = S3Transfer(source_spec)
+
+    # All files should be found across multiple pages
+    assert len(s3_remote_handler.list_files(directory="src", file_pattern=".*")) == 10
+
+    # The generator should allow the caller to stop after the first match
+    files = s3_remote_handler.iter_files(directory="src", file_pattern=".*")
+    key, attributes = next(files)
+    assert key == "src/regex-test-0.txt"
+    assert attributes["size"] == 8
+    files.close()
+
+
+def test_s3_file_matching_recursive(setup_bucket, s3_client, tmp_path):
+    fs.create_files([{f"{tmp_path}/regex-test-5.txt": {"content": "test1234"}}])
+    for object_key in [
+        "src/regex-test-5.txt",
+        "src/archive/regex-test-5.txt",
+        "src/archive/2024/regex-test-5.txt",
+        "src2/regex-test-5.txt",
+    ]:
+        create_s3_file(s3_client, f"{tmp_path}/regex-test-5.txt", object_key)
+
+    # Without recursive set, only the file directly in src should match
+    s3_remote_handler = S3Transfer(s3_to_s3_copy_2_task_definition["source"])
+    assert list(
+        s3_remote_handler.list_files(directory="src", file_pattern="regex-test-5\\.txt")
+    ) == ["src/regex-test-5.txt"]
+
+    # With recursive set, the subdirectories should also be searched, but not src2
+    source_spec = deepcopy(s3_to_s3_copy_2_task_definition["source"])
+    source_spec["recursive"] = True
+    s3_remote_handler = S3Transfer(source_spec)
+    assert sorted(
+        s3_remote_handler.list_files(directory="src", file_pattern="regex-test-5\\.txt")
+    ) == [
+        "src/archive/2024/regex-test-5.txt",
+        "src/archive/regex-test-5.txt",
+        "src/regex-test-5.txt",
+    ]
+
+
+@pytest.mark.parametrize(
+    "pattern, expected",
+    [
+        ("^SETTLEMENT_2024.*\\.csv$", "SETTLEMENT_2024"),
+        ("regex-test-5\\.txt", "regex-test-5.txt"),
+        ("file-pca-rename-\\d+\\.txt", "file-pca-rename-"),
+        ("abc?\\.txt", "ab"),
+        ("ab{2}c", "a"),
+        (".*\\.txt", ""),
+        ("[0-9]+\\.txt", ""),
+        ("a|b", ""),
+        ("(?i)abc", ""),
+    ],
+)
+def test_get_regex_literal_prefix(pattern, expected):
+    assert get_regex_literal_prefix(re.compile(pattern)) == expected
+
+
+def test_s3_pull_files_to_worker_concurrently(setup_bucket, s3_client, tmp_path):
+    for i in range(20):
+        fs.create_files([{f"{tmp_path}/regex-test-{i}.txt": {"content": "test1234"}}])
+        create_s3_file(
+            s3_client, f"{tmp_path}/regex-test-{i}.txt", f"src/regex-test-{i}.txt"
+        )
+
+    source_spec = deepcopy(s3_to_s3_copy_task_definition["source"])
+    source_spec["protocol"]["maxConcurrentFiles"] = 5
+    s3_remote_handler = S3Transfer(source_spec)
+
+    staging_dir = tmp_path / "staging"
+    staging_dir.mkdir()
+    files = [f"src/regex-test-{i}.txt" for i in range(20)]
+    assert s3_remote_handler.pull_files_to_worker(files, str(staging_dir)) == 0
+    assert sorted(os.listdir(staging_dir)) == sorted(
+        f"regex-test-{i}.txt" for i in range(20)
+    )
+
+    # A single missing file should fail the pull, but still download the others
+    staging_dir_2 = tmp_path / "staging2"
+    staging_dir_2.mkdir()
+    assert (
+        s3_remote_handler.pull_files_to_worker(
+            [*files, "src/does-not-exist.txt"], str(staging_dir_2)
+        )
+        == 1
+    )
+    assert len(os.listdir(staging_dir_2)) == 20
+
+
+def test_s3_push_files_from_worker_concurrently(setup_bucket, s3_client, tmp_path):
+    for i in range(20):
+        fs.create_files(
+            [{f"{tmp_path}/file-rename-{i}-abc.txt": {"content": "test1234"}}]
+        )
+
+    dest_spec = deepcopy(s3_to_s3_proxy_rename_task_definition["destination"][0])
+    dest_spec["task_id"] = "s3-push-concurrently"
+    dest_spec["protocol"]["maxConcurrentFiles"] = 5
+    s3_remote_handler = S3Transfer(dest_spec)
+
+    assert s3_remote_handler.push_files_from_worker(str(tmp_path)) == 0
+
+    # Every file should have been uploaded, and renamed
+    objects = s3_client.list_objects(Bucket=BUCKET_NAME_2)
+    assert sorted(obj["Key"] for obj in objects["Contents"]) == sorted(
+        f"dest/file-rename-{i}-def.txt" for i in range(20)
+    )
+
+    # A single missing file should fail the push
+    assert (
+        s3_remote_handler.push_files_from_worker(
+            str(tmp_path), file_list={f"{tmp_path}/does-not-exist.txt": {}}
+        )
+        == 1
+    )
+
+
+def test_s3_push_files_from_worker_transfer_config(setup_bucket, s3_client, tmp_path):
+    # Create a 12MB file, which should be uploaded in 3 parts
+    with open(f"{tmp_path}/multipart.txt", "wb") as f:
+        f.write(os.urandom(12 * 1024 * 1024))
+
+    dest_spec = deepcopy(s3_to_s3_copy_task_definition["destination"][0])
+    dest_spec["task_id"] = "s3-push-transfer-config"
+    dest_spec["protocol"]["transferConfig"] = {
+        "multipartThreshold": 5 * 1024 * 1024,
+        "multipartChunksize": 5 * 1024 * 1024,
+        "maxConcurrency": 2,
+    }
+    s3_remote_handler = S3Transfer(dest_spec)
+
+    assert s3_remote_handler.push_files_from_worker(str(tmp_path)) == 0
+
+    # Multipart uploads have an ETag suffixed with the number of parts
+    s3_response = s3_client.head_object(Bucket=BUCKET_NAME_2, Key="dest/multipart.txt")
+    assert s3_response["ETag"].strip('"').endswith("-3")
+
+
+def test_s3_to_s3_copy_multiple_large_files(setup_bucket, s3_client, tmp_path):
+    # Create 3 files that are each large enough to be copied in 3 parts
+    with open(f"{tmp_path}/multipart.txt", "wb") as f:
+        f.write(os.urandom(12 * 1024 * 1024))
+    for i in range(3):
+        create_s3_file(s3_client, f"{tmp_path}/multipart.txt", f"src/multipart-{i}.txt")
+
+    s3_to_s3_copy_multipart_task_definition = deepcopy(s3_to_s3_copy_task_definition)
+    s3_to_s3_copy_multipart_task_definition["source"]["protocol"][
+        "maxConcurrentFiles"
+    ] = 3
+    s3_to_s3_copy_multipart_task_definition["destination"][0]["protocol"][
+        "transferConfig"
+    ] = {
+        "multipartThreshold": 5 * 1024 * 1024,
+        "multipartChunksize": 5 * 1024 * 1024,
+    }
+
+    transfer_obj = transfer.Transfer(
+        None, "s3-to-s3-multipart", s3_to_s3_copy_multipart_task_definition
+    )
+
+    assert transfer_obj.run()
+
+    for i in range(3):
+        s3_response = s3_client.head_object(
+            Bucket=BUCKET_NAME_2, Key=f"dest/multipart-{i}.txt"
+        )
+        assert s3_response["ContentLength"] == 12 * 1024 * 1024
+        assert s3_response["ETag"].strip('"').endswith("-3")
+
+
+def test_s3_pca_move_more_than_1000_files(setup_bucket, s3_client, tmp_path):
+    # Moving more than 1000 files needs more than one delete_objects request
+    fs.create_files([{f"{tmp_path}/pca-move.txt": {"content": "test1234"}}])
+    files = [f"src/pca-move-{i}.txt" for i in range(1005)]
+    for file in files:
+        create_s3_file(s3_client, f"{tmp_path}/pca-move.txt", file)
+
+    source_spec = deepcopy(s3_to_s3_pca_move_task_definition["source"])
+    source_spec["task_id"] = "s3-pca-move-many"
+    s3_remote_handler = S3Transfer(source_spec)
+
+    assert s3_remote_handler.handle_post_copy_action(files) == 0
+
+    # All of the files should now be in the archive, and none left in src
+    assert not s3_remote_handler.list_files(directory="src", file_pattern=".*")
+    assert (
+        len(s3_remote_handler.list_files(directory="src/archive", file_pattern=".*"))
+        == 1005
+    )
+
+
+def test_s3_to_s3_copy_pca_delete_verify_deletes(setup_bucket, tmp_path, s3_client):
+    s3_to_s3_pca_delete_verify_task_definition = deepcopy(
+        s3_to_s3_pca_delete_task_definition
+    )
+    s3_to_s3_pca_delete_verify_task_definition["source"]["postCopyAction"][
+        "verifyDeletes"
+    ] = True
+
+    transfer_obj = transfer.Transfer(
+        None, "s3-to-s3-pca-delete-verify", s3_to_s3_pca_delete_verify_task_definition
+    )
+
+    datestamp = datetime.datetime.now().strftime("%Y%m%d%H%M%S")
+    for i in range(5):
+        fs.create_files(
+            [{f"{tmp_path}/file-pca-{datestamp}-{i}.txt": {"content": "test1234"}}]
+        )
+        create_s3_file(
+            s3_client,
+            f"{tmp_path}/file-pca-{datestamp}-{i}.txt",
+            f"src/file-pca-{datestamp}-{i}.txt",
+        )
+
+    assert transfer_obj.run()
+
+    # Check that the files are not in the source bucket
+    objects = s3_client.list_objects(Bucket=BUCKET_NAME)
+    assert "Contents" not in objects
+
+
 def create_s3_file(s3_client, local_file, object_key):
     s3_client.put_object(
         Bucket=BUCKET_NAME,
@@ -137,6 +137,89 @@ def test_s3_source_protocol(
     assert not validate_transfer_json(json_data)
 
 
+def test_s3_source_list_page_size(valid_transfer):
+    json_data = {
+        "type": "transfer",
+        "source": valid_transfer,
+    }
+
+    json_data["source"]["protocol"]["listPageSize"] = 250
+    assert validate_transfer_json(json_data)
+
+    # S3 won't return more than 1000 keys per page
+    json_data["source"]["protocol"]["listPageSize"] = 1001
+    assert not validate_transfer_json(json_data)
+
+    json_data["source"]["protocol"]["listPageSize"] = 0
+    assert not validate_transfer_json(json_data)
+
+
+def test_s3_source_max_concurrent_files(valid_transfer):
+    json_data = {
+        "type": "transfer",
+        "source": valid_transfer,
+    }
+
+    json_data["source"]["protocol"]["maxConcurrentFiles"] = 20
+    assert validate_transfer_json(json_data)
+
+    json_data["source"]["protocol"]["maxConcurrentFiles"] = 0
+    assert not validate_transfer_json(json_data)
+
+
+def test_s3_transfer_config(valid_transfer, valid_destination):
+    json_data = {
+        "type": "transfer",
+        "source": valid_transfer,
+        "destination": [valid_destination],
+    }
+
+    transfer_config = {
+        "multipartThreshold": 67108864,
+        "multipartChunksize": 67108864,
+        "maxConcurrency": 20,
+        "maxIoQueue": 200,
+        "ioChunksize": 1048576,
+        "useThreads": True,
+        "maxInMemoryUploadChunks": 4,
+    }
+    json_data["source"]["protocol"]["transferConfig"] = transfer_config
+    json_data["destination"][0]["protocol"]["transferConfig"] = transfer_config
+    assert validate_transfer_json(json_data)
+
+    json_data["destination"][0]["protocol"]["transferConfig"] = {"maxConcurrency": 0}
+    assert not validate_transfer_json(json_data)
+
+    json_data["destination"][0]["protocol"]["transferConfig"] = {"invalid": 1}
+    assert not validate_transfer_json(json_data)
+
+
+def test_s3_destination_streaming_proxy(valid_transfer, valid_destination):
+    json_data = {
+        "type": "transfer",
+        "source": valid_transfer,
+        "destination": [valid_destination],
+    }
+
+    # The source and destination share the same protocol definition
+    json_data["destination"][0]["protocol"] = {
+        **valid_destination["protocol"],
+        "streamingProxy": True,
+    }
+    assert validate_transfer_json(json_data)
+
+    json_data["destination"][0]["protocol"]["streamingProxy"] = "true"
+    assert not validate_transfer_json(json_data)
+
+    # It's only valid for the destination
+    json_data["source"]["protocol"] = {
+        **valid_transfer["protocol"],
+        "streamingProxy": True,
+    }
+    json_data["destination"][0]["protocol"]["streamingProxy"] = True
+    assert not validate_transfer_json(json_data)
+
+
 def test_s3_source_basic(valid_transfer):
     json_data = {
         "type": "transfer",
@@ -155,6 +238,16 @@ def test_s3_source_basic(valid_transfer):
     json_data["source"]["directory"] = "src/"
     assert not validate_transfer_json(json_data)
 
+    json_data["source"]["directory"] = "src"
+
+    # Add recursive
+    json_data["source"]["recursive"] = True
+    assert validate_transfer_json(json_data)
+
+    json_data["source"]["recursive"] = "yes"
+    assert not validate_transfer_json(json_data)
+    del json_data["source"]["recursive"]
+
     # Remove protocol
     del json_data["source"]["protocol"]
     assert not validate_transfer_json(json_data)
@@ -186,11 +279,54 @@ def test_s3_source_file_watch(valid_transfer):
     json_data["source"]["fileWatch"]["watchOnly"] = True
     assert validate_transfer_json(json_data)
 
+    # Add incremental
+    json_data["source"]["fileWatch"]["incremental"] = True
+    assert validate_transfer_json(json_data)
+    json_data["source"]["fileWatch"]["incremental"] = "true"
+    assert not validate_transfer_json(json_data)
+    del json_data["source"]["fileWatch"]["incremental"]
+
     # Add error
     json_data["source"]["error"] = True
     assert validate_transfer_json(json_data)
 
 
+def test_s3_source_file_watch_event_source(valid_transfer):
+    json_data = {
+        "type": "transfer",
+        "source": valid_transfer,
+    }
+
+    json_data["source"]["fileWatch"] = {
+        "timeout": 300,
+        "sleepTime": 1,
+        "fileRegex": ".*\\.txt",
+        "eventSource": {
+            "queueUrl": "https://sqs.eu-west-1.amazonaws.com/000000000000/otf-events",
+        },
+    }
+    assert validate_transfer_json(json_data)
+
+    # Add waitTimeSeconds
+    json_data["source"]["fileWatch"]["eventSource"]["waitTimeSeconds"] = 10
+    assert validate_transfer_json(json_data)
+
+    # waitTimeSeconds is limited to what SQS allows
+    json_data["source"]["fileWatch"]["eventSource"]["waitTimeSeconds"] = 21
+    assert not validate_transfer_json(json_data)
+    json_data["source"]["fileWatch"]["eventSource"]["waitTimeSeconds"] = 0
+    assert not validate_transfer_json(json_data)
+    json_data["source"]["fileWatch"]["eventSource"]["waitTimeSeconds"] = 20
+
+    # Unknown properties aren't allowed
+    json_data["source"]["fileWatch"]["eventSource"]["queueName"] = "otf-events"
+    assert not validate_transfer_json(json_data)
+
+    # queueUrl is required
+    json_data["source"]["fileWatch"]["eventSource"] = {"waitTimeSeconds": 20}
+    assert not validate_transfer_json(json_data)
+
+
 def test_s3_post_copy_action(valid_transfer):
 
     json_data = {
@@ -233,6 +369,12 @@ def test_s3_post_copy_action(valid_transfer):
     }
     assert not validate_transfer_json(json_data)
 
+    json_data["source"]["postCopyAction"] = {
+        "action": "delete",
+        "verifyDeletes": True,
+    }
+    assert validate_transfer_json(json_data)
+
 
 def test_s3_destination(valid_transfer, valid_destination):
     json_data = {
@@ -247,6 +389,14 @@ def test_s3_destination(valid_transfer, valid_destination):
     json_data["destination"][0]["flags"] = {"fullPath": "flag.txt"}
     assert validate_transfer_json(json_data)
 
+    # Add maxConcurrentFiles
+    json_data["destination"][0]["protocol"]["maxConcurrentFiles"] = 20
+    assert validate_transfer_json(json_data)
+
+    json_data["destination"][0]["protocol"]["maxConcurrentFiles"] = 0
+    assert not validate_transfer_json(json_data)
+    del json_data["destination"][0]["protocol"]["maxConcurrentFiles"]
+
     # Remove protocol
     del json_data["destination"][0]["protocol"]
     assert not validate_transfer_json(json_data)
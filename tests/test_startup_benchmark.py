@@ -0,0 +1,164 @@
+# pylint: skip-file
+# ruff: noqa
+"""Startup benchmark for the AWS handlers and plugins.
+
+A batch creates a handler for every task, and often only a few of those tasks ever
+reach the point of talking to AWS. This measures:
+
+  * how long it takes to import every handler and plugin module in a fresh
+    interpreter, and checks that doing so doesn't import boto3 or botocore
+  * how long it takes to create the handlers, and checks that no client is created
+  * the latency of the first call to S3, which is when boto3 is imported and the
+    client is built, compared with the calls after it
+
+The timings are logged at INFO level. The first call test requires the floci docker
+service (see tests/docker-compose.yml).
+
+Run in isolation with visible output:
+    pytest tests/test_startup_benchmark.py -v -o log_cli=true --log-cli-level=INFO
+"""
+
+import json
+import logging
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from opentaskpy.addons.aws.remotehandlers.ecsfargate import FargateTaskExecution
+from opentaskpy.addons.aws.remotehandlers.s3 import S3Execution, S3Transfer
+from tests.fixtures.localstack import *
+
+os.environ["OTF_NO_LOG"] = "1"
+
+logger = logging.getLogger(__name__)
+
+BUCKET_NAME = "otf-addons-aws-startup-test"
+NUM_HANDLERS = 100
+NUM_CALLS = 5
+
+HANDLER_MODULES = [
+    "opentaskpy.addons.aws.remotehandlers.s3",
+    "opentaskpy.addons.aws.remotehandlers.lambda",
+    "opentaskpy.addons.aws.remotehandlers.ecsfargate",
+    "opentaskpy.plugins.lookup.aws.ssm",
+    "opentaskpy.plugins.lookup.aws.secrets_manager",
+    "opentaskpy.variablecaching.aws.vc_ssm",
+    "opentaskpy.variablecaching.aws.vc_secretsmanager",
+]
+
+IMPORT_SCRIPT = f"""
+import importlib, json, sys, time
+
+start = time.perf_counter()
+for module in {HANDLER_MODULES!r}:
+    importlib.import_module(module)
+elapsed = time.perf_counter() - start
+
+print(json.dumps({{
+    "elapsed": elapsed,
+    "boto3": "boto3" in sys.modules,
+    "botocore": "botocore" in sys.modules,
+}}))
+"""
+
+s3_transfer_spec = {
+    "task_id": "startup-benchmark",
+    "bucket": BUCKET_NAME,
+    "directory": "src",
+    "fileRegex": ".*\\.txt",
+    "protocol": {"name": "opentaskpy.addons.aws.remotehandlers.s3.S3Transfer"},
+}
+
+
+@pytest.fixture(scope="function")
+def setup_bucket(credentials):
+    subprocess.run(
+        ["awslocal", "s3", "rb", f"s3://{BUCKET_NAME}", "--force"], check=False
+    )
+    subprocess.run(["awslocal", "s3", "mb", f"s3://{BUCKET_NAME}"], check=False)
+
+
+def test_import_does_not_load_boto3():
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SCRIPT],
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+    timings = json.loads(result.stdout)
+
+    logger.info(f"Import all handlers and plugins: {timings['elapsed']:.3f}s")
+
+    assert not timings["boto3"]
+    assert not timings["botocore"]
+
+
+def test_handlers_create_clients_on_first_use(cleanup_credentials, client_pool):
+    os.environ["AWS_ACCESS_KEY_ID"] = "test"
+    os.environ["AWS_SECRET_ACCESS_KEY"] = "test"
+    os.environ["AWS_REGION"] = "eu-west-1"
+
+    handlers = [
+        S3Transfer(s3_transfer_spec),
+        S3Execution(
+            {
+                "task_id": "startup-benchmark",
+                "bucket": BUCKET_NAME,
+                "key": "flag.txt",
+                "protocol": {
+                    "name": "opentaskpy.addons.aws.remotehandlers.s3.S3Execution"
+                },
+            }
+        ),
+        FargateTaskExecution(
+            {
+                "task_id": "startup-benchmark",
+                "clusterName": "test_cluster",
+                "taskFamily": "test_task",
+                "protocol": {
+                    "name": "opentaskpy.addons.aws.remotehandlers.ecsfargate.FargateTaskExecution"
+                },
+            }
+        ),
+    ]
+
+    assert handlers[0]._client is None
+    assert handlers[1]._client is None
+    assert handlers[2]._client is None
+
+    # Tidying a handler that never used its client shouldn't create one
+    handlers[0].tidy()
+    assert handlers[0]._client is None
+
+    assert handlers[1].s3_client is not None
+    assert handlers[2].ecs_client is not None
+
+
+def test_startup_benchmark_first_call(setup_bucket, client_pool):
+    start = time.perf_counter()
+    handlers = [S3Transfer(s3_transfer_spec) for _ in range(NUM_HANDLERS)]
+    init_elapsed = time.perf_counter() - start
+
+    call_timings = []
+    for _ in range(NUM_CALLS):
+        start = time.perf_counter()
+        assert handlers[0].list_files() == {}
+        call_timings.append(time.perf_counter() - start)
+
+    # Other handlers using the same credentials share the client that's been created
+    start = time.perf_counter()
+    assert handlers[1].list_files() == {}
+    second_handler_elapsed = time.perf_counter() - start
+
+    for handler in handlers:
+        handler.tidy()
+
+    logger.info(f"Create {NUM_HANDLERS} handlers: {init_elapsed:.3f}s")
+    logger.info(f"First list_files call: {call_timings[0]:.3f}s")
+    logger.info(
+        "Later list_files calls:"
+        f" {sum(call_timings[1:]) / (NUM_CALLS - 1):.3f}s (mean)"
+    )
+    logger.info(f"Second handler first call: {second_handler_elapsed:.3f}s")